@@ -1,48 +1,22 @@
 import fire
-import os
-import yaml
 
-from tqdm import tqdm
 from fixml.cli.repository import RepositoryActions
 
 from dotenv import load_dotenv
 load_dotenv()
 
 if __name__ == '__main__':
-    def main(config_yml):
+    def main(config_yml, concurrency=1):
         """
+        Evaluate the repositories of a batch run configuration. This is the
+        same as `fixml batch`, which scans each repository once, runs the
+        calls of all runs concurrently and skips the runs already recorded
+        in `record.yml`.
+
         Example
         ----------
-        >>> python ./batch_run.py --config_yml='./batch_run.yml'
+        >>> python ./batch_run.py --config_yml='./batch_run.yml' --concurrency=8
         """
-        action = RepositoryActions()
-
-        with open(config_yml, 'r') as file:
-            config = yaml.safe_load(file)
-
-        runs = config['runs']
-        checklist_path = config['checklist_path']
-        from_dir = config['repo_base_path']
-        to_dir = config['response_path']
-        repos = config['repo']
-        model = config['model']
-
-        record = []
-        for repo in tqdm(repos):
-            for run in range(1, runs+1):
-                action.evaluate(
-                    repo_path=os.path.join(from_dir, repo['path']),
-                    save_response_to=f"{to_dir}/{repo['name']}_{"{:02d}".format(run)}.json",
-                    checklist_path=checklist_path,
-                    model=model
-                )
-                
-                record.append({
-                    'repo': repo['name'],
-                    'response_path': f"{to_dir}/{repo['name']}_{"{:02d}".format(run)}.json",
-                    'run': run
-                })
-                with open(f"{to_dir}/record.yml", 'w') as file:
-                    yaml.dump(record, file)
+        RepositoryActions.batch(config_yml, concurrency=concurrency)
 
     fire.Fire(main)
@@ -0,0 +1,45 @@
+import fire
+
+from fixml.modules.code_analyzer.repo import Repository
+from fixml.modules.code_analyzer.context import ContextPolicy
+from fixml.modules.workflow.runners.evaluator import PerFileTestEvaluator
+from fixml.modules.workflow.tokens import estimate_tokens
+
+
+def count_codebase_tokens(files, context_policy=None, model="gpt-3.5-turbo"):
+    """Estimate the number of tokens of the code sent to the LLM."""
+    return sum(
+        estimate_tokens(str(PerFileTestEvaluator._load_test_file_into_splits(
+            file, context_policy)), model)
+        for file in files
+    )
+
+
+if __name__ == '__main__':
+    def main(*repo_paths, model="gpt-3.5-turbo", max_literal_length=200):
+        """
+        Report the reduction of the tokens sent to the LLM per repository
+        when only the test context is extracted from the test files.
+
+        Example
+        ----------
+        >>> python ./benchmark_context_extraction.py ../data/raw/lightfm ../data/raw/qlib
+        """
+        policies = {
+            'tests only': ContextPolicy(include_helpers=False,
+                                        max_literal_length=max_literal_length),
+            'tests and helpers': ContextPolicy(
+                max_literal_length=max_literal_length),
+        }
+        print(f"{'repository':<40}{'policy':<20}{'files':>7}"
+              f"{'full':>10}{'extracted':>11}{'reduction':>11}")
+        for repo_path in repo_paths:
+            files = Repository(repo_path).list_test_files()['Python']
+            full = count_codebase_tokens(files, model=model)
+            for name, policy in policies.items():
+                extracted = count_codebase_tokens(files, policy, model)
+                reduction = 1 - extracted / full if full else 0
+                print(f"{repo_path:<40}{name:<20}{len(files):>7}"
+                      f"{full:>10}{extracted:>11}{reduction:>11.1%}")
+
+    fire.Fire(main)
@@ -0,0 +1,49 @@
+import fire
+import time
+
+from fixml.modules.code_analyzer.git import GitContext
+from fixml.modules.code_analyzer.walk import walk_files, filter_ignored
+
+
+def list_with_walk(repo_path, workers=1):
+    return list(walk_files(repo_path, workers=workers))
+
+
+def list_with_git(git_context, include_untracked=True):
+    # same filtering as `Repository._get_all_files` when listing from git
+    files = git_context.list_files(include_untracked=include_untracked)
+    return list(filter_ignored(git_context.git_dir.resolve(), files,
+                               ignore_files=['.fixmlignore'],
+                               excluded_dirs=[], root_excluded_dirs=[]))
+
+
+if __name__ == '__main__':
+    def main(*repo_paths, repeat=5, workers=8):
+        """
+        Compare the time taken to enumerate the files of repositories with
+        the directory walk and with the git index.
+
+        Example
+        ----------
+        >>> python ./benchmark_file_enumeration.py ../data/raw/lightfm ../data/raw/qlib --repeat=10
+        """
+        print(f"{'repository':<40}{'backend':<24}{'files':>8}{'best (ms)':>12}")
+        for repo_path in repo_paths:
+            # the git context is created once, as `Repository` holds one
+            git_context = GitContext(repo_path)
+            backends = {
+                'walk': lambda: list_with_walk(repo_path),
+                f'walk ({workers} workers)': lambda: list_with_walk(repo_path, workers),
+                'git': lambda: list_with_git(git_context),
+                'git (tracked only)': lambda: list_with_git(git_context, False),
+            }
+            for name, backend in backends.items():
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    files = backend()
+                    timings.append(time.perf_counter() - start)
+                print(f"{repo_path:<40}{name:<24}{len(files):>8}"
+                      f"{min(timings) * 1000:>12.1f}")
+
+    fire.Fire(main)
@@ -1,11 +1,14 @@
+from pathlib import Path
+
 from .checklist import ChecklistActions
-from ..modules.workflow.parse import ResponseParser
-from ..modules.workflow.response import EvaluationResponse
+from .utils import parse_list
+from ..modules.mixins import WriteableMixin
 
 
-class ExportActions(object):
+class ExportActions(WriteableMixin):
 
     def __init__(self):
+        super().__init__()
         self.checklist = ChecklistActions().export
 
     @staticmethod
@@ -27,6 +30,47 @@ class ExportActions(object):
         overwrite : bool, optional
             The flag to bypass overwrite protection. This is by default False.
         """
+        # pandas is slow to import, so it is only loaded when exporting
+        from ..modules.workflow.parse import ResponseParser
+        from ..modules.workflow.response import EvaluationResponse
+
         response = EvaluationResponse.from_json(json_response_path)
         renderer = ResponseParser(response)
         renderer.export(output_path=export_path, exist_ok=overwrite)
+
+    def evaluation_table(self, json_response_paths: list[str],
+                         export_path: str, overwrite: bool = False) -> None:
+        """Exports the results of one or more evaluation responses as a
+        Parquet table, with one row per run, test file and checklist item.
+
+        Each response is a run identified by the name of its file. The table
+        contains the score, the evaluation and the functions of each item,
+        and the tokens, timings, number of attempts and success of each
+        file. The responses are read without their prompts, and the
+        repositories and checklists they refer to are not loaded, so that
+        they are not needed locally. Requires pyarrow.
+
+        Parameters
+        ----------
+        json_response_paths : list[str]
+            The paths to the JSON or JSONL files containing the evaluation
+            responses.
+        export_path: str
+            The path to the exported Parquet file.
+        overwrite : bool, optional
+            The flag to bypass overwrite protection. This is by default False.
+        """
+        from ..modules.workflow.response import EvaluationResponse
+        from ..modules.workflow.table import get_result_schema, \
+            write_result_table
+
+        self._filedump_check(export_path, exist_ok=overwrite)
+        # fail before loading the responses if pyarrow is missing
+        get_result_schema()
+        records = []
+        for path in parse_list(json_response_paths):
+            response = EvaluationResponse.from_json(path, slim=True,
+                                                    load_objects=False)
+            records.extend(response.to_records(run=Path(path).stem))
+        write_result_table(records, export_path)
+        print(f"Evaluation table exported to {export_path}.")
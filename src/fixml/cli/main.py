@@ -20,6 +20,7 @@ class TestCreation:
 
         self.evaluate = self.repository.evaluate
         self.generate = self.repository.generate
+        self.batch = self.repository.batch
 
 
 def main():
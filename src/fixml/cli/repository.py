@@ -1,18 +1,22 @@
 from pathlib import Path
 from pprint import pprint
-
-from langchain_openai import ChatOpenAI
-from langchain.globals import set_debug
+from typing import TYPE_CHECKING
 
 from .utils import parse_list
-from ..modules.workflow.prompt_format import EvaluationPromptFormat, \
-    GenerationPromptFormat
-from ..modules.workflow.runners.evaluator import PerFileTestEvaluator
-from ..modules.workflow.runners.generator import NaiveTestGenerator
+from ..modules.workflow.cache import CacheMode, ResponseCache
+from ..modules.workflow.rate_limit import RateLimiter
+from ..modules.code_analyzer.context import ContextPolicy
 from ..modules.code_analyzer.repo import Repository
-from ..modules.workflow.parse import ResponseParser
 from ..modules.checklist.checklist import Checklist
 from ..modules.mixins import WriteableMixin
+from ..modules.utils import get_extension
+
+if TYPE_CHECKING:
+    from ..modules.workflow.response import TokenEstimate
+
+# langchain, pandas and the modules depending on them are slow to import, so
+# they are imported by the commands which need them to keep the startup of
+# the CLI fast.
 
 
 class RepositoryActions(WriteableMixin):
@@ -24,7 +28,9 @@ class RepositoryActions(WriteableMixin):
                  checklist_path: str = None,
                  model : str = "gpt-3.5-turbo",
                  verbose: bool = False,
-                 debug: bool = False):
+                 debug: bool = False,
+                 requests_per_minute: int = None,
+                 tokens_per_minute: int = None):
         """Test spec generation.
 
         This will generate function specifications for each item in the
@@ -47,13 +53,27 @@ class RepositoryActions(WriteableMixin):
         debug : bool, optional
             If provided, the system will enable langchain's debug
             mode to expose all debug messages to the standard output.
+        requests_per_minute : int, optional
+            If provided, LLM calls will be delayed to stay within this number
+            of requests per minute.
+        tokens_per_minute : int, optional
+            If provided, LLM calls will be delayed to stay within this
+            estimated number of tokens per minute.
         """
+        from langchain_openai import ChatOpenAI
+        from langchain.globals import set_debug
+        from ..modules.workflow.prompt_format import GenerationPromptFormat
+        from ..modules.workflow.runners.generator import NaiveTestGenerator
+
         set_debug(debug)
         llm = ChatOpenAI(model=model, temperature=0)
         checklist = Checklist(checklist_path)
         prompt_format = GenerationPromptFormat()
+        rate_limiter = RateLimiter(requests_per_minute=requests_per_minute,
+                                   tokens_per_minute=tokens_per_minute)
 
-        generator = NaiveTestGenerator(llm, prompt_format, checklist=checklist)
+        generator = NaiveTestGenerator(llm, prompt_format, checklist=checklist,
+                                       rate_limiter=rate_limiter)
         result = generator.run(verbose=verbose)
 
         # FIXME: assume overwrite
@@ -68,7 +88,17 @@ class RepositoryActions(WriteableMixin):
                  checklist_path: str = None,
                  model="gpt-3.5-turbo", verbose: bool = False,
                  overwrite: bool = False, debug: bool = False,
-                 test_dirs: list[str] = None) -> None:
+                 test_dirs: list[str] = None, concurrency: int = 1,
+                 use_scan_index: bool = False, cache_mode: str = "off",
+                 cache_dir: str = None, baseline: str = None,
+                 resume: str = None, compact_response: bool = False,
+                 batch_token_budget: int = None,
+                 chunk_token_budget: int = None, jobs: int = 1,
+                 extract_context: bool = False, keep_docstrings: bool = False,
+                 max_literal_length: int = 200,
+                 requests_per_minute: int = None,
+                 tokens_per_minute: int = None,
+                 dry_run: bool = False) -> None:
         """Evaluate a given repo based on the completeness of the test suites.
 
         This will evaluate the completeness of the test suites given a git
@@ -84,7 +114,9 @@ class RepositoryActions(WriteableMixin):
             The path of the git repository to be analyzed.
         save_response_to : str, optional
             If provided, the JSON file saved would be in the specified
-            path instead of the default location.
+            path instead of the default location. If the path has the
+            extension `.jsonl`, the results will be written in the JSON Lines
+            format as soon as each file is evaluated.
         export_report_to : str, optional
             If provided, the system will render the evaluation report
             to the specified path. The format of the evaluation report will be
@@ -109,33 +141,157 @@ class RepositoryActions(WriteableMixin):
         debug : bool, optional
             If provided, the system will enable langchain's debug
             mode to expose all debug messages to the standard output.
+        concurrency : int, optional
+            Maximum number of test files to be evaluated at the same time.
+            Default is 1, i.e. files are evaluated one by one.
+        use_scan_index : bool, optional
+            If provided, the results of the repository scan will be persisted
+            in `.fixml/cache` under the repository, so that only new or
+            changed files are analyzed again in later runs.
+        cache_mode : str, optional
+            Whether to serve responses from and/or store responses in the
+            on-disk LLM response cache. Must be one of `off`, `read`, `write`
+            or `readwrite`. Default is `off`.
+        cache_dir : str, optional
+            Directory of the LLM response cache. Default is `~/.fixml/cache`.
+        baseline : str, optional
+            Path to the JSON file of a previous evaluation response of the
+            same repository. If provided, only test files changed since the
+            commit of the previous evaluation will be evaluated, and the
+            results of unchanged files will be copied from it.
+        resume : str, optional
+            Path to the JSON or JSONL file of an interrupted evaluation. Files
+            which already have a successful result for the same commit,
+            checklist and model will be skipped, and the remaining results
+            will be saved to the same file unless `save_response_to` is
+            provided. JSONL files are appended to.
+        compact_response : bool, optional
+            If provided, the checklist and the prompt template will be stored
+            once in the response, and the code of each file will be stored
+            once regardless of the number of attempts. Prompts are not stored
+            and will be reconstructed on demand.
+        batch_token_budget : int, optional
+            If provided, small test files will be evaluated together in the
+            same call, as long as the estimated number of tokens of their code
+            does not exceed this budget. The results are still stored per
+            file.
+        chunk_token_budget : int, optional
+            If provided, test files whose code exceeds this estimated number
+            of tokens will be split and evaluated in multiple calls, and the
+            evaluations will be merged per checklist item.
+        jobs : int, optional
+            Number of processes analyzing the files of the repository in
+            parallel. Default is 1.
+        extract_context : bool, optional
+            If provided, only the tests and the fixtures, helpers and
+            constants they reference will be sent to the LLM instead of the
+            whole test files.
+        keep_docstrings : bool, optional
+            If provided along with `extract_context`, docstrings will be kept
+            in the extracted code.
+        max_literal_length : int, optional
+            When `extract_context` is provided, literals longer than this
+            number of characters will be elided from the extracted code.
+            Default is 200.
+        requests_per_minute : int, optional
+            If provided, LLM calls will be delayed to stay within this number
+            of requests per minute, shared by all concurrent calls. Calls
+            failing because of a rate limit are always retried with backoff.
+        tokens_per_minute : int, optional
+            If provided, LLM calls will be delayed to stay within this
+            estimated number of tokens per minute, shared by all concurrent
+            calls.
+        dry_run : bool, optional
+            If provided, the prompts will be built without calling the LLM,
+            and the estimated number of tokens of each test file will be
+            reported instead, flagging the files which may exceed the context
+            window of the model. Nothing will be saved. The network is not
+            accessed: the tokens are counted with the tokenizer of the model
+            if its tiktoken encoding is already cached, and approximated from
+            the number of characters otherwise.
         """
-        if export_report_to:
+        if export_report_to and not dry_run:
             self._filedump_check(export_report_to, exist_ok=overwrite)
 
+        from langchain_openai import ChatOpenAI
+        from langchain.globals import set_debug
+        from ..modules.workflow.parse import ResponseParser
+        from ..modules.workflow.prompt_format import EvaluationPromptFormat
+        from ..modules.workflow.response import EvaluationResponse, \
+            JsonlResponseWriter
+        from ..modules.workflow.runners.evaluator import PerFileTestEvaluator
+
+        cache_mode = CacheMode(cache_mode)
         set_debug(debug)
         parsed_test_dirs = parse_list(test_dirs)
-        llm = ChatOpenAI(model=model, temperature=0)
+        # the client is never used in a dry run, so no API key is needed
+        llm = ChatOpenAI(model=model, temperature=0,
+                         **({"api_key": "dry-run"} if dry_run else {}))
         checklist = Checklist(checklist_path)
-        repo = Repository(repo_path)
+        repo = Repository(repo_path, use_scan_index=use_scan_index,
+                          workers=jobs)
         prompt_format = EvaluationPromptFormat()
+        context_policy = None
+        if extract_context:
+            context_policy = ContextPolicy(
+                strip_docstrings=not keep_docstrings,
+                max_literal_length=max_literal_length)
+        cache = None
+        if cache_mode != CacheMode.OFF:
+            cache = ResponseCache(cache_dir, mode=cache_mode)
+        rate_limiter = RateLimiter(requests_per_minute=requests_per_minute,
+                                   tokens_per_minute=tokens_per_minute)
 
         evaluator = PerFileTestEvaluator(llm, prompt_format=prompt_format,
                                          repository=repo, checklist=checklist,
-                                         test_dirs=parsed_test_dirs)
-        response = evaluator.run(verbose=verbose)
-
-        if not save_response_to:
-            repo_name = response.repository.object.root.stem
-            commit_hash = response.repository.git_commit
-            eval_time = response.call_results[0].start_time.timestamp()
-            response_output_path = Path(
-                f"./evaluation_{repo_name}_{commit_hash}_{eval_time:0.0f}.json"
-            ).resolve()
-        else:
-            response_output_path = Path(save_response_to).resolve()
+                                         test_dirs=parsed_test_dirs,
+                                         concurrency=concurrency, cache=cache,
+                                         compact=compact_response,
+                                         batch_token_budget=batch_token_budget,
+                                         chunk_token_budget=chunk_token_budget,
+                                         context_policy=context_policy,
+                                         rate_limiter=rate_limiter)
+        if dry_run:
+            self._print_estimates(evaluator.estimate(), repo.root, model)
+            return
+        baseline_response = None
+        if baseline:
+            baseline_response = EvaluationResponse.from_json(
+                baseline, repository=repo, checklist=checklist)
+        resume_response = None
+        if resume:
+            resume_response = EvaluationResponse.from_json(
+                resume, repository=repo, checklist=checklist)
+            if not save_response_to:
+                save_response_to = resume
+        resuming_in_place = bool(resume) and \
+            Path(resume).resolve() == Path(save_response_to).resolve()
 
-        response.to_json(output_path=response_output_path, exist_ok=overwrite)
+        if save_response_to and get_extension(save_response_to) == "jsonl":
+            # stream the call results into the file as they are obtained
+            response_output_path = Path(save_response_to).resolve()
+            with JsonlResponseWriter(response_output_path,
+                                     exist_ok=overwrite,
+                                     append=resuming_in_place) as writer:
+                response = evaluator.run(verbose=verbose,
+                                         baseline=baseline_response,
+                                         resume=resume_response,
+                                         writer=writer)
+        else:
+            response = evaluator.run(verbose=verbose,
+                                     baseline=baseline_response,
+                                     resume=resume_response)
+            if not save_response_to:
+                repo_name = response.repository.object.root.stem
+                commit_hash = response.repository.git_commit
+                eval_time = response.call_results[0].start_time.timestamp()
+                response_output_path = Path(
+                    f"./evaluation_{repo_name}_{commit_hash}_{eval_time:0.0f}.json"
+                ).resolve()
+            else:
+                response_output_path = Path(save_response_to).resolve()
+            response.to_json(output_path=response_output_path,
+                             exist_ok=overwrite or resuming_in_place)
         print(f"Evaluation response saved to {response_output_path}.")
 
         if export_report_to:
@@ -145,7 +301,99 @@ class RepositoryActions(WriteableMixin):
             print(f"Evaluation report exported to {export_report_to}.")
 
     @staticmethod
-    def list_tests(repo_path: str, test_dirs: list[str] = None):
+    def batch(config_yml: str, concurrency: int = 1,
+              use_scan_index: bool = False, jobs: int = 1,
+              requests_per_minute: int = None, tokens_per_minute: int = None,
+              batch_token_budget: int = None, chunk_token_budget: int = None,
+              verbose: bool = False, debug: bool = False) -> None:
+        """Evaluate multiple repositories multiple times.
+
+        The repositories, the number of runs, the model and the directory of
+        the responses are given in a YAML file with the keys `runs`,
+        `checklist_path`, `model`, `repo_base_path`, `response_path` and
+        `repo`, a list of repositories with a `name` and a `path`. The
+        response of each run is saved to `<response_path>/<name>_<run>.json`
+        and recorded in `<response_path>/record.yml` once completed. Runs
+        already recorded are skipped, so that an interrupted batch run can be
+        restarted with the same command.
+
+        Parameters
+        ----------
+        config_yml : str
+            Path of the YAML file of the batch run.
+        concurrency : int, optional
+            Maximum number of LLM calls in flight across all repositories and
+            runs. Default is 1.
+        use_scan_index : bool, optional
+            If provided, the results of the repository scans will be persisted
+            in `.fixml/cache` under each repository.
+        jobs : int, optional
+            Number of processes analyzing the files of each repository in
+            parallel. Default is 1.
+        requests_per_minute : int, optional
+            If provided, LLM calls will be delayed to stay within this number
+            of requests per minute across all runs.
+        tokens_per_minute : int, optional
+            If provided, LLM calls will be delayed to stay within this
+            estimated number of tokens per minute across all runs.
+        batch_token_budget : int, optional
+            See `evaluate`.
+        chunk_token_budget : int, optional
+            See `evaluate`.
+        verbose : bool, optional
+            If provided, the system will print out the errors encountered.
+        debug : bool, optional
+            If provided, the system will enable langchain's debug
+            mode to expose all debug messages to the standard output.
+        """
+        from langchain_openai import ChatOpenAI
+        from langchain.globals import set_debug
+        from ..modules.workflow.batch import BatchConfig, BatchRunner
+
+        set_debug(debug)
+        config = BatchConfig.from_yaml(config_yml)
+        llm = ChatOpenAI(model=config.model, temperature=0)
+        rate_limiter = RateLimiter(requests_per_minute=requests_per_minute,
+                                   tokens_per_minute=tokens_per_minute)
+        runner = BatchRunner(
+            config, llm, concurrency=concurrency, rate_limiter=rate_limiter,
+            repository_kwargs={'use_scan_index': use_scan_index,
+                               'workers': jobs},
+            evaluator_kwargs={'batch_token_budget': batch_token_budget,
+                              'chunk_token_budget': chunk_token_budget})
+        entries = runner.run(verbose=verbose)
+        print(f"{len(entries)} run(s) completed. Run record saved to "
+              f"{config.record_path}.")
+
+    @staticmethod
+    def _print_estimates(estimates: list['TokenEstimate'], root: Path,
+                         model: str) -> None:
+        """Print the token estimates of a dry run."""
+        print(f"Estimated tokens for {model} (no calls were made):")
+        print(f"{'file':<60}{'calls':>6}{'input':>10}{'output':>10}")
+        for estimate in estimates:
+            file = str(Path(estimate.file).relative_to(root))
+            flag = "  exceeds context window!" \
+                if estimate.exceeds_context_window else ""
+            calls = estimate.calls if estimate.batch_size == 1 else \
+                f"{estimate.calls}/{estimate.batch_size}"
+            print(f"{file:<60}{calls:>6}{estimate.input_count:>10}"
+                  f"{estimate.output_count:>10}{flag}")
+
+        total_calls = round(sum(x.calls / x.batch_size for x in estimates))
+        total_input = sum(x.input_count for x in estimates)
+        total_output = sum(x.output_count for x in estimates)
+        print(f"{'total':<60}{total_calls:>6}{total_input:>10}"
+              f"{total_output:>10}")
+        exceeding = sum(x.exceeds_context_window for x in estimates)
+        if exceeding:
+            print(f"{exceeding} file(s) may exceed the context window of "
+                  f"{model}. Consider using `--chunk_token_budget` or a smaller "
+                  f"`--batch_token_budget`.")
+
+    @staticmethod
+    def list_tests(repo_path: str, test_dirs: list[str] = None,
+                   use_scan_index: bool = False, jobs: int = 1):
         """List out all tests found in this repository.
 
         Parameters
@@ -157,10 +405,18 @@ class RepositoryActions(WriteableMixin):
             located. If provided, only files inside these directories will be
             scanned. Otherwise, all files in the repository will be scanned,
             which is the default behaviour.
+        use_scan_index : bool, optional
+            If provided, the results of the repository scan will be persisted
+            in `.fixml/cache` under the repository, so that only new or
+            changed files are analyzed again in later runs.
+        jobs : int, optional
+            Number of processes analyzing the files of the repository in
+            parallel. Default is 1.
         """
 
         dirs = parse_list(test_dirs)
-        repo = Repository(repo_path)
+        repo = Repository(repo_path, use_scan_index=use_scan_index,
+                          workers=jobs)
         test_lang_file_map = repo.list_test_files(test_dirs=dirs)
         print("Test files found:")
         for lang, files in test_lang_file_map.items():
@@ -3,6 +3,7 @@ from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
 from .modules.workflow.prompt_format import EvaluationPromptFormat
+from .modules.workflow.rate_limit import RateLimiter
 from .modules.workflow.runners.evaluator import PerFileTestEvaluator
 from .modules.checklist.checklist import Checklist, ChecklistFormat
 from .modules.code_analyzer.repo import Repository
@@ -12,8 +13,10 @@ load_dotenv()
 
 
 if __name__ == '__main__':
-    def main(checklist_path, repo_path):
+    def main(checklist_path, repo_path, num_test_runs=2, concurrency=1,
+             requests_per_minute=None, tokens_per_minute=None):
         checklist = Checklist(checklist_path)
+        # the repository is scanned once and shared by all evaluators
         repo = Repository(repo_path)
         prompt_format = EvaluationPromptFormat()
 
@@ -22,14 +25,20 @@ if __name__ == '__main__':
         evaluator35 = PerFileTestEvaluator(gpt35, prompt_format=prompt_format, repository=repo, checklist=checklist)
         evaluator4o = PerFileTestEvaluator(gpt4o, prompt_format=prompt_format, repository=repo, checklist=checklist)
 
-        consist_eval = ConsistencyEvaluator()
+        rate_limiter = RateLimiter(requests_per_minute=requests_per_minute,
+                                   tokens_per_minute=tokens_per_minute)
+        consist_eval = ConsistencyEvaluator(concurrency=concurrency,
+                                            rate_limiter=rate_limiter)
         consist_eval.evaluate(
             models=[
                 {'name': 'gpt-3.5-turbo', 'model': evaluator35},
                 {'name': 'gpt-4o', 'model': evaluator4o}
             ],
+            num_test_runs=num_test_runs,
             verbose=True
         )
+        print(consist_eval.get_completeness_score_dist())
+        print(consist_eval.get_consistency_dist())
 
 
     fire.Fire(main)
@@ -1,12 +1,12 @@
 from abc import ABC, abstractmethod
-import codecs
+import io
 import ast
 from typing import Union
 from pathlib import Path
 from functools import wraps
 from collections import defaultdict
 
-from chardet import detect
+from ..encoding import read_source
 
 
 def assert_have_read_content(f):
@@ -21,8 +21,18 @@ def assert_have_read_content(f):
 
 class CodeAnalyzer(ABC):
 
-    @abstractmethod
     def read(self, file_path: Union[str, Path]) -> None:
+        """Read and decode a file, then load its content."""
+        try:
+            content = read_source(file_path)
+        except (OSError, UnicodeDecodeError) as e:
+            raise RuntimeError("Failed to read file.") from e
+        self.load(content)
+
+    @abstractmethod
+    def load(self, content: str) -> None:
+        """Load content which has already been decoded, e.g. to share the
+        content of a file between analyzers."""
         pass
 
     @abstractmethod
@@ -37,24 +47,104 @@ class CodeAnalyzer(ABC):
     def contains_test(self):
         pass
 
-    def _determine_encodings(self, file_path: Union[str, Path]) -> str:
+
+class PythonFactCollector(ast.NodeVisitor):
+    """Collect all the facts needed by `PythonASTCodeAnalyzer` in a single
+    traversal of the syntax tree.
+
+    Attributes
+    ----------
+    imports : set
+        Modules imported by `import` and `from ... import` statements,
+        except relative imports.
+    functions : dict
+        Mapping of the names of all functions, including methods and nested
+        functions, to their line numbers. Async functions are not included.
+        If a name is defined multiple times, the last definition in
+        breadth-first order (as in `ast.walk`) wins, i.e. the most deeply
+        nested one, then the last one.
+    test_functions : list
+        Qualified names of functions and methods whose names start with
+        `test` (case-insensitive), e.g. `TestModel.test_fit`.
+    has_test_assertion : bool
+        Whether any test function contains an `assert` statement.
+    definitions : list
+        Details of every function definition in order of appearance, i.e.
+        the qualified name, start and end lines, enclosing class, decorators
+        and whether it is async.
+    """
+
+    def __init__(self):
+        self.imports = set()
+        self.functions = {}
+        self.test_functions = []
+        self.has_test_assertion = False
+        self.definitions = []
+        # names of the enclosing classes and functions, with a flag telling
+        # whether the scope is a class
+        self._scopes = []
+        self._test_depth = 0
+        # depth of the current node in the tree, and of the definition of
+        # each name in `functions`
+        self._depth = 0
+        self._function_depths = {}
+
+    def visit(self, node: ast.AST):
+        self._depth += 1
         try:
-            with open(file_path, 'rb') as f:
-                result = detect(f.read())
-            encoding = result['encoding']
-            if not encoding:
-                # chardet failed to detect encoding, returning `utf-8` as
-                # fallback
-                return 'utf-8'
-            # make sure that python can read this codec, if not, a Lookup Error
-            # will be raised
-            codecs.lookup(encoding)
-            return encoding
-        except LookupError as e:
-            print("failed to extract codec that is readable by Python, "
-                  "cowardly returning None...")
-            print("error:", e.__class__.__name__, str(e))
-            return None
+            return super().visit(node)
+        finally:
+            self._depth -= 1
+
+    def visit_Import(self, node: ast.Import):
+        self.imports.update(alias.name for alias in node.names)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        # relative imports refer to modules of the same package
+        if node.level == 0:
+            self.imports.add(node.module)
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._scopes.append((node.name, True))
+        self.generic_visit(node)
+        self._scopes.pop()
+
+    def _visit_function(self, node: Union[ast.FunctionDef,
+                                          ast.AsyncFunctionDef]):
+        qualname = '.'.join([name for name, _ in self._scopes] + [node.name])
+        in_class = bool(self._scopes) and self._scopes[-1][1]
+        # nodes of the same depth are visited in the same order by a
+        # depth-first and a breadth-first traversal
+        if isinstance(node, ast.FunctionDef) and \
+                self._depth >= self._function_depths.get(node.name, 0):
+            self.functions[node.name] = node.lineno
+            self._function_depths[node.name] = self._depth
+        self.definitions.append({
+            'name': node.name,
+            'qualname': qualname,
+            'lineno': node.lineno,
+            'end_lineno': node.end_lineno,
+            'class_name': self._scopes[-1][0] if in_class else None,
+            'decorators': [ast.unparse(x) for x in node.decorator_list],
+            'is_async': isinstance(node, ast.AsyncFunctionDef),
+        })
+        is_test = node.name.lower().startswith('test')
+        if is_test:
+            self.test_functions.append(qualname)
+            self._test_depth += 1
+        self._scopes.append((node.name, False))
+        self.generic_visit(node)
+        self._scopes.pop()
+        if is_test:
+            self._test_depth -= 1
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_Assert(self, node: ast.Assert):
+        if self._test_depth:
+            self.has_test_assertion = True
+        self.generic_visit(node)
 
 
 class PythonASTCodeAnalyzer(CodeAnalyzer):
@@ -62,40 +152,29 @@ class PythonASTCodeAnalyzer(CodeAnalyzer):
         super().__init__()
         self.content = None
         self._tree = None
+        self._facts = None
 
-    def read(self, file_path: Union[str, Path]):
-        # TODO: duplicated code
-        try:
-            with open(file_path, 'r') as f:
-                self.content = f.read()
-        except Exception as e:
-            print("exception occurred when reading the file. (Wrong encoding?)")
-            print("trying to detect encoding and retry reading it...")
-            try:
-                encoding = self._determine_encodings(file_path)
-                with open(file_path, 'r', encoding=encoding) as f:
-                    self.content = f.read()
-            except Exception as e:
-                raise RuntimeError("Failed to read file.")
+    def load(self, content: str):
+        self.content = content
         self._tree = ast.parse(self.content)
+        self._facts = None
+
+    @property
+    def facts(self) -> PythonFactCollector:
+        """Facts of the loaded content, collected on first access."""
+        if self._facts is None:
+            facts = PythonFactCollector()
+            facts.visit(self._tree)
+            self._facts = facts
+        return self._facts
 
     @assert_have_read_content
     def _get_function_lineno_map(self):
-        function_lineno_map = defaultdict(int)
-        for node in ast.walk(self._tree):
-            if isinstance(node, ast.FunctionDef):
-                function_lineno_map[node.name] = node.lineno
-        return function_lineno_map
+        return defaultdict(int, self.facts.functions)
 
     @assert_have_read_content
     def list_imported_packages(self):
-        packages = set()
-        for node in ast.walk(self._tree):
-            if isinstance(node, ast.Import):
-                packages.update(alias.name for alias in node.names)
-            elif isinstance(node, ast.ImportFrom):
-                packages.add(node.module)
-        return packages
+        return set(self.facts.imports)
 
     @assert_have_read_content
     def list_all_functions(self):
@@ -111,19 +190,14 @@ class PythonASTCodeAnalyzer(CodeAnalyzer):
         This will check the following conditions:
         1. If unittest or pytest modules is loaded, returns true.
         2. If unittest or pytest modules is *not* loaded, check if there is a
-        function name that starts with `test` (case-insensitive). If found,
-        further check if the content of this function contain assertions
-        i.e. `assert` - returns true if found.
+        function (or method) name that starts with `test`
+        (case-insensitive). If found, further check if the content of this
+        function contain assertions i.e. `assert` - returns true if found.
         """
-        packages = self.list_imported_packages()
+        packages = self.facts.imports
         if 'unittest' in packages or 'pytest' in packages:
             return True
-        for node in ast.walk(self._tree):
-            if isinstance(node, ast.FunctionDef) and node.name.lower().startswith('test'):
-                for child_node in ast.walk(node):
-                    if isinstance(child_node, ast.Assert):
-                        return True
-        return False
+        return self.facts.has_test_assertion
 
 
 class PythonNaiveCodeAnalyzer(CodeAnalyzer):
@@ -131,20 +205,8 @@ class PythonNaiveCodeAnalyzer(CodeAnalyzer):
         super().__init__()
         self.content = None
 
-    def read(self, file_path: Union[str, Path]):
-        # TODO: duplicated code
-        try:
-            with open(file_path, 'r') as f:
-                self.content = f.readlines()
-        except Exception as e:
-            print("exception occurred when reading the file. (Wrong encoding?)")
-            print("trying to detect encoding and retry reading it...")
-            try:
-                encoding = self._determine_encodings(file_path)
-                with open(file_path, 'r', encoding=encoding) as f:
-                    self.content = f.readlines()
-            except Exception as e:
-                raise RuntimeError("Failed to read file.")
+    def load(self, content: str):
+        self.content = io.StringIO(content).readlines()
 
     @assert_have_read_content
     def _get_function_lineno_map(self):
@@ -160,7 +222,10 @@ class PythonNaiveCodeAnalyzer(CodeAnalyzer):
         packages = set()
         for line in self.content:
             if line.startswith('from ') or line.startswith('import '):
-                packages.add(line.split()[1].split(".")[0])
+                module = line.split()[1]
+                # relative imports refer to modules of the same package
+                if not module.startswith('.'):
+                    packages.add(module.split(".")[0])
             else:
                 continue
         return list(packages)
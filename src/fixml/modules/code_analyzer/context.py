@@ -0,0 +1,211 @@
+import ast
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class ContextPolicy(BaseModel):
+    """Policy of what to keep when extracting the test context of a file."""
+    include_helpers: bool = Field(
+        description="Whether to keep the module-level fixtures, helpers, "
+                    "classes and constants referenced by the tests",
+        default=True)
+    strip_docstrings: bool = Field(
+        description="Whether to replace docstrings with `...`",
+        default=True)
+    max_literal_length: Optional[int] = Field(
+        description="Literals (strings, bytes, and list, tuple, set or dict "
+                    "displays) whose source is longer than this number of "
+                    "characters are replaced with `...`. None keeps all "
+                    "literals.",
+        default=200)
+
+
+def _is_test_name(name: str) -> bool:
+    return name.lower().startswith('test')
+
+
+def _get_defined_names(node: ast.stmt) -> set[str]:
+    """Names bound by a module-level statement."""
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                         ast.ClassDef)):
+        return {node.name}
+    targets = []
+    if isinstance(node, ast.Assign):
+        targets = node.targets
+    elif isinstance(node, (ast.AnnAssign, ast.AugAssign)):
+        targets = [node.target]
+    return {x.id for target in targets for x in ast.walk(target)
+            if isinstance(x, ast.Name)}
+
+
+def _get_referenced_names(node: ast.stmt) -> set[str]:
+    """Names a statement may depend on, including the parameters of
+    functions, which are resolved as fixtures by pytest, and string
+    constants, e.g. in `pytest.mark.usefixtures("name")`."""
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            names.add(child.id)
+        elif isinstance(child, ast.arg):
+            names.add(child.arg)
+        elif isinstance(child, ast.Constant) and isinstance(child.value, str):
+            names.add(child.value)
+    return names
+
+
+def _is_test(node: ast.stmt) -> bool:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return _is_test_name(node.name)
+    if isinstance(node, ast.ClassDef):
+        return _is_test_name(node.name) or any(
+            isinstance(x, (ast.FunctionDef, ast.AsyncFunctionDef)) and
+            _is_test_name(x.name) for x in node.body)
+    return False
+
+
+def _is_always_relevant(node: ast.stmt) -> bool:
+    """Imports, module-level marks and autouse fixtures affect all tests."""
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return True
+    if 'pytestmark' in _get_defined_names(node):
+        return True
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return any(isinstance(x, ast.keyword) and x.arg == 'autouse'
+                   for decorator in node.decorator_list
+                   for x in ast.walk(decorator))
+    return False
+
+
+class _ElisionCollector(ast.NodeVisitor):
+    """Collect the nodes to be replaced with `...` under a policy."""
+
+    def __init__(self, policy: ContextPolicy, segment_length):
+        self.policy = policy
+        self.segment_length = segment_length
+        self.elided = []
+
+    def _visit_body_owner(self, node):
+        body = getattr(node, 'body', [])
+        if self.policy.strip_docstrings and body and \
+                isinstance(body[0], ast.Expr) and \
+                isinstance(body[0].value, ast.Constant) and \
+                isinstance(body[0].value.value, str):
+            self.elided.append(body[0].value)
+            for child in ast.iter_child_nodes(node):
+                if child is not body[0]:
+                    self.visit(child)
+        else:
+            self.generic_visit(node)
+
+    visit_FunctionDef = _visit_body_owner
+    visit_AsyncFunctionDef = _visit_body_owner
+    visit_ClassDef = _visit_body_owner
+
+    def _visit_literal(self, node):
+        max_length = self.policy.max_literal_length
+        if max_length is not None and self.segment_length(node) > max_length:
+            self.elided.append(node)
+        else:
+            self.generic_visit(node)
+
+    visit_Constant = _visit_literal
+    visit_JoinedStr = _visit_literal
+    visit_List = _visit_literal
+    visit_Tuple = _visit_literal
+    visit_Set = _visit_literal
+    visit_Dict = _visit_literal
+
+
+def extract_test_context(content: str,
+                         policy: Optional[ContextPolicy] = None) -> str:
+    """Extract the code relevant to the tests of a Python file.
+
+    Module-level test functions and test classes are kept along with the
+    imports, autouse fixtures and module-level marks. Under the default
+    policy, the fixtures, helpers, classes and constants they reference
+    (transitively) are kept as well, and docstrings and large literals are
+    replaced with `...`. Comments inside the kept statements are preserved.
+
+    Parameters
+    ----------
+    content : str
+        Source code of the file.
+    policy : ContextPolicy, optional
+        What to keep. Defaults to `ContextPolicy()`.
+
+    Returns
+    -------
+    str
+        The extracted code. If the file cannot be parsed or contains no
+        module-level tests, the content is returned unchanged.
+    """
+    policy = policy or ContextPolicy()
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return content
+    statements = tree.body
+    if not any(_is_test(node) for node in statements):
+        return content
+
+    selected = {i for i, node in enumerate(statements)
+                if _is_test(node) or _is_always_relevant(node)}
+    if policy.include_helpers:
+        definitions = {}
+        for i, node in enumerate(statements):
+            for name in _get_defined_names(node):
+                definitions.setdefault(name, []).append(i)
+        pending = list(selected)
+        while pending:
+            node = statements[pending.pop()]
+            for name in _get_referenced_names(node):
+                for i in definitions.get(name, []):
+                    if i not in selected:
+                        selected.add(i)
+                        pending.append(i)
+
+    # AST offsets are in bytes of the UTF-8 encoded lines
+    lines = content.encode('utf-8').splitlines(keepends=True)
+    line_offsets = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+    data = b''.join(lines)
+
+    def offset(lineno: int, col: int) -> int:
+        return line_offsets[lineno - 1] + col
+
+    def segment_length(node: ast.AST) -> int:
+        return offset(node.end_lineno, node.end_col_offset) - \
+            offset(node.lineno, node.col_offset)
+
+    extracted = ''
+    previous = None
+    for i in sorted(selected):
+        node = statements[i]
+        start_lineno = min([node.lineno] + [x.lineno for x in
+                                            getattr(node, 'decorator_list', [])])
+        start = offset(start_lineno, 0)
+        # trailing comments on the last line are kept
+        end = line_offsets[node.end_lineno]
+
+        collector = _ElisionCollector(policy, segment_length)
+        collector.visit(node)
+        segment = data[start:end]
+        for elided in sorted(collector.elided, reverse=True,
+                             key=lambda x: (x.lineno, x.col_offset)):
+            elided_start = offset(elided.lineno, elided.col_offset) - start
+            elided_end = offset(elided.end_lineno,
+                                elided.end_col_offset) - start
+            segment = segment[:elided_start] + b'...' + segment[elided_end:]
+
+        imports = (ast.Import, ast.ImportFrom)
+        if previous is not None:
+            # consecutive imports are kept together
+            adjacent = isinstance(node, imports) and \
+                isinstance(previous, imports)
+            extracted += '\n' if adjacent else '\n\n'
+        extracted += segment.decode('utf-8').rstrip('\r\n')
+        previous = node
+
+    return extracted + '\n'
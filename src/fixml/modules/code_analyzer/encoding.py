@@ -0,0 +1,123 @@
+import io
+import codecs
+import tokenize
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from chardet import detect
+
+# number of bytes given to chardet when the encoding has to be guessed
+DETECTION_SAMPLE_SIZE = 64 * 1024
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def _get_declared_encoding(data: bytes) -> Optional[str]:
+    """Return the encoding declared by a BOM or a PEP 263 coding cookie."""
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            return encoding
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+    except SyntaxError:
+        # invalid or unknown coding cookie
+        return None
+    # `detect_encoding` defaults to utf-8 when nothing is declared, which is
+    # tried anyway
+    return None if encoding == 'utf-8' else encoding
+
+
+def detect_encoding(data: bytes,
+                    sample_size: Optional[int] = DETECTION_SAMPLE_SIZE
+                    ) -> Optional[str]:
+    """Guess the encoding of undeclared non-UTF-8 content with chardet.
+
+    Parameters
+    ----------
+    data : bytes
+        Raw content of the file.
+    sample_size : int, optional
+        Number of bytes inspected from the start of the content. Default is
+        `DETECTION_SAMPLE_SIZE`. If None, the whole content is inspected.
+
+    Returns
+    -------
+    str or None
+        The detected encoding, or None if no encoding readable by Python can
+        be detected.
+    """
+    sample = data if sample_size is None else data[:sample_size]
+    encoding = detect(sample)['encoding']
+    if not encoding:
+        return None
+    try:
+        # make sure that python can read this codec
+        codecs.lookup(encoding)
+    except LookupError:
+        return None
+    return encoding
+
+
+def _get_fallback_encodings(data: bytes) -> Iterator[Optional[str]]:
+    """Lazily yield the encodings to try once UTF-8 fails, from the most to
+    the least likely."""
+    yield detect_encoding(data)
+    if len(data) > DETECTION_SAMPLE_SIZE:
+        # the sample may not contain any of the non-ASCII bytes
+        yield detect_encoding(data, sample_size=None)
+    # legacy Windows encoding of most Western source files, then latin-1,
+    # which decodes any content
+    yield 'cp1252'
+    yield 'latin-1'
+
+
+def decode_source(data: bytes) -> str:
+    """Decode the content of a source file.
+
+    The encoding declared by a byte order mark or a PEP 263 coding cookie is
+    honoured. Otherwise, the content is decoded as UTF-8, and only if that
+    fails, the encoding is guessed from a bounded sample, then from the
+    whole content. Content which cannot be decoded with the guessed
+    encodings is decoded as cp1252, or as a last resort as latin-1. As with
+    files opened in text mode, line endings are normalized to `\\n`.
+
+    Parameters
+    ----------
+    data : bytes
+        Raw content of the file.
+
+    Returns
+    -------
+    str
+        The decoded content.
+    """
+    encodings = [_get_declared_encoding(data), 'utf-8']
+    text = None
+    for encoding in dict.fromkeys(x for x in encodings if x):
+        try:
+            text = data.decode(encoding)
+            break
+        except (UnicodeDecodeError, LookupError):
+            continue
+    if text is None:
+        for encoding in _get_fallback_encodings(data):
+            if encoding is None:
+                continue
+            try:
+                text = data.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def read_source(file_path: Union[str, Path]) -> str:
+    """Read and decode a source file, reading its bytes only once."""
+    with open(file_path, 'rb') as f:
+        return decode_source(f.read())
@@ -0,0 +1,90 @@
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from .scan import FunctionInfo
+
+
+class FunctionIndex:
+    """Index of the functions defined in a file.
+
+    Functions can be looked up by qualified name, by bare name and by line
+    number in constant or logarithmic time.
+
+    Parameters
+    ----------
+    functions : Iterable[FunctionInfo]
+        The functions defined in the file.
+    """
+
+    def __init__(self, functions: Iterable[FunctionInfo] = ()):
+        self.functions = sorted(functions, key=lambda x: (x.lineno, -x.end_lineno))
+        self._starts = [func.lineno for func in self.functions]
+
+        self._by_qualname = {}
+        by_name = defaultdict(list)
+        for func in self.functions:
+            self._by_qualname[func.qualname] = func
+            by_name[func.name].append(func)
+        # functions sharing a bare name are ranked such that test functions,
+        # then the least nested ones, then the earliest ones come first
+        self._by_name = {
+            name: sorted(funcs, key=lambda x: (
+                not x.name.lower().startswith('test'),
+                x.qualname.count('.'),
+                x.lineno
+            ))
+            for name, funcs in by_name.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.functions)
+
+    def __contains__(self, name: str) -> bool:
+        return self.resolve(name) is not None
+
+    def get(self, qualname: str) -> Optional[FunctionInfo]:
+        """Look up a function by its qualified name."""
+        return self._by_qualname.get(qualname)
+
+    def find(self, name: str) -> list[FunctionInfo]:
+        """Look up all functions with a bare name, best match first."""
+        return list(self._by_name.get(name, []))
+
+    def at_line(self, lineno: int) -> Optional[FunctionInfo]:
+        """Return the innermost function whose definition spans a line."""
+        i = bisect_right(self._starts, lineno)
+        while i > 0:
+            i -= 1
+            func = self.functions[i]
+            if func.end_lineno >= lineno:
+                return func
+        return None
+
+    def resolve(self, name: str) -> Optional[FunctionInfo]:
+        """Find the function referred to by a name returned from the LLM.
+
+        The name can be a bare name, a qualified name (`TestModel.test_fit`)
+        or a pytest node ID (`tests/test_model.py::TestModel::test_fit`),
+        optionally followed by parentheses.
+
+        Returns
+        -------
+        FunctionInfo or None
+            The best matching function, or None if there is no such function.
+        """
+        name = name.strip().removesuffix('()').replace('::', '.')
+        if '.py.' in name:
+            name = name.split('.py.', 1)[1]
+        if '.' not in name:
+            candidates = self._by_name.get(name)
+            return candidates[0] if candidates else None
+
+        func = self._by_qualname.get(name)
+        if func is not None:
+            return func
+        # the qualified name may be missing some of the outer scopes
+        for func in self._by_name.get(name.rsplit('.', 1)[1], []):
+            if func.qualname.endswith('.' + name):
+                return func
+        return None
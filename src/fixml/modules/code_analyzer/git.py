@@ -3,7 +3,7 @@ from typing import Union, Optional
 from pathlib import Path
 from copy import copy
 
-from git import Repo
+from git import Repo, GitCommandError
 
 
 class GitContext:
@@ -80,6 +80,58 @@ class GitContext:
             print("This git repository has no remote")
             return None, None, "."
 
+    def list_changed_files(self, since_commit: str) -> set[str]:
+        """List files changed in the working tree since a given commit.
+
+        This includes files changed in commits between `since_commit` and
+        HEAD, uncommitted changes and untracked files.
+
+        Parameters
+        ----------
+        since_commit : str
+            The commit to be compared against.
+
+        Returns
+        -------
+        set[str]
+            Paths of the changed files relative to the repository root.
+        """
+        try:
+            # paths are separated by NUL bytes, as otherwise git quotes the
+            # paths with non-ASCII characters
+            diff = self.git_repo.git.diff("-z", "--name-only", "--no-renames",
+                                          since_commit, "--")
+        except GitCommandError as e:
+            raise ValueError(f"Unable to compare against commit "
+                             f"{since_commit}.") from e
+        changed = {file for file in diff.split("\0") if file}
+        changed.update(self.git_repo.untracked_files)
+        return changed
+
+    def list_files(self, include_untracked: bool = True) -> list[str]:
+        """List files known to git from its index.
+
+        Files deleted from the working tree are excluded.
+
+        Parameters
+        ----------
+        include_untracked : bool, optional
+            If True, untracked files which are not ignored by `.gitignore`
+            are included as well. Default is True.
+
+        Returns
+        -------
+        list[str]
+            Paths of the files relative to the repository root.
+        """
+        args = ["-z", "--cached"]
+        if include_untracked:
+            args += ["--others", "--exclude-standard"]
+        files = self.git_repo.git.ls_files(*args).split("\0")
+        deleted = set(self.git_repo.git.ls_files("-z", "--deleted").split("\0"))
+        return [file for file in dict.fromkeys(files)
+                if file and file not in deleted]
+
     def construct_remote_link_to_file(self, file_path: Union[str, Path],
                                       line_num: Optional[int] = None) -> str:
         path = Path(file_path)
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import hashlib
+import logging
+from pathlib import Path
+from importlib.metadata import version, PackageNotFoundError
+from typing import Iterable, Optional, Union
+
+from .scan import ANALYZER_VERSION, FileRecord, FileSignature
+
+logger = logging.getLogger("fixml.index")
+
+
+def _get_fixml_version() -> str:
+    try:
+        return version("fixml")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def hash_file(file_path: Union[str, Path]) -> str:
+    """Compute the SHA-256 hex digest of the content of a file."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ScanIndex:
+    """Persistent on-disk index of file records produced by repository scans.
+
+    Records are stored in a SQLite database, keyed by the path of the file
+    relative to the repository root. A stored record is reused if the file's
+    modification time and size are unchanged. If only the modification time
+    differs (e.g. after a fresh checkout), the content hash is compared
+    before the record is reused.
+
+    The whole index is invalidated when the version of fixml or of the
+    analyzers differs from the one used to build the index.
+    """
+    filename = "scan-index.sqlite"
+
+    def __init__(self, index_dir: Union[str, Path], root: Union[str, Path]):
+        self.root = Path(root)
+        self.path = Path(index_dir) / self.filename
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.versions = {
+            "fixml_version": _get_fixml_version(),
+            "analyzer_version": ANALYZER_VERSION,
+        }
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta "
+                           "(key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS records "
+                           "(path TEXT PRIMARY KEY, mtime_ns INTEGER, "
+                           "size INTEGER, sha256 TEXT, record TEXT)")
+        self._invalidate_if_outdated()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _invalidate_if_outdated(self) -> None:
+        stored = dict(self._conn.execute("SELECT key, value FROM meta"))
+        if stored != self.versions:
+            if stored:
+                logger.info("Scan index is outdated. Rebuilding...")
+            with self._conn:
+                self._conn.execute("DELETE FROM records")
+                self._conn.execute("DELETE FROM meta")
+                self._conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                                       self.versions.items())
+
+    def _key(self, file_path: Union[str, Path]) -> str:
+        return str(Path(file_path).relative_to(self.root))
+
+    def get(self, file_path: Union[str, Path]) -> Optional[FileRecord]:
+        """Return the stored record of a file if the file is unchanged.
+
+        Parameters
+        ----------
+        file_path : str or pathlib.Path
+            Absolute path of the file inside the repository.
+
+        Returns
+        -------
+        FileRecord or None
+            The stored record, or None if there is no valid record.
+        """
+        key = self._key(file_path)
+        row = self._conn.execute(
+            "SELECT mtime_ns, size, sha256, record FROM records WHERE path = ?",
+            (key,)
+        ).fetchone()
+        stat = os.stat(file_path)
+        record = None
+        if row is not None and row[1] == stat.st_size:
+            mtime_ns, _, sha256, record_json = row
+            if stat.st_mtime_ns == mtime_ns:
+                record = record_json
+            elif hash_file(file_path) == sha256:
+                self._conn.execute(
+                    "UPDATE records SET mtime_ns = ? WHERE path = ?",
+                    (stat.st_mtime_ns, key))
+                record = record_json
+
+        if record is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        signature = FileSignature(mtime_ns=stat.st_mtime_ns,
+                                  size=stat.st_size, sha256=sha256)
+        return FileRecord.model_validate_json(record).model_copy(
+            update={"path": str(file_path), "signature": signature})
+
+    def put(self, file_path: Union[str, Path], record: FileRecord) -> None:
+        """Store the record of a file in the index.
+
+        The record is keyed by the signature taken when the file was read
+        for the analysis, so that a change made during the scan is detected
+        on the next one. Records of files which could not be read have no
+        signature and are not stored.
+        """
+        signature = record.signature
+        if signature is None:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)",
+            (self._key(file_path), signature.mtime_ns, signature.size,
+             signature.sha256,
+             record.model_dump_json(exclude={"signature"}))
+        )
+
+    def prune(self, file_paths: Iterable[Union[str, Path]]) -> None:
+        """Remove records of files that are not in the given paths."""
+        keep = {self._key(x) for x in file_paths}
+        stored = [row[0] for row in
+                  self._conn.execute("SELECT path FROM records")]
+        self._conn.executemany("DELETE FROM records WHERE path = ?",
+                               [(x,) for x in stored if x not in keep])
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
@@ -3,10 +3,14 @@ import logging
 from functools import wraps
 from pathlib import Path
 from collections import defaultdict
-from typing import Optional, Union, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union, Iterable, Iterator
 
-from .analyzers.python import PythonNaiveCodeAnalyzer, PythonASTCodeAnalyzer
 from .git import GitContext
+from .index import ScanIndex
+from .functions import FunctionIndex
+from .scan import FileRecord, scan_python_file
+from .walk import walk_files, filter_ignored, EXCLUDED_DIRS
 
 logger = logging.getLogger("fixml.repo")
 
@@ -23,7 +27,47 @@ def requires_git_context(func):
 
 
 class Repository:
-    def __init__(self, path: str):
+    """A local repository to be analyzed.
+
+    Parameters
+    ----------
+    path : str
+        The path of the repository.
+    use_scan_index : bool, optional
+        If True, file records are persisted in an on-disk scan index so that
+        only new or changed files are analyzed again in later runs. Default
+        is False.
+    scan_index_dir : str or pathlib.Path, optional
+        Directory of the scan index. Defaults to `.fixml/cache` under the
+        repository root.
+    walk_workers : int, optional
+        Number of threads listing directories in parallel when walking the
+        repository. Default is 1.
+    file_listing : str, optional
+        How files are enumerated. `git` lists the files from the git index,
+        `walk` walks the directories of the repository, and `auto` uses git
+        for git repositories and walks otherwise. Default is `auto`.
+    include_untracked : bool, optional
+        If True, files which are not tracked but not ignored by git are
+        included when files are listed from git. Default is True.
+    workers : int, optional
+        Number of processes analyzing files in parallel. Default is 1, i.e.
+        files are analyzed one by one in the current process. The records
+        are the same regardless of the number of workers.
+
+    Notes
+    -----
+    Directories such as `.git`, `node_modules`, `.venv` and `build`, and
+    paths matching the patterns in `.gitignore` and `.fixmlignore` files are
+    not walked.
+    """
+    # location of the persistent scan index, relative to the repository root
+    default_index_dir = Path(".fixml") / "cache"
+
+    def __init__(self, path: str, use_scan_index: bool = False,
+                 scan_index_dir: Optional[Union[str, Path]] = None,
+                 walk_workers: int = 1, file_listing: str = "auto",
+                 include_untracked: bool = True, workers: int = 1):
         if not os.path.exists(path):
             raise FileNotFoundError(f"Repository {path} does not exist.")
         elif os.path.isfile(path):
@@ -36,7 +80,23 @@ class Repository:
         else:
             self.git_context = GitContext(self.root)
 
+        if file_listing not in ("auto", "git", "walk"):
+            raise ValueError("File listing must be one of `auto`, `git` or "
+                             "`walk`.")
+        if file_listing == "git" and self.git_context is None:
+            raise ValueError("Files can only be listed from git in a git "
+                             "repository.")
+        if file_listing == "auto":
+            file_listing = "walk" if self.git_context is None else "git"
+        self.file_listing = file_listing
+        self.include_untracked = include_untracked
+
+        if workers < 1:
+            raise ValueError("Number of workers must be a positive integer.")
+        self.workers = workers
+
         self.files = []
+        self.walk_workers = walk_workers
         self.fileext_language_map = {
             '.js': 'JavaScript',
             '.jsx': 'JavaScript',
@@ -50,7 +110,14 @@ class Repository:
             '.c': 'C'
         }
         self.lf_map = self._get_language_file_map()
+        if use_scan_index:
+            index_dir = scan_index_dir or self.root / self.default_index_dir
+            with ScanIndex(index_dir, root=self.root) as index:
+                self.file_records = self._scan_files(index)
+        else:
+            self.file_records = self._scan_files()
         self.ffl_map = self._get_file_function_lineno_map()
+        self._function_indexes = {}
 
     def normalize_dirs(self, dirs: Iterable[Union[str, Path]]) -> list[Path]:
         """Validate and normalize directories in relation to repo's root path.
@@ -119,17 +186,21 @@ class Repository:
         return self.git_context.construct_remote_link_to_file(file,
                                                               line_num=lineno)
 
-    def _get_all_files(self, include_git_dir: bool = False):
-        file_paths = []
-        results = list(os.walk(self.root))
-        for root, dirs, files in results:
-            # Excluding files inside .git
-            if '.git' in root and not include_git_dir:
-                continue
-
-            for file in files:
-                file_paths.append(f'{root}/{file}')
-        return file_paths
+    def _get_all_files(self, include_git_dir: bool = False) -> Iterator[str]:
+        excluded_dirs = EXCLUDED_DIRS
+        if include_git_dir:
+            excluded_dirs = excluded_dirs - {'.git'}
+        if self.file_listing == "git" and not include_git_dir:
+            # git already applies `.gitignore`, and the files it lists are
+            # part of the repository whatever the names of their directories,
+            # so that only `.fixmlignore` is applied
+            files = self.git_context.list_files(
+                include_untracked=self.include_untracked)
+            return filter_ignored(self.root, files,
+                                  ignore_files=['.fixmlignore'],
+                                  excluded_dirs=[], root_excluded_dirs=[])
+        return walk_files(self.root, workers=self.walk_workers,
+                          excluded_dirs=excluded_dirs)
 
     def _get_language_file_map(self) -> dict[str, list[str]]:
         language_file_map = defaultdict(list)
@@ -138,43 +209,82 @@ class Repository:
             for k, v in self.fileext_language_map.items():
                 if file.endswith(k):
                     language_file_map[v].append(file)
+        # the walk order depends on the file system and the number of workers
+        for files in language_file_map.values():
+            files.sort()
         return language_file_map
 
+    def _scan_files(self, index: Optional[ScanIndex] = None) -> dict[str, FileRecord]:
+        """Read and analyze every supported file exactly once.
+
+        Parameters
+        ----------
+        index : ScanIndex, optional
+            If provided, records of unchanged files are loaded from the index
+            instead of being analyzed again, and the index is updated with
+            the records of new or changed files.
+
+        Returns
+        -------
+        dict[str, FileRecord]
+            Mapping of file paths to the facts collected from the files.
+        """
+        # TODO: only Python is supported now
+        files = self.lf_map.get("Python", [])
+        if index is None:
+            return dict(zip(files, self._scan_python_files(files)))
+
+        records = {}
+        for file in files:
+            records[file] = index.get(file)
+        missed = [file for file, record in records.items() if record is None]
+        for file, record in zip(missed, self._scan_python_files(missed)):
+            index.put(file, record)
+            records[file] = record
+        index.prune(files)
+        logger.info(f"Scan index: {index.hits} hits, {index.misses} misses.")
+        return records
+
+    def _scan_python_files(self, files: list[str]) -> list[FileRecord]:
+        """Analyze Python files, in a pool of processes if there are multiple
+        workers. The records are returned in the same order as the files."""
+        if self.workers == 1 or len(files) < 2:
+            return [scan_python_file(file) for file in files]
+        workers = min(self.workers, len(files))
+        # larger chunks amortize the cost of sending tasks to the processes
+        chunksize = max(1, len(files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(scan_python_file, files,
+                                     chunksize=chunksize))
+
     def _get_file_function_lineno_map(self) -> dict[str, dict[str, dict[str, int]]]:
         file_function_lineno_map = defaultdict(lambda: defaultdict(int))
-        for lang, files in self.lf_map.items():
-            # TODO: only Python is supported now
-            if lang == "Python":
-                ast = PythonASTCodeAnalyzer()
-                naive = PythonNaiveCodeAnalyzer()
-                for file in files:
-                    try:
-                        ast.read(file)
-                        file_function_lineno_map[lang][file] = ast._get_function_lineno_map()
-                    except Exception as e:
-                        try:
-                            logger.info("Exception occurred when parsing using ast (Python 2 code?) Using naive parser...")
-                            naive.read(file)
-                            file_function_lineno_map[lang][file] = naive._get_function_lineno_map()
-                        except Exception as e:
-                            logger.info("Still failed to parse the file! "
-                                        "Skipping the file...")
+        for file, record in self.file_records.items():
+            if record.parser is not None:
+                file_function_lineno_map[record.language][file] = \
+                    defaultdict(int, record.functions)
         return file_function_lineno_map
 
+    def get_function_index(self, file: str) -> FunctionIndex:
+        """Return the index of the functions defined in a file.
+
+        The index is built on first use. Files which were not scanned, or
+        cannot be parsed, have an empty index.
+        """
+        if file not in self._function_indexes:
+            record = self.file_records.get(file)
+            self._function_indexes[file] = FunctionIndex(
+                record.function_index if record else [])
+        return self._function_indexes[file]
+
     def list_languages(self):
         return list(self.lf_map.keys())
 
     def list_packages(self):
-        packages = []
-        for lang in self.lf_map.keys():
-            if lang == "Python":
-                analyzer = PythonNaiveCodeAnalyzer()
-                files = self.lf_map[lang]
-                for file in files:
-                    analyzer.read(file)
-                    packages += analyzer.list_imported_packages()
-        packages = list(set(packages))
-        return packages
+        packages = set()
+        for record in self.file_records.values():
+            packages.update(x.split(".")[0] for x in record.imports)
+        return list(packages)
 
     def list_test_files(self, test_dirs: Optional[
             Iterable[Union[str, Path]]] = None) -> dict[str, list[str]]:
@@ -197,16 +307,7 @@ class Repository:
                          files_map.items()}
 
         files = files_map.get("Python", [])
-        ast = PythonASTCodeAnalyzer()
-        naive = PythonNaiveCodeAnalyzer()
         for file in files:
-            try:
-                ast.read(file)
-                if ast.contains_test():
-                    testfiles["Python"].append(file)
-            except Exception as e:
-                logger.info("Exception occurred when parsing using ast (Python 2 code?) Using naive parser...")
-                naive.read(file)
-                if naive.contains_test():
-                    testfiles["Python"].append(file)
+            if self.file_records[file].contains_test:
+                testfiles["Python"].append(file)
         return testfiles
@@ -0,0 +1,150 @@
+import os
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from .analyzers.python import PythonASTCodeAnalyzer, PythonNaiveCodeAnalyzer
+from .encoding import decode_source
+
+logger = logging.getLogger("fixml.scan")
+
+# Version of the facts collected by the scan. This must be bumped whenever
+# `FileRecord` or the analyzers change in a way that alters the records, so
+# that persisted scan indexes get invalidated.
+ANALYZER_VERSION = "7"
+
+
+class FunctionInfo(BaseModel):
+    """Location and signature of a function definition."""
+    name: str = Field(description="Name of the function")
+    qualname: str = Field(
+        description="Name qualified by the enclosing classes and functions, "
+                    "e.g. `TestModel.test_fit`")
+    lineno: int = Field(description="Line number of the definition")
+    end_lineno: int = Field(description="Last line number of the definition")
+    class_name: Optional[str] = Field(
+        description="Name of the class if the function is a method",
+        default=None)
+    decorators: List[str] = Field(description="Source of the decorators",
+                                  default=[])
+    is_async: bool = Field(description="Whether the function is async",
+                           default=False)
+
+
+class FileSignature(BaseModel):
+    """State of a file when it was read, to tell whether it has changed."""
+    mtime_ns: int = Field(description="Modification time in nanoseconds")
+    size: int = Field(description="Size in bytes")
+    sha256: str = Field(description="SHA-256 hex digest of the content")
+
+
+class FileRecord(BaseModel):
+    """Facts extracted from a single source file during a repository scan.
+
+    A record is produced once per file so that all the repository APIs (the
+    function-lineno map, test file listing and package listing) can share
+    the same scan result instead of reading and parsing the file again.
+    """
+    path: str = Field(description="Path of the file")
+    language: str = Field(description="Language of the file")
+    functions: Dict[str, int] = Field(
+        description="Mapping of function names to their line numbers",
+        default={})
+    function_index: List[FunctionInfo] = Field(
+        description="Details of all function definitions, in order of "
+                    "appearance",
+        default=[])
+    imports: List[str] = Field(description="Modules imported by the file",
+                               default=[])
+    contains_test: bool = Field(description="Whether the file contains tests",
+                                default=False)
+    parser: Optional[str] = Field(
+        description="Parser used to analyze the file (`ast` or `naive`). "
+                    "None if the file cannot be parsed.",
+        default=None)
+    signature: Optional[FileSignature] = Field(
+        description="State of the file when it was read for the analysis. "
+                    "None if the file cannot be read.",
+        default=None)
+
+
+def _read_file(file_path: str) -> tuple[bytes, FileSignature]:
+    """Read the content of a file along with its signature."""
+    # the file is stat'ed before it is read, so that a change made while it
+    # is read is detected on the next scan
+    stat = os.stat(file_path)
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    return data, FileSignature(mtime_ns=stat.st_mtime_ns, size=stat.st_size,
+                               sha256=hashlib.sha256(data).hexdigest())
+
+
+def scan_python_file(file_path: Union[str, Path]) -> FileRecord:
+    """Analyze a Python file and collect all the facts needed by Repository.
+
+    The file is read and decoded once, and the analyzers share the decoded
+    content. The signature of the content read is recorded as well. The file is analyzed with the AST analyzer. If the file cannot
+    be parsed (e.g. Python 2 code), the naive analyzer is used as a fallback.
+    If the file cannot be decoded, or the naive analyzer also fails, an empty
+    record is returned.
+
+    Parameters
+    ----------
+    file_path : str or pathlib.Path
+        Path of the Python file to be analyzed.
+
+    Returns
+    -------
+    FileRecord
+        The facts collected from the file.
+    """
+    path = str(file_path)
+    try:
+        data, signature = _read_file(path)
+    except OSError:
+        logger.info("Failed to read the file! Skipping the file...")
+        return FileRecord(path=path, language="Python")
+    content = decode_source(data)
+    try:
+        analyzer = PythonASTCodeAnalyzer()
+        analyzer.load(content)
+        imports = analyzer.list_imported_packages()
+        return FileRecord(
+            path=path,
+            language="Python",
+            functions=analyzer._get_function_lineno_map(),
+            function_index=analyzer.facts.definitions,
+            imports=sorted(x for x in imports if x),
+            contains_test=analyzer.contains_test(),
+            parser="ast",
+            signature=signature
+        )
+    except Exception:
+        logger.info("Exception occurred when parsing using ast (Python 2 "
+                    "code?) Using naive parser...")
+    try:
+        analyzer = PythonNaiveCodeAnalyzer()
+        analyzer.load(content)
+        functions = analyzer._get_function_lineno_map()
+        return FileRecord(
+            path=path,
+            language="Python",
+            functions=functions,
+            # the naive parser knows neither the scopes nor the end lines
+            function_index=[
+                FunctionInfo(name=name, qualname=name, lineno=lineno,
+                             end_lineno=lineno)
+                for name, lineno in sorted(functions.items(),
+                                           key=lambda x: x[1])
+            ],
+            imports=sorted(analyzer.list_imported_packages()),
+            contains_test=analyzer.contains_test(),
+            parser="naive",
+            signature=signature
+        )
+    except Exception:
+        logger.info("Still failed to parse the file! Skipping the file...")
+    return FileRecord(path=path, language="Python", signature=signature)
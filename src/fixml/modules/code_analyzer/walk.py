@@ -0,0 +1,311 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, Iterable, Optional, Union
+from pathlib import Path
+
+# files containing gitignore-style patterns of paths to be skipped
+IGNORE_FILES = ('.gitignore', '.fixmlignore')
+
+# directories which never contain files of interest, skipped at any depth
+EXCLUDED_DIRS = frozenset({
+    '.git', '.hg', '.svn', '.fixml', 'node_modules', '__pycache__', '.tox',
+    '.nox', '.mypy_cache', '.pytest_cache'
+})
+
+# directories of environments and build outputs, skipped at the root only, as
+# packages may have source directories of the same names
+ROOT_EXCLUDED_DIRS = frozenset({'.venv', 'venv', 'build'})
+
+
+def _translate_segment(segment: str) -> str:
+    """Translate a glob pattern without slashes into a regex."""
+    regex = ''
+    i = 0
+    while i < len(segment):
+        char = segment[i]
+        if char == '*':
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '\\' and i + 1 < len(segment):
+            i += 1
+            regex += re.escape(segment[i])
+        elif char == '[' and segment.find(']', i + 2) != -1:
+            end = segment.find(']', i + 2)
+            content = segment[i + 1:end].replace('\\', '\\\\')
+            if content.startswith('!'):
+                content = '^' + content[1:]
+            regex += f'[{content}]'
+            i = end
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+class IgnoreRule:
+    """A single pattern of a gitignore-style file.
+
+    Parameters
+    ----------
+    pattern : str
+        A line of the ignore file, which is not blank nor a comment.
+    """
+
+    def __init__(self, pattern: str):
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith('\\'):
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        # patterns with a slash only match relative to the ignore file,
+        # otherwise they match a name at any depth
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+
+        parts = pattern.split('/')
+        regex = ''
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            if part == '**':
+                regex += '.*' if last else '(?:[^/]+/)*'
+            else:
+                regex += _translate_segment(part) + ('' if last else '/')
+        if not anchored:
+            regex = '(?:.*/)?' + regex
+        self.regex = re.compile(regex)
+
+    def match(self, rel_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.fullmatch(rel_path) is not None
+
+
+class IgnoreRules:
+    """Patterns of all ignore files found from the root to a directory.
+
+    Patterns are matched against paths relative to the directory containing
+    the ignore file. As in git, the last matching pattern decides whether a
+    path is ignored.
+    """
+
+    def __init__(self, rule_sets: tuple = ()):
+        # tuple of (relative directory, list of rules), from root to leaf
+        self.rule_sets = rule_sets
+
+    @staticmethod
+    def parse(lines: Iterable[str]) -> list[IgnoreRule]:
+        rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            rules.append(IgnoreRule(line))
+        return rules
+
+    def extend(self, rel_dir: str, lines: Iterable[str]) -> 'IgnoreRules':
+        """Return new rules with the patterns of an ignore file found in
+        `rel_dir` added."""
+        rules = self.parse(lines)
+        if not rules:
+            return self
+        return IgnoreRules(self.rule_sets + ((rel_dir, rules),))
+
+    def match(self, rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for rel_dir, rules in self.rule_sets:
+            if rel_dir:
+                if not rel_path.startswith(rel_dir + '/'):
+                    continue
+                path = rel_path[len(rel_dir) + 1:]
+            else:
+                path = rel_path
+            for rule in rules:
+                if rule.match(path, is_dir):
+                    ignored = not rule.negate
+        return ignored
+
+
+def _scan_dir(path: str, rel_dir: str, rules: IgnoreRules,
+              ignore_files: Iterable[str],
+              excluded_dirs: frozenset) -> tuple[list, list]:
+    """List the files of a directory and the subdirectories to descend into,
+    applying the ignore files found in the directory."""
+    for ignore_file in ignore_files:
+        try:
+            with open(os.path.join(path, ignore_file),
+                      encoding='utf-8', errors='replace') as f:
+                rules = rules.extend(rel_dir, f)
+        except OSError:
+            continue
+
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                rel_path = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in excluded_dirs or \
+                            rules.match(rel_path, is_dir=True):
+                        continue
+                    subdirs.append((entry.path, rel_path, rules))
+                elif not rules.match(rel_path, is_dir=False):
+                    files.append(entry.path)
+    except OSError:
+        # unreadable directories are skipped, as `os.walk` does
+        pass
+    return files, subdirs
+
+
+def _get_excluded_dirs(excluded_dirs: Optional[Iterable[str]],
+                       root_excluded_dirs: Optional[Iterable[str]]
+                       ) -> tuple[frozenset, frozenset]:
+    """Resolve the defaults of the excluded directories, returning the names
+    excluded at any depth, and the names excluded at the root."""
+    excluded_dirs = EXCLUDED_DIRS if excluded_dirs is None \
+        else frozenset(excluded_dirs)
+    root_excluded_dirs = ROOT_EXCLUDED_DIRS if root_excluded_dirs is None \
+        else frozenset(root_excluded_dirs)
+    return excluded_dirs, excluded_dirs | root_excluded_dirs
+
+
+def walk_files(root: Union[str, Path], workers: int = 1,
+               ignore_files: Iterable[str] = IGNORE_FILES,
+               excluded_dirs: Optional[Iterable[str]] = None,
+               root_excluded_dirs: Optional[Iterable[str]] = None
+               ) -> Iterator[str]:
+    """Lazily yield the paths of all files under a directory.
+
+    Directories listed in `excluded_dirs`, directories of the root listed in
+    `root_excluded_dirs`, and paths matching the patterns of the ignore files
+    are pruned before descending into them.
+
+    Parameters
+    ----------
+    root : str or pathlib.Path
+        The directory to be walked.
+    workers : int, optional
+        Number of threads listing directories in parallel. Default is 1, i.e.
+        directories are listed one by one in the calling thread.
+    ignore_files : Iterable[str], optional
+        Names of the gitignore-style files to be honoured. Default is
+        `.gitignore` and `.fixmlignore`.
+    excluded_dirs : Iterable[str], optional
+        Names of directories to be skipped at any depth. Default is
+        `EXCLUDED_DIRS`.
+    root_excluded_dirs : Iterable[str], optional
+        Names of directories to be skipped directly under `root` only.
+        Default is `ROOT_EXCLUDED_DIRS`.
+
+    Yields
+    ------
+    str
+        Paths of the files, prefixed by `root`. The order is not guaranteed
+        when more than one worker is used.
+    """
+    if workers < 1:
+        raise ValueError("Number of workers must be a positive integer.")
+    ignore_files = tuple(ignore_files)
+    excluded_dirs, root_excluded_dirs = _get_excluded_dirs(excluded_dirs,
+                                                           root_excluded_dirs)
+    top = (str(root), '', IgnoreRules())
+
+    if workers == 1:
+        files, subdirs = _scan_dir(*top, ignore_files, root_excluded_dirs)
+        yield from files
+        stack = list(reversed(subdirs))
+        while stack:
+            files, subdirs = _scan_dir(*stack.pop(), ignore_files,
+                                       excluded_dirs)
+            yield from files
+            stack.extend(reversed(subdirs))
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = {executor.submit(_scan_dir, *top, ignore_files,
+                                   root_excluded_dirs)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                pending.update(
+                    executor.submit(_scan_dir, *subdir, ignore_files,
+                                    excluded_dirs)
+                    for subdir in subdirs
+                )
+                yield from files
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def filter_ignored(root: Union[str, Path], rel_paths: Iterable[str],
+                   ignore_files: Iterable[str] = IGNORE_FILES,
+                   excluded_dirs: Optional[Iterable[str]] = None,
+                   root_excluded_dirs: Optional[Iterable[str]] = None
+                   ) -> Iterator[str]:
+    """Lazily filter a listing of files with the same rules as `walk_files`.
+
+    This applies the exclusions of the walk to files listed by other means,
+    e.g. from the git index, without walking the directories.
+
+    Parameters
+    ----------
+    root : str or pathlib.Path
+        The directory the paths are relative to.
+    rel_paths : Iterable[str]
+        Paths of the files relative to `root`, separated by slashes.
+    ignore_files : Iterable[str], optional
+        Names of the gitignore-style files to be honoured. Default is
+        `.gitignore` and `.fixmlignore`.
+    excluded_dirs : Iterable[str], optional
+        Names of directories to be skipped at any depth. Default is
+        `EXCLUDED_DIRS`.
+    root_excluded_dirs : Iterable[str], optional
+        Names of directories to be skipped directly under `root` only.
+        Default is `ROOT_EXCLUDED_DIRS`.
+
+    Yields
+    ------
+    str
+        Paths of the files which are not excluded, prefixed by `root`.
+    """
+    root = str(root)
+    ignore_files = tuple(ignore_files)
+    excluded_dirs, root_excluded_dirs = _get_excluded_dirs(excluded_dirs,
+                                                           root_excluded_dirs)
+
+    # rules applying to the content of each directory, or None if the
+    # directory itself is excluded
+    dir_rules = {}
+
+    def get_rules(rel_dir: str) -> Optional[IgnoreRules]:
+        if rel_dir in dir_rules:
+            return dir_rules[rel_dir]
+        if rel_dir:
+            parent, _, name = rel_dir.rpartition('/')
+            rules = get_rules(parent)
+            excluded = root_excluded_dirs if not parent else excluded_dirs
+            if rules is not None and (name in excluded or
+                                      rules.match(rel_dir, is_dir=True)):
+                rules = None
+        else:
+            rules = IgnoreRules()
+        if rules is not None:
+            for ignore_file in ignore_files:
+                try:
+                    with open(os.path.join(root, rel_dir, ignore_file),
+                              encoding='utf-8', errors='replace') as f:
+                        rules = rules.extend(rel_dir, f)
+                except OSError:
+                    continue
+        dir_rules[rel_dir] = rules
+        return rules
+
+    for rel_path in rel_paths:
+        rules = get_rules(rel_path.rpartition('/')[0])
+        if rules is not None and not rules.match(rel_path, is_dir=False):
+            yield f'{root}/{rel_path}'
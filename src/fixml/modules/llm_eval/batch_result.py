@@ -0,0 +1,135 @@
+import os
+import re
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Union
+
+import pandas as pd
+from ruamel.yaml import YAML
+
+# keys of the call results needed for the scores. Keys inside string values,
+# e.g. in prompts, have their quotes escaped and never match.
+_KEY_PATTERN = re.compile(r'"(files_evaluated|success|parsed_response)"\s*:\s*')
+_decoder = json.JSONDecoder()
+
+SCORE_COLUMNS = ['file', 'success', 'id', 'score']
+
+
+def read_scores(response_path: Union[str, Path]) -> List[tuple]:
+    """Extract the score of every checklist item from a response file.
+
+    Only the evaluated files, the success flags and the parsed responses of
+    the call results are decoded, while the rest of the file, e.g. contexts
+    and prompts, is skipped over. Both JSON and JSONL responses are
+    supported. Call results without a parsed response are ignored.
+
+    Returns
+    -------
+    List[tuple]
+        Rows of file, success, checklist item ID and score.
+    """
+    with open(response_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    rows = []
+    file, success = None, None
+    position = 0
+    while True:
+        match = _KEY_PATTERN.search(content, position)
+        if match is None:
+            break
+        value, position = _decoder.raw_decode(content, match.end())
+        key = match.group(1)
+        if key == 'files_evaluated':
+            file, success = (value[0] if value else None), None
+        elif key == 'success':
+            success = value
+        elif value:
+            rows.extend((file, success, item['ID'], item['Score'])
+                        for item in value.get('results', []))
+    return rows
+
+
+def _resolve_response_path(batch_run_dir: Union[str, Path],
+                           response_path: str) -> str:
+    path = os.path.join(batch_run_dir, response_path)
+    if not os.path.exists(path):
+        # records may hold paths relative to where the batch was run from,
+        # while the responses are saved next to the record
+        path = os.path.join(batch_run_dir, os.path.basename(response_path))
+    return os.path.abspath(path)
+
+
+def read_batch_scores(batch_run_dir: Union[str, Path],
+                      record_yml: str = 'record.yml',
+                      workers: int = 1) -> pd.DataFrame:
+    """Read the scores of all responses of a batch run.
+
+    Parameters
+    ----------
+    batch_run_dir : str or Path
+        Directory of the responses and the run record of a batch run.
+    record_yml : str, optional
+        File name of the run record in the directory. Default is
+        `record.yml`.
+    workers : int, optional
+        Number of processes reading the response files in parallel. Default
+        is 1.
+
+    Returns
+    -------
+    pd.DataFrame
+        A long-format table with one row per repository, run, test file and
+        checklist item, with the columns `repo`, `run`, `response_path`,
+        `file`, `success`, `id` and `score`.
+    """
+    with open(os.path.join(batch_run_dir, record_yml), 'r') as f:
+        record = YAML(typ='safe').load(f) or []
+    paths = [_resolve_response_path(batch_run_dir, entry['response_path'])
+             for entry in record]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                read_scores, paths,
+                chunksize=max(1, len(paths) // (workers * 4))))
+    else:
+        results = map(read_scores, paths)
+
+    rows = [(entry['repo'], entry['run'], path, *row)
+            for entry, path, scores in zip(record, paths, results)
+            for row in scores]
+    return pd.DataFrame(rows, columns=['repo', 'run', 'response_path'] +
+                        SCORE_COLUMNS)
+
+
+def get_scores_by_run(scores: pd.DataFrame,
+                      ids: Optional[List[str]] = None) -> pd.DataFrame:
+    """Score of each checklist item by repository and run, i.e. the maximum
+    score across the test files.
+
+    Parameters
+    ----------
+    scores : pd.DataFrame
+        Scores as returned by `read_batch_scores`.
+    ids : List[str], optional
+        If provided, only these checklist items are kept.
+    """
+    if ids is not None:
+        scores = scores[scores['id'].isin(ids)]
+    return scores.groupby(['repo', 'run', 'id'], as_index=False)['score'].max()
+
+
+def get_score_stats(scores_by_run: pd.DataFrame) -> pd.DataFrame:
+    """Count, mean and standard deviation of the scores of each checklist
+    item across the runs of each repository."""
+    return scores_by_run.groupby(['repo', 'id'])['score'] \
+        .agg(['count', 'mean', 'std']).reset_index()
+
+
+def get_score_counts(scores_by_run: pd.DataFrame) -> pd.DataFrame:
+    """Number of runs giving each score to each checklist item, by
+    repository."""
+    return scores_by_run.groupby(['repo', 'id', 'score']).size() \
+        .rename('count').reset_index()
@@ -1,36 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+
 import pandas as pd
+from tqdm import tqdm
 
 from ..workflow.parse import ResponseParser
+from ..workflow.rate_limit import RateLimiter
 
 
 class ConsistencyEvaluator:
-    def __init__(self):
+    """Evaluate the consistency of test evaluators over repeated runs.
+
+    All runs of all evaluators are done concurrently, with their calls
+    scheduled on a single pool of `concurrency` workers. Runs of the same
+    evaluator share its repository and reuse the code of the test files
+    loaded for the prompts.
+
+    Parameters
+    ----------
+    concurrency : int, optional
+        Maximum number of calls in flight across all runs. Default is 1.
+    rate_limiter : RateLimiter, optional
+        If provided, it replaces the rate limiters of the evaluators, so that
+        all runs stay within the same budgets.
+    """
+
+    def __init__(self, concurrency: int = 1,
+                 rate_limiter: Optional[RateLimiter] = None):
+        if concurrency < 1:
+            raise ValueError("Concurrency must be a positive integer.")
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter
         self.evaluation_reports = None
+        self.item_results = None
+
+    def _run_once(self, name: str, model, test_no: int, executor,
+                  verbose: bool = False) -> tuple[dict, list[dict]]:
+        response = model.run(verbose=verbose, executor=executor)
+        parser = ResponseParser(response)
+        score = parser.get_completeness_score(score_format='number')
+        report = parser.evaluation_report if score is not None else None
+
+        result = {'model_name': name, 'test_no': test_no, 'score': score,
+                  'report': report}
+        items = []
+        if report is not None:
+            items = [
+                {'model_name': name, 'test_no': test_no, **item}
+                for item in report[['ID', 'Title', 'is_Satisfied',
+                                    'n_files_tested']].to_dict('records')
+            ]
+        return result, items
 
     def evaluate(self, models, num_test_runs=2, verbose=False):
         """
         Input the initialized TestEvaluator models, test run `num_test_runs` times to obtain the result
         models = [{'name': 'model_no1', 'model': {{model object}}}, ...]
+
+        The completeness score and the report of each run are stored in
+        `evaluation_reports`, and the evaluation of each checklist item in
+        each run in `item_results`, one row per model, run and item. A run
+        with any failed call has no score and no items.
         """
-        results = []
-        for item in models:
-            if verbose:
-                print(f'Model: {item['name']}')
-                
-            for test_no in range(num_test_runs):
-                if verbose:
-                    print(f'Test Run No.: {test_no+1}')
-                
-                result = dict()
-                model = item['model']
-                response = model.evaluate()
-                parser = ResponseParser(response)
-                result['score'] = parser.get_completeness_score(score_format='number')
-                result['report'] = parser.evaluation_report
-                result['model_name'] = item['name']
-                result['test_no'] = test_no+1
+        if self.rate_limiter is not None:
+            for item in models:
+                item['model'].rate_limiter = self.rate_limiter
+
+        runs = [(item['name'], item['model'], test_no)
+                for item in models
+                for test_no in range(1, num_test_runs + 1)]
+        results, items = [], []
+        # runs only wait for their calls, which are done by the shared pool
+        call_executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        run_executor = ThreadPoolExecutor(max_workers=len(runs) or 1)
+        try:
+            futures = [
+                run_executor.submit(self._run_once, name, model, test_no,
+                                    call_executor, verbose)
+                for name, model, test_no in runs
+            ]
+            for future in tqdm(as_completed(futures), total=len(futures),
+                               disable=not verbose):
+                result, run_items = future.result()
                 results.append(result)
-        self.evaluation_reports = pd.DataFrame(results)
+                items.extend(run_items)
+        finally:
+            # do not wait for pending runs when interrupted
+            run_executor.shutdown(cancel_futures=True)
+            call_executor.shutdown(cancel_futures=True)
+
+        columns = ['model_name', 'test_no']
+        self.evaluation_reports = pd.DataFrame(
+            results, columns=columns + ['score', 'report']
+        ).sort_values(columns, ignore_index=True)
+        self.item_results = pd.DataFrame(
+            items, columns=columns + ['ID', 'Title', 'is_Satisfied',
+                                      'n_files_tested']
+        ).sort_values(columns + ['ID'], ignore_index=True)
         return
 
     def get_completeness_score_dist(self):
@@ -45,13 +111,7 @@ class ConsistencyEvaluator:
         """
         Obtain the distribution of the consistency per checklist item
         """
-        consistency_df = pd.DataFrame()
-        for idx in self.evaluation_reports.index:
-            result = self.evaluation_reports.iloc[idx]['report'].reset_index()
-            result['test_no'] = self.evaluation_reports.iloc[idx]['test_no']
-            result['model_name'] = self.evaluation_reports.iloc[idx]['model_name']
-            consistency_df = pd.concat([consistency_df, result], axis = 0, ignore_index=True)
-        consistency_df = consistency_df.pivot(index=['model_name', 'ID'], columns=['test_no'], values=['is_Satisfied'])
-        consistency_df.columns = consistency_df.columns.droplevel(level=0)
-        consistency_df['consistency'] = consistency_df.eq(consistency_df.iloc[:, 0], axis=0).all(1)
+        consistency_df = self.item_results.pivot(index=['model_name', 'ID'], columns='test_no', values='is_Satisfied')
+        # an item is consistent if all runs gave it the same score
+        consistency_df['consistency'] = consistency_df.nunique(axis=1, dropna=False) == 1
         return consistency_df
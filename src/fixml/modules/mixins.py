@@ -1,8 +1,6 @@
 import os
 from abc import ABC, abstractmethod
 
-import pypandoc
-
 from .utils import get_extension
 
 
@@ -96,6 +94,7 @@ class ExportableMixin(WriteableMixin, ABC):
     def export_html(self, output_path: str, exist_ok: bool = False):
         # TODO: raise error when pandoc is not installed
         self._export_check(output_path, format="html", exist_ok=exist_ok)
+        import pypandoc
         pypandoc.convert_text(self._escape_single_quotes(self.as_markdown()), 'html', format='md',
                               outputfile=output_path)
 
@@ -103,6 +102,7 @@ class ExportableMixin(WriteableMixin, ABC):
         # TODO: raise error when pandoc is not installed
         # TODO: raise error when tectonic is not installed
         self._export_check(output_path, format="pdf", exist_ok=exist_ok)
+        import pypandoc
         pypandoc.convert_text(self.as_markdown(), 'pdf', format='md', outputfile=output_path,
                               extra_args=['--pdf-engine=tectonic'])
 
@@ -0,0 +1,209 @@
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Union
+
+from tqdm import tqdm
+from pydantic import BaseModel, Field
+from ruamel.yaml import YAML
+from langchain_core.language_models import LanguageModelLike
+
+from .prompt_format import EvaluationPromptFormat
+from .rate_limit import RateLimiter
+from .runners.evaluator import PerFileTestEvaluator
+from ..checklist.checklist import Checklist
+from ..code_analyzer.repo import Repository
+
+
+class BatchRepository(BaseModel):
+    name: str = Field(description="Name of the repository, used to name "
+                                  "the responses")
+    path: str = Field(description="Path of the repository, relative to "
+                                  "`repo_base_path`")
+
+
+class BatchConfig(BaseModel):
+    """Configuration of a batch run, i.e. of evaluating a list of
+    repositories a number of times each."""
+    runs: int = Field(description="Number of runs per repository")
+    checklist_path: Optional[str] = Field(
+        description="Path of the checklist. Default checklist if null",
+        default=None)
+    model: str = Field(description="Name of the model",
+                       default="gpt-3.5-turbo")
+    repo_base_path: str = Field(description="Directory of the repositories")
+    response_path: str = Field(description="Directory where the responses "
+                                           "and the run record are saved")
+    repo: List[BatchRepository] = Field(description="Repositories to be "
+                                                    "evaluated")
+
+    @classmethod
+    def from_yaml(cls, path: Union[str, Path]) -> "BatchConfig":
+        with open(path, "r") as f:
+            return cls.model_validate(YAML(typ="safe").load(f))
+
+    def get_repo_path(self, repo: BatchRepository) -> Path:
+        return Path(self.repo_base_path) / repo.path
+
+    def get_response_path(self, repo: BatchRepository, run: int) -> str:
+        return f"{self.response_path}/{repo.name}_{run:02d}.json"
+
+    @property
+    def record_path(self) -> Path:
+        return Path(self.response_path) / "record.yml"
+
+
+class BatchRunner:
+    """Evaluate multiple repositories multiple times.
+
+    Each repository is scanned once, before any run starts, and shared by
+    all of its runs, and all runs share the model, the checklist and the
+    rate limiter. The calls of all runs are scheduled on a single pool of
+    `concurrency` workers, so that runs of different repositories overlap
+    instead of waiting for each other.
+
+    Every completed run is appended to the run record, `record.yml` in the
+    response directory, as an entry with the keys `repo`, `response_path`
+    and `run`. Runs already in the record whose response exists are skipped,
+    so that an interrupted batch run can be restarted.
+
+    Parameters
+    ----------
+    config : BatchConfig
+        The configuration of the batch run.
+    llm : LanguageModelLike
+        The model shared by all runs.
+    checklist : Checklist, optional
+        The checklist shared by all runs. Loaded from the configuration if
+        not provided.
+    concurrency : int, optional
+        Maximum number of calls in flight across all runs. Default is 1.
+    rate_limiter : RateLimiter, optional
+        Rate limiter shared by all runs.
+    repository_kwargs : dict, optional
+        Keyword arguments passed to `Repository`, e.g. `use_scan_index`.
+    evaluator_kwargs : dict, optional
+        Keyword arguments passed to `PerFileTestEvaluator`, e.g.
+        `batch_token_budget`.
+    """
+
+    def __init__(self, config: BatchConfig, llm: LanguageModelLike,
+                 checklist: Optional[Checklist] = None,
+                 concurrency: int = 1,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 repository_kwargs: Optional[dict] = None,
+                 evaluator_kwargs: Optional[dict] = None):
+        if concurrency < 1:
+            raise ValueError("Concurrency must be a positive integer.")
+        self.config = config
+        self.llm = llm
+        self.checklist = checklist or Checklist(config.checklist_path)
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.repository_kwargs = repository_kwargs or {}
+        self.evaluator_kwargs = evaluator_kwargs or {}
+        self.prompt_format = EvaluationPromptFormat()
+
+        self._repositories = {}
+        self._record_lock = threading.Lock()
+
+    def read_record(self) -> List[dict]:
+        """Read the entries of the run record, if any."""
+        if not self.config.record_path.exists():
+            return []
+        with open(self.config.record_path, "r") as f:
+            return YAML(typ="safe").load(f) or []
+
+    def _append_record(self, entry: dict) -> None:
+        with self._record_lock:
+            # appending a single-item sequence keeps the file a valid sequence
+            with open(self.config.record_path, "a") as f:
+                YAML().dump([entry], f)
+
+    def get_pending_runs(self) -> List[tuple[BatchRepository, int]]:
+        """List the runs to be done, run by run across the repositories."""
+        completed = {
+            (entry['repo'], entry['run']) for entry in self.read_record()
+            if Path(entry['response_path']).exists()
+        }
+        return [(repo, run)
+                for run in range(1, self.config.runs + 1)
+                for repo in self.config.repo
+                if (repo.name, run) not in completed]
+
+    def _scan_repositories(self, repos: List[BatchRepository]) -> None:
+        # the repositories are scanned one by one before any run starts, as
+        # a scan may use a pool of processes, which must not be forked from
+        # the threads of the runs
+        for repo in repos:
+            if repo.name in self._repositories:
+                continue
+            try:
+                self._repositories[repo.name] = Repository(
+                    self.config.get_repo_path(repo), **self.repository_kwargs)
+            except Exception as e:
+                print(f"Scan of {repo.name} failed: "
+                      f"{e.__class__.__name__} - {str(e)}")
+
+    def _run_once(self, repo: BatchRepository, run: int, executor,
+                  verbose: bool = False) -> dict:
+        evaluator = PerFileTestEvaluator(
+            self.llm, prompt_format=self.prompt_format,
+            repository=self._repositories[repo.name], checklist=self.checklist,
+            concurrency=self.concurrency, rate_limiter=self.rate_limiter,
+            **self.evaluator_kwargs)
+        response = evaluator.run(verbose=verbose, executor=executor)
+        response_path = self.config.get_response_path(repo, run)
+        response.to_json(response_path, exist_ok=True)
+
+        entry = {'repo': repo.name, 'response_path': response_path,
+                 'run': run}
+        self._append_record(entry)
+        return entry
+
+    def run(self, verbose: bool = False) -> List[dict]:
+        """Do all pending runs.
+
+        A failed run, or a run of a repository which could not be scanned,
+        is reported and left out of the record, so that it is done again on
+        restart.
+
+        Returns
+        -------
+        List[dict]
+            The record entries of the runs completed by this call.
+        """
+        pending = self.get_pending_runs()
+        skipped = len(self.config.repo) * self.config.runs - len(pending)
+        if skipped:
+            print(f"Skipping {skipped} run(s) already completed.")
+        Path(self.config.response_path).mkdir(parents=True, exist_ok=True)
+
+        self._scan_repositories(list({repo.name: repo
+                                      for repo, _ in pending}.values()))
+        # runs of a repository which could not be scanned are left pending
+        pending = [(repo, run) for repo, run in pending
+                   if repo.name in self._repositories]
+
+        entries = []
+        # runs only wait for their calls, which are done by the shared pool
+        call_executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        run_executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            futures = {
+                run_executor.submit(self._run_once, repo, run, call_executor,
+                                    verbose): (repo, run)
+                for repo, run in pending
+            }
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                try:
+                    entries.append(future.result())
+                except Exception as e:
+                    repo, run = futures[future]
+                    print(f"Run {run} of {repo.name} failed: "
+                          f"{e.__class__.__name__} - {str(e)}")
+        finally:
+            # do not wait for pending runs when interrupted
+            run_executor.shutdown(cancel_futures=True)
+            call_executor.shutdown(cancel_futures=True)
+        return entries
@@ -0,0 +1,112 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Optional, Union
+
+
+class CacheMode(Enum):
+    OFF = 'off'
+    READ = 'read'
+    WRITE = 'write'
+    READWRITE = 'readwrite'
+
+    @property
+    def readable(self) -> bool:
+        return self in (CacheMode.READ, CacheMode.READWRITE)
+
+    @property
+    def writable(self) -> bool:
+        return self in (CacheMode.WRITE, CacheMode.READWRITE)
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of validated LLM responses.
+
+    Responses are keyed by the hash of the fully formatted prompt, the model
+    name and the temperature, and stored in a SQLite database. When the total
+    size of the stored responses exceeds `max_size`, the least recently used
+    responses are evicted.
+
+    Parameters
+    ----------
+    cache_dir : str or pathlib.Path, optional
+        Directory of the cache. Defaults to `~/.fixml/cache`.
+    mode : str or CacheMode, optional
+        One of `off`, `read`, `write` or `readwrite`. Default is `readwrite`.
+    max_size : int, optional
+        Maximum total size of the stored responses in bytes. Default is
+        256 MiB.
+    """
+    filename = "responses.sqlite"
+    default_cache_dir = Path.home() / ".fixml" / "cache"
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None,
+                 mode: Union[str, CacheMode] = CacheMode.READWRITE,
+                 max_size: int = 256 * 1024 * 1024):
+        self.mode = CacheMode(mode)
+        self.max_size = max_size
+        self.path = Path(cache_dir or self.default_cache_dir) / self.filename
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # the cache is shared by the workers of concurrent evaluations
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses "
+                               "(key TEXT PRIMARY KEY, response TEXT, "
+                               "size INTEGER, last_access REAL)")
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, temperature: float) -> str:
+        """Compute the cache key of a call."""
+        payload = json.dumps([prompt, model_name, temperature])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached response, or None if absent or not readable."""
+        if not self.mode.readable:
+            return None
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, response: dict) -> None:
+        """Store a response in the cache if the cache is writable."""
+        if not self.mode.writable:
+            return
+        serialized = json.dumps(response)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, serialized, len(serialized), time.time()))
+            self._evict()
+
+    def _evict(self) -> None:
+        total_size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total_size <= self.max_size:
+                break
+            evicted.append((key,))
+            total_size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
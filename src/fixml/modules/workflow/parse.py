@@ -18,6 +18,8 @@ class ResponseParser(ExportableMixin):
         self.repository = self.response.repository.object
         self.git_context = self.repository.git_context
         self.items = []
+        self._items_version = None
+        self._report_version = None
         if not export_template_path:
             # use default template from package
             self.export_template = TemplateLoader.load("evaluation")
@@ -26,25 +28,100 @@ class ResponseParser(ExportableMixin):
             self.export_template = TemplateLoader.load_from_external(
                 export_template_path, "evaluation")
 
-    def _parse_items(self):
+    def _get_response_version(self) -> tuple:
+        """Identify the current state of the call results in the response.
+
+        Call results are only appended during a run, so the list of call
+        results and its length are enough to detect changes. Replacing call
+        results in place, or modifying them, requires calling `reset`.
+        """
+        call_results = self.response.call_results
+        return call_results, len(call_results)
+
+    def _is_current(self, version: Optional[tuple]) -> bool:
+        # the list itself is kept in the version, so that its identity cannot
+        # be reused by another list
+        if version is None:
+            return False
+        call_results, length = version
+        return call_results is self.response.call_results and \
+            length == len(call_results)
+
+    def reset(self) -> None:
+        """Discard the parsed items and the evaluation report, so that they
+        are rebuilt from the call results in the response."""
+        self.items = []
+        self._items_version = None
+        self.evaluation_report = None
+        self._report_version = None
+
+    def _parse_items(self) -> list[dict]:
+        """Flatten the evaluated items of all call results.
+
+        The parsed responses are not modified; new dictionaries are created
+        with the file path and the function references added. Function names
+        returned by the LLM are resolved with the function index of the file,
+        and names which cannot be found are listed as unresolved. The result is
+        memoized until the response changes.
+        """
+        if self._is_current(self._items_version):
+            return self.items
+
         items = []
         for result in self.response.call_results:
-            response = result.parsed_response['results']
-            for item in response:
-                fp = result.files_evaluated[0]
-                item['File Path'] = fp
-                if self.repository:
-                    item['lineno'] = [self.repository.ffl_map['Python'][fp][func] for func in item['Functions']]
-                else:
-                    item['lineno'] = []
-                item['Referenced Functions'] = [
-                    f"[{func}]({self.repository.get_git_direct_link(fp, lineno)})"
-                    for func, lineno in zip(item['Functions'], item['lineno'])
+            fp = result.files_evaluated[0]
+            function_index = self.repository.get_function_index(fp)
+            for item in result.parsed_response['results']:
+                functions = [function_index.resolve(func)
+                             for func in item['Functions']]
+                # functions which cannot be found in the file are linked to
+                # the file only
+                linenos = [func.lineno if func else 0 for func in functions]
+                references = [
+                    f"[{name}]({self.repository.get_git_direct_link(fp, lineno or None)})"
+                    for name, lineno in zip(item['Functions'], linenos)
                 ]
-                items.append(item)
+                items.append({
+                    **item,
+                    'File Path': fp,
+                    'lineno': linenos,
+                    'Unresolved Functions': [
+                        name for name, func in zip(item['Functions'], functions)
+                        if func is None
+                    ],
+                    'Referenced Functions': references,
+                    'Function References': {
+                        'File Path': fp,
+                        'Referenced Functions': references
+                    },
+                })
         self.items = items
+        self._items_version = self._get_response_version()
         return items
 
+    def _get_evaluation_report(self) -> pd.DataFrame:
+        """Aggregate the evaluated items per checklist item.
+
+        The report is memoized until the response changes.
+        """
+        if self._is_current(self._report_version):
+            return self.evaluation_report
+
+        report_df = pd.DataFrame.from_records(self._parse_items())
+        file_names = report_df['File Path'].str.rsplit(os.sep, n=1).str[-1]
+        report_df['Observation'] = '(' + file_names + ') ' + \
+                                   report_df['Observation']
+        report_df = report_df.groupby(['ID', 'Title']).agg({
+            'Requirement': ['max'],
+            'Score': ['max', 'count'],
+            'Observation': [list],
+            'Function References': [list],
+        })
+        report_df.columns = ['Requirement', 'is_Satisfied', 'n_files_tested', 'Observations', 'Function References']
+        self.evaluation_report = report_df.reset_index()
+        self._report_version = self._get_response_version()
+        return self.evaluation_report
+
     def get_completeness_score(self, score_format: str = 'fraction', verbose: bool = False) -> Optional[Union[float, str]]:
         """Compute Evaluation Report and Completeness Score."""
 
@@ -62,20 +139,7 @@ class ResponseParser(ExportableMixin):
                 print("failed to obtain valid response, cannot calculate completeness score")
                 return None
 
-        items = self._parse_items()
-
-        report_df = pd.DataFrame(items)
-        report_df['Function References'] = report_df[['File Path', 'Referenced Functions']].to_dict(orient='records')
-        report_df['Observation'] = '(' + report_df['File Path'].apply(lambda x: os.path.split(x)[-1]) + ') ' + \
-                                   report_df['Observation']
-        report_df = report_df.groupby(['ID', 'Title']).agg({
-            'Requirement': ['max'],
-            'Score': ['max', 'count'],
-            'Observation': [list],
-            'Function References': [list],
-        })
-        report_df.columns = ['Requirement', 'is_Satisfied', 'n_files_tested', 'Observations', 'Function References']
-        self.evaluation_report = report_df.reset_index()
+        report_df = self._get_evaluation_report()
 
         num_items_satisfied = report_df['is_Satisfied'].sum()
         num_items = report_df['is_Satisfied'].count()
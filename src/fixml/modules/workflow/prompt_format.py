@@ -14,21 +14,22 @@ class PromptFormat(ABC):
         self.prompt = None
 
 
+class TestItemEvaluation(BaseModel):
+    ID: str = Field(description="The corresponding `ID` of the checklist item provided. Make sure the ID is quoted in output as this ID is a string, not a number.")
+    Title: str = Field(description="The corresponding `Title` of the checklist item provided")
+    Requirement: str = Field(description="The corresponding `Requirement` of the checklist item provided")
+    Observation: str = Field(description="Your detailed observation of the code in accordance to the given checklist item")
+    Functions: List[str] = Field(description="Test functions that satisfy the given requirement. If no function satisfies, an empty list i.e. [] should be returned.")
+    Evaluation: str = Field(description="The summarized evaluation. Must be one of Satisfied/Partially Satisfied/Not Satisfied.")
+    Score: float = Field(description="The score obtained from the given evaluation (1 for Satisfied / 0.5 for Partially Satisfied / 0 for Not Satisfied)")
+
+
 class EvaluationPromptFormat(PromptFormat):
     """Formatter for the initial call of the test evaluation pipeline.
      Injects checklist and codebase into prompt and expect JSON in return."""
     def __init__(self):
         super().__init__()
 
-        class TestItemEvaluation(BaseModel):
-            ID: str = Field(description="The corresponding `ID` of the checklist item provided. Make sure the ID is quoted in output as this ID is a string, not a number.")
-            Title: str = Field(description="The corresponding `Title` of the checklist item provided")
-            Requirement: str = Field(description="The corresponding `Requirement` of the checklist item provided")
-            Observation: str = Field(description="Your detailed observation of the code in accordance to the given checklist item")
-            Functions: List[str] = Field(description="Test functions that satisfy the given requirement. If no function satisfies, an empty list i.e. [] should be returned.")
-            Evaluation: str = Field(description="The summarized evaluation. Must be one of Satisfied/Partially Satisfied/Not Satisfied.")
-            Score: float = Field(description="The score obtained from the given evaluation (1 for Satisfied / 0.5 for Partially Satisfied / 0 for Not Satisfied)")
-
         class EvalResult(BaseModel):
             results: List[TestItemEvaluation]
 
@@ -51,6 +52,40 @@ class EvaluationPromptFormat(PromptFormat):
         )
 
 
+class BatchEvaluationPromptFormat(PromptFormat):
+    """Formatter for evaluating multiple files in one call of the test
+    evaluation pipeline. Injects checklist and the code of all files into
+    prompt and expect JSON with one evaluation per file in return."""
+    def __init__(self):
+        super().__init__()
+
+        class FileEvalResult(BaseModel):
+            File: str = Field(description="The path of the evaluated file, exactly as provided")
+            results: List[TestItemEvaluation]
+
+        class BatchEvalResult(BaseModel):
+            files: List[FileEvalResult]
+
+        self.parser = PydanticOutputParser(pydantic_object=BatchEvalResult)
+
+        self.prompt = PromptTemplate(
+            template="You are an expert Machine Learning Engineer.\n"
+                     "Please help to evaluate the following files using the given checklist. "
+                     "Each file must be evaluated separately and independently of the other files.\n"
+                     "{format_instructions}\n"
+                     "For a test item to be considered as `Satisfied` or `Partially Satisfied`, "
+                     "the corresponding function(s) satisfying the item's requirement must be "
+                     "provided in the `Functions` attribute. For every file and for every item "
+                     "in the checklist, you must provide an evaluation, "
+                     "even if the tests are not related to the item in any way.\n"
+                     "Here is the checklist as a list of JSON objects:\n```{checklist}```\n"
+                     "Here are the files to be analyzed:\n{codebase}",
+            description="Code Review for Machine Learning Project",
+            input_variables=["checklist", "codebase"],
+            partial_variables={"format_instructions": self.parser.get_format_instructions()},
+        )
+
+
 class GenerationPromptFormat(PromptFormat):
     """Formatter for the initial call of the test spec generation pipeline.
     Injects checklist and codebase into prompt and expect JSON in return."""
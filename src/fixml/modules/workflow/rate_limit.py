@@ -0,0 +1,166 @@
+import time
+import random
+import threading
+from typing import Callable, Optional
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check if an error is raised because a rate limit is exceeded, e.g.
+    `openai.RateLimitError`, without importing the client libraries."""
+    return getattr(error, 'status_code', None) == 429
+
+
+class TokenBucket:
+    """A token bucket refilled continuously up to its capacity.
+
+    Parameters
+    ----------
+    capacity : float
+        Maximum number of tokens in the bucket.
+    refill_rate : float
+        Number of tokens added per second.
+    clock : Callable[[], float]
+        Function returning the current time in seconds.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float,
+                 clock: Callable[[], float]):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens +
+                          (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def try_take(self, amount: float) -> float:
+        """Take tokens if available.
+
+        Amounts larger than the capacity are capped to the capacity, so that
+        they can still be taken once the bucket is full.
+
+        Returns
+        -------
+        float
+            0 if the tokens are taken, otherwise the number of seconds to
+            wait until they are available.
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0
+        return (amount - self.tokens) / self.refill_rate
+
+    def adjust(self, amount: float) -> None:
+        """Take (or give back) tokens without waiting, e.g. to correct an
+        estimate after the fact. The bucket may go into debt."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """Schedule LLM calls under requests and tokens per minute budgets.
+
+    A limiter is thread-safe and can be shared by multiple runners, so that
+    all of them stay within the same quota. Calls failing because of a rate
+    limit are retried after a jittered exponential backoff.
+
+    Parameters
+    ----------
+    requests_per_minute : int, optional
+        Maximum number of requests per minute. Unlimited if not provided.
+    tokens_per_minute : int, optional
+        Maximum number of tokens per minute. Unlimited if not provided.
+    max_retries : int, optional
+        Maximum number of retries of a call failing because of a rate limit.
+        Default is 6.
+    base_delay : float, optional
+        Upper bound of the delay before the first retry, in seconds. The
+        bound doubles on every retry. Default is 1.
+    max_delay : float, optional
+        Maximum delay before a retry, in seconds. Default is 60.
+    clock : Callable[[], float], optional
+        Function returning the current time in seconds. Default is
+        `time.monotonic`.
+    sleep : Callable[[float], None], optional
+        Function waiting for a number of seconds. Default is `time.sleep`.
+    rng : Callable[[], float], optional
+        Function returning a random number in [0, 1) for the jitter. Default
+        is `random.random`.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None,
+                 max_retries: int = 6, base_delay: float = 1,
+                 max_delay: float = 60,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep,
+                 rng: Callable[[], float] = random.random):
+        for budget in [requests_per_minute, tokens_per_minute]:
+            if budget is not None and budget <= 0:
+                raise ValueError("Rate limits must be positive.")
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.rng = rng
+
+        self._lock = threading.Lock()
+        self._requests = None
+        if requests_per_minute:
+            self._requests = TokenBucket(requests_per_minute,
+                                         requests_per_minute / 60, clock)
+        self._tokens = None
+        if tokens_per_minute:
+            self._tokens = TokenBucket(tokens_per_minute,
+                                       tokens_per_minute / 60, clock)
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Wait until a request of an estimated number of tokens fits within
+        the budgets, then take it from the budgets."""
+        while True:
+            with self._lock:
+                wait = 0
+                if self._requests is not None:
+                    wait = max(wait, self._requests.try_take(1))
+                if self._tokens is not None and not wait:
+                    wait = self._tokens.try_take(tokens)
+                    if wait and self._requests is not None:
+                        # give back the request taken above
+                        self._requests.adjust(-1)
+                if not wait:
+                    return
+            self.sleep(wait)
+
+    def record(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the tokens budget with the actual number of tokens used
+        by a request acquired with an estimate."""
+        if self._tokens is not None:
+            with self._lock:
+                self._tokens.adjust(actual_tokens - estimated_tokens)
+
+    def get_backoff_delay(self, attempt: int) -> float:
+        """Delay before the given retry of a call, with full jitter, i.e.
+        uniformly sampled up to the exponential bound."""
+        bound = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return bound * self.rng()
+
+    def call(self, func: Callable, tokens: int = 0):
+        """Call a function under the budgets, retrying it with backoff while
+        it fails because of a rate limit. Other errors are raised
+        immediately."""
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                return func()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                self.sleep(self.get_backoff_delay(attempt))
+                attempt += 1
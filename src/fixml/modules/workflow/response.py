@@ -1,13 +1,17 @@
 import json
+import hashlib
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional, Union, Iterator
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, PrivateAttr
 
 from ..code_analyzer.repo import Repository
 from ..checklist.checklist import Checklist
 from ..mixins import WriteableMixin
+from ..utils import get_extension
+from .table import write_result_table
 
 
 class LLMInfo(BaseModel):
@@ -18,14 +22,14 @@ class LLMInfo(BaseModel):
 class RepositoryInfo(BaseModel):
     path: Union[str, Path] = Field(description="Path of the repository")
     git_commit: str = Field(description="Commit hash used during evaluation")
-    object: Repository = Field(description="Repository object", exclude=True)
+    object: Optional[Repository] = Field(description="Repository object. None if not loaded", exclude=True, default=None)
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
 
 class ChecklistInfo(BaseModel):
     path: Union[str, Path] = Field(description="Path of the checklist")
-    object: Checklist = Field(description="Checklist object", exclude=True)
+    object: Optional[Checklist] = Field(description="Checklist object. None if not loaded", exclude=True, default=None)
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -45,11 +49,34 @@ class CallResult(BaseModel):
     end_time: datetime = Field(description="End time of the call")
     tokens_used: TokenInfo = Field(description="Token related information")
     files_evaluated: List[str] = Field(description="List of files used in the call")
-    context: Dict[str, str] = Field(description="Injected context as a dictionary")
-    prompt: str = Field(description="Final constructed prompt sent to LLM")
+    context: Optional[Dict[str, str]] = Field(description="Injected context as a dictionary. None if stored at the response level", default=None)
+    prompt: Optional[str] = Field(description="Final constructed prompt sent to LLM. None if it can be reconstructed from the response", default=None)
+    codebase_hash: Optional[str] = Field(description="Hash of the injected codebase stored at the response level", default=None)
     success: bool = Field(description="Whether the call is successful")
     parsed_response: Optional[Dict] = Field(description="Parsed response")
     error: Optional[ErrorInfo] = Field(description="List of errors (if any)", default=None)
+    cached: bool = Field(description="Whether the response is served from the cache", default=False)
+    batch_id: Optional[str] = Field(description="Identifier of the batched call shared by the call results of all files evaluated in it. None if not batched", default=None)
+
+    def slim(self) -> "CallResult":
+        """Return a copy without the context and the prompt, e.g. to keep
+        only the outcome of a call in memory once it is written to a file."""
+        return self.model_copy(update={"context": None, "prompt": None})
+
+
+class TokenEstimate(BaseModel):
+    file: str = Field(description="Path of the test file")
+    calls: int = Field(description="Number of calls including the file")
+    batch_size: int = Field(description="Number of files sharing the calls", default=1)
+    input_count: int = Field(description="Estimated number of prompt tokens attributed to the file")
+    output_count: int = Field(description="Estimated number of response tokens attributed to the file")
+    max_call_tokens: int = Field(description="Estimated number of tokens of the largest call including the file")
+    exceeds_context_window: bool = Field(description="Whether any call including the file may exceed the context window of the model")
+
+
+class PromptTemplateInfo(BaseModel):
+    template: str = Field(description="Prompt template in f-string format")
+    partial_variables: Dict[str, str] = Field(description="Variables already filled in the template", default={})
 
 
 class EvaluationResponse(BaseModel, WriteableMixin):
@@ -78,42 +105,386 @@ class EvaluationResponse(BaseModel, WriteableMixin):
                 output_count
             }
             files_evaluated
-            injected
-            prompt
+            context (omitted in compact responses)
+            prompt (omitted in compact responses)
+            codebase_hash (compact responses only)
             success
             parsed_response
             errors [{
                 name
                 description
             }]
+            cached
+            batch_id  (batched calls only)
         }]
+        prompt_template {  (compact responses only)
+            template
+            partial_variables
+        }
+        shared_context  (compact responses only)
+        codebases  (compact responses only)
     }
+
+    In a compact response, the context shared by all calls (e.g. the
+    checklist) and the prompt template are stored once, and the codebases are
+    stored once per unique content, keyed by their hashes. The context and the
+    prompt of each call can be reconstructed with `get_context` and
+    `get_prompt`.
+
+    The context and the prompt of a batched call, which evaluates multiple
+    files at once, are stored with only one of the call results sharing its
+    batch ID.
     """
     model: LLMInfo = Field(description="LLM-related information")
     repository: RepositoryInfo = Field(description="Repository-related information")
     checklist: ChecklistInfo = Field(description="Checklist-related information")
     call_results: List[CallResult] = Field(description="List of call results", default=[])
+    prompt_template: Optional[PromptTemplateInfo] = Field(description="Prompt template used in all calls", default=None)
+    shared_context: Dict[str, str] = Field(description="Injected context shared by all calls", default={})
+    codebases: Dict[str, str] = Field(description="Injected codebases keyed by their hashes", default={})
+
+    _stored_batch_ids: set = PrivateAttr(default_factory=set)
 
     def __init__(self, **data):
         super().__init__(**data)
 
+    @staticmethod
+    def hash_codebase(codebase: str) -> str:
+        return hashlib.sha256(codebase.encode("utf-8")).hexdigest()
+
+    def _get_batch_call_result(self, call_result: CallResult) -> CallResult:
+        """Find the call result storing the context and the prompt of the
+        batched call of a call result."""
+        for result in self.call_results:
+            if result.batch_id == call_result.batch_id and \
+                    result.context is not None:
+                return result
+        raise KeyError(f"No call result stores the context of batch "
+                       f"{call_result.batch_id}.")
+
+    def get_context(self, call_result: CallResult) -> Dict[str, str]:
+        """Return the injected context of a call result."""
+        if call_result.context is not None:
+            return call_result.context
+        if call_result.batch_id is not None:
+            return self._get_batch_call_result(call_result).context
+        return {**self.shared_context,
+                "codebase": self.codebases[call_result.codebase_hash]}
+
+    def get_prompt(self, call_result: CallResult) -> str:
+        """Return the prompt of a call result, reconstructing it if needed."""
+        if call_result.prompt is not None:
+            return call_result.prompt
+        if call_result.batch_id is not None:
+            return self._get_batch_call_result(call_result).prompt
+        return self.prompt_template.template.format(
+            **self.prompt_template.partial_variables,
+            **self.get_context(call_result))
+
+    def compact(self, call_result: CallResult) -> CallResult:
+        """Move the context of a call result to the response level.
+
+        Returns a copy of the call result which refers to the codebase by its
+        hash. If the call result does not share the same context as the
+        response, or its prompt cannot be reconstructed with the prompt
+        template of the response (e.g. a call evaluating a batch of files),
+        it is returned unchanged.
+        """
+        if call_result.batch_id is not None:
+            return call_result
+        context = self.get_context(call_result)
+        shared = {k: v for k, v in context.items() if k != "codebase"}
+        if "codebase" not in context or shared != self.shared_context:
+            return call_result
+        if call_result.prompt is not None and \
+                call_result.prompt != self.prompt_template.template.format(
+                    **self.prompt_template.partial_variables, **context):
+            return call_result
+        codebase_hash = self.hash_codebase(context["codebase"])
+        self.codebases.setdefault(codebase_hash, context["codebase"])
+        return call_result.model_copy(update={
+            "context": None, "prompt": None, "codebase_hash": codebase_hash
+        })
+
+    def share_batch_context(self, call_result: CallResult) -> CallResult:
+        """Store the context and the prompt of a batched call only once.
+
+        Returns a copy of the call result without its context and prompt if
+        a call result of the same batch was already passed, otherwise the
+        call result unchanged.
+        """
+        if call_result.batch_id is None:
+            return call_result
+        if call_result.batch_id not in self._stored_batch_ids:
+            self._stored_batch_ids.add(call_result.batch_id)
+            return call_result
+        return call_result.model_copy(update={
+            "context": None, "prompt": None, "codebase_hash": None
+        })
+
     def to_json(self, output_path: Union[str, Path], exist_ok=False):
+        """Write the response to a file.
+
+        If the file has the extension `.jsonl`, the response is written in the
+        JSON Lines format (see `JsonlResponseWriter`). Otherwise, the whole
+        response is written as a single JSON document.
+        """
+        if get_extension(output_path) == "jsonl":
+            with JsonlResponseWriter(output_path, exist_ok=exist_ok) as writer:
+                writer.write_header(self)
+                for call_result in self.call_results:
+                    if call_result.codebase_hash is not None:
+                        writer.write_codebase(
+                            call_result.codebase_hash,
+                            self.codebases[call_result.codebase_hash])
+                    writer.write(call_result)
+            return
+
         self._filedump_check(output_path, exist_ok=exist_ok)
         json_str = self.model_dump_json()
         with open(output_path, "w", encoding="utf-8") as f:
             f.write(json_str)
 
+    def to_records(self, run: Optional[str] = None) -> List[dict]:
+        """Flatten the response into one record per test file and checklist
+        item, e.g. for analysing many runs as a table.
+
+        The tokens and timings of a file cover all of its attempts, and the
+        items are those of its final attempt. A file without a valid
+        evaluation has a single record without an item.
+
+        Parameters
+        ----------
+        run : str, optional
+            Identifier of the run. Defaults to the repository name, the
+            commit and the start time, as in the default response file name.
+        """
+        call_results_by_file = {}
+        for call_result in self.call_results:
+            if call_result.files_evaluated:
+                call_results_by_file.setdefault(
+                    call_result.files_evaluated[0], []).append(call_result)
+
+        root = Path(self.repository.path)
+        if run is None:
+            start_time = min([x.start_time for x in self.call_results],
+                             default=datetime.now())
+            run = f"{root.name}_{self.repository.git_commit}_" \
+                  f"{start_time.timestamp():0.0f}"
+        records = []
+        for fp, call_results in call_results_by_file.items():
+            final = call_results[-1]
+            if not final.success and len(call_results) > 1:
+                # the final result of a file failing all of its attempts
+                # repeats the last attempt
+                call_results = call_results[:-1]
+            try:
+                file = Path(fp).relative_to(root).as_posix()
+            except ValueError:
+                file = str(fp)
+            start_time = min(x.start_time for x in call_results)
+            end_time = max(x.end_time for x in call_results)
+            record = {
+                'run': run,
+                'repo': root.name,
+                'git_commit': self.repository.git_commit,
+                'model': self.model.name,
+                'temperature': self.model.temperature,
+                'file': file,
+                'input_tokens': sum(x.tokens_used.input_count
+                                    for x in call_results),
+                'output_tokens': sum(x.tokens_used.output_count
+                                     for x in call_results),
+                'start_time': start_time,
+                'end_time': end_time,
+                'duration': (end_time - start_time).total_seconds(),
+                'attempts': len(call_results),
+                'success': final.success,
+                'cached': final.cached,
+            }
+            items = []
+            if final.success and final.parsed_response:
+                items = final.parsed_response.get('results', [])
+            if not items:
+                records.append({**record, 'id': None, 'title': None,
+                                'score': None, 'evaluation': None,
+                                'functions': None})
+            for item in items:
+                records.append({
+                    **record,
+                    'id': item.get('ID'),
+                    'title': item.get('Title'),
+                    'score': item.get('Score'),
+                    'evaluation': item.get('Evaluation'),
+                    'functions': item.get('Functions', []),
+                })
+        return records
+
+    def to_parquet(self, output_path: Union[str, Path], exist_ok=False,
+                   run: Optional[str] = None):
+        """Write the records of the response (see `to_records`) to a
+        Parquet file. Requires pyarrow."""
+        self._filedump_check(output_path, exist_ok=exist_ok)
+        write_result_table(self.to_records(run=run), output_path)
+
     @classmethod
-    def from_json(cls, json_path: Union[str, Path]):
+    def from_json(cls, json_path: Union[str, Path],
+                  repository: Optional[Repository] = None,
+                  checklist: Optional[Checklist] = None,
+                  slim: bool = False, load_objects: bool = True):
         """Reconstruct an instance of EvaluationResponse from JSON file.
 
+        Both single-document JSON files and JSON Lines files (with the
+        extension `.jsonl`) are accepted. JSON Lines files are read line by
+        line, so that only the call results are kept in memory.
+
         Requires checklist path and repository path to actually exist in the
-        system, otherwise an error will be thrown.
+        system, otherwise an error will be thrown. Already loaded repository
+        and checklist objects can be provided to avoid loading them again.
+
+        If `slim` is True, the contexts and the prompts of the call results
+        and the codebases are not loaded (see `CallResult.slim`), e.g. to
+        compute the scores of large responses. If `load_objects` is False,
+        the repository and the checklist are not loaded either, so that the
+        results can be read without them, e.g. with `to_records`.
         """
-        with open(json_path, "r", encoding="utf-8") as f:
-            deserialized = json.load(f)
-        repo_obj = Repository(deserialized["repository"]["path"])
-        checklist_obj = Checklist(deserialized["checklist"]["path"])
-        deserialized["repository"]["object"] = repo_obj
-        deserialized["checklist"]["object"] = checklist_obj
+        if get_extension(json_path) == "jsonl":
+            deserialized = cls.read_jsonl_header(json_path)
+            deserialized["call_results"] = []
+            deserialized["codebases"] = {}
+            for line in cls._iter_jsonl_lines(json_path):
+                if "codebase_hash" in line and "codebase" in line:
+                    if not slim:
+                        deserialized["codebases"][line["codebase_hash"]] = \
+                            line["codebase"]
+                    continue
+                call_result = CallResult.model_validate(line)
+                deserialized["call_results"].append(
+                    call_result.slim() if slim else call_result)
+        else:
+            with open(json_path, "r", encoding="utf-8") as f:
+                deserialized = json.load(f)
+            if slim:
+                deserialized["call_results"] = [
+                    CallResult.model_validate(x).slim()
+                    for x in deserialized["call_results"]]
+                deserialized["codebases"] = {}
+        if load_objects:
+            repository = repository or \
+                Repository(deserialized["repository"]["path"])
+            checklist = checklist or \
+                Checklist(deserialized["checklist"]["path"])
+        deserialized["repository"]["object"] = repository
+        deserialized["checklist"]["object"] = checklist
         return cls(**deserialized)
+
+    @staticmethod
+    def read_jsonl_header(jsonl_path: Union[str, Path]) -> dict:
+        """Read the response-level information from a JSON Lines file."""
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            return json.loads(f.readline())
+
+    @staticmethod
+    def _iter_jsonl_lines(jsonl_path: Union[str, Path]) -> Iterator[dict]:
+        """Lazily read the lines following the header of a JSON Lines file.
+
+        A truncated last line, e.g. left by an interrupted run, is ignored.
+        """
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                yield json.loads(line)
+
+    @classmethod
+    def iter_jsonl_call_results(cls, jsonl_path: Union[str, Path]) -> Iterator[CallResult]:
+        """Lazily read the call results from a JSON Lines file one by one."""
+        for line in cls._iter_jsonl_lines(jsonl_path):
+            if "codebase" not in line:
+                yield CallResult.model_validate(line)
+
+
+class JsonlResponseWriter(WriteableMixin):
+    """Append-only writer of evaluation responses in JSON Lines format.
+
+    The first line contains the response-level information i.e. model,
+    repository and checklist. Every following line contains either one call
+    result, or, for compact responses, one codebase with its hash, written
+    before the first call result referring to it.
+    Each line is flushed as soon as it is written, so that the results
+    obtained so far survive a crash.
+
+    Parameters
+    ----------
+    output_path : str or pathlib.Path
+        Path of the JSON Lines file.
+    exist_ok : bool, optional
+        The flag to bypass overwrite protection. Default is False.
+    append : bool, optional
+        If True and the file already contains a response, new call results
+        are appended to it and the header is not written again. A truncated
+        last line left by an interrupted run is removed first. Default is
+        False.
+    """
+
+    def __init__(self, output_path: Union[str, Path], exist_ok: bool = False,
+                 append: bool = False):
+        self._filedump_check(output_path, exist_ok=exist_ok or append)
+        self.output_path = Path(output_path)
+        self.appending = append and self.output_path.is_file() and \
+            self.output_path.stat().st_size > 0
+        if self.appending:
+            self._remove_truncated_line()
+        self._lock = threading.Lock()
+        self._written_codebases = set()
+        self._file = open(self.output_path, "a" if append else "w",
+                          encoding="utf-8")
+
+    def _remove_truncated_line(self) -> None:
+        with open(self.output_path, "rb+") as f:
+            content = f.read()
+            if not content.endswith(b"\n"):
+                f.truncate(content.rfind(b"\n") + 1)
+
+    def restart(self) -> None:
+        """Discard the content of the file, so that the response is written
+        from scratch with a header of its own instead of appended."""
+        with self._lock:
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.flush()
+            self.appending = False
+            self._written_codebases.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _write_line(self, line: str) -> None:
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def write_header(self, response: EvaluationResponse) -> None:
+        """Write the response-level information, unless appending."""
+        if self.appending:
+            return
+        self._write_line(response.model_dump_json(
+            exclude={"call_results", "codebases"}))
+
+    def write_codebase(self, codebase_hash: str, codebase: str) -> None:
+        """Write a codebase of a compact response, unless already written."""
+        if codebase_hash in self._written_codebases:
+            return
+        self._written_codebases.add(codebase_hash)
+        self._write_line(json.dumps({"codebase_hash": codebase_hash,
+                                     "codebase": codebase}))
+
+    def write(self, call_result: CallResult) -> None:
+        self._write_line(call_result.model_dump_json())
+
+    def close(self) -> None:
+        self._file.close()
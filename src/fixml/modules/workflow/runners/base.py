@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
 from langchain_core.language_models import LanguageModelLike
 
+from ..cache import ResponseCache
 from ..prompt_format import PromptFormat
+from ..rate_limit import RateLimiter
 from ...checklist.checklist import Checklist
 from ...code_analyzer.repo import Repository
 
@@ -23,14 +26,48 @@ class PromptInjectionRunner(PipelineRunner, ABC):
     i.e. class object to use a prompt template, constructing a complete
     prompt by injecting context such as checklist items and test files,
     then pass the prompt to LLM.
+
+    If a response cache is provided, validated responses will be stored in
+    and served from the cache, keyed by the formatted prompt and the model.
+
+    LLM calls are scheduled by a rate limiter, which can be shared by
+    multiple runners. Calls failing because of a rate limit are retried with
+    backoff by the limiter, while invalid responses are left to the runners
+    to re-ask immediately.
     """
 
     def __init__(self, llm: LanguageModelLike, prompt_format: PromptFormat,
-                 repository: Repository, checklist: Checklist):
+                 repository: Repository, checklist: Checklist,
+                 cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
         self.llm = llm
 
         self.checklist = checklist
         self.repository = repository
         self.prompt_format = prompt_format
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter()
 
         self.chain = self.prompt_format.prompt | self.llm | self.prompt_format.parser
+
+    def _invoke_chain(self, chain, context: dict, estimated_tokens: int = 0):
+        """Invoke a chain under the rate limiter.
+
+        Errors other than rate limits, including parsing errors, are raised
+        to the caller.
+        """
+        return self.rate_limiter.call(lambda: chain.invoke(context),
+                                      tokens=estimated_tokens)
+
+    def _get_cached_response(self, prompt: str) -> Optional[dict]:
+        if self.cache is None:
+            return None
+        return self.cache.get(self._get_cache_key(prompt))
+
+    def _cache_response(self, prompt: str, response: dict) -> None:
+        if self.cache is not None:
+            self.cache.put(self._get_cache_key(prompt), response)
+
+    def _get_cache_key(self, prompt: str) -> str:
+        return ResponseCache.make_key(prompt, self.llm.model_name,
+                                      self.llm.temperature)
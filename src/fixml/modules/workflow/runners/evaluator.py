@@ -1,7 +1,10 @@
+import os
 import json
+import hashlib
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Union, Iterable
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from typing import Optional, Union, Iterable, Callable
 
 from tqdm import tqdm
 from typing import List
@@ -12,23 +15,66 @@ from langchain_core.language_models import LanguageModelLike
 from langchain_core.documents import Document
 
 from .base import PromptInjectionRunner
-from ..prompt_format import PromptFormat
-from ..response import EvaluationResponse, CallResult
+from ..cache import ResponseCache
+from ..prompt_format import PromptFormat, BatchEvaluationPromptFormat
+from ..response import EvaluationResponse, CallResult, TokenInfo, \
+    TokenEstimate, JsonlResponseWriter, PromptTemplateInfo
+from ..rate_limit import RateLimiter
+from ..tokens import estimate_tokens, get_context_window
 from ...checklist.checklist import Checklist
+from ...code_analyzer.context import ContextPolicy, extract_test_context
 from ...code_analyzer.repo import Repository
 
 
 class PerFileTestEvaluator(PromptInjectionRunner):
-    """Concrete test evaluator that performs per-file evaluation."""
+    """Concrete test evaluator that performs per-file evaluation.
+
+    If a batch token budget is given, small test files are packed into the
+    same LLM call as long as the estimated number of tokens of their code
+    stays within the budget, so that the instructions and the checklist are
+    sent once for all of them. The evaluation of each file is still stored
+    as a call result of its own.
+
+    Conversely, if a chunk token budget is given, test files whose code
+    exceeds the budget are split into groups of chunks within the budget.
+    Each group is evaluated separately and the evaluations are merged per
+    checklist item.
+
+    If a context policy is given, only the tests and the code they depend on
+    are sent to the LLM instead of the whole file, see
+    `extract_test_context`.
+    """
 
     def __init__(self, llm: LanguageModelLike, prompt_format: PromptFormat,
                  repository: Repository, checklist: Checklist,
                  test_dirs: Optional[Iterable[Union[str, Path]]] = None,
-                 retries: int = 3):
-        super().__init__(llm, prompt_format, repository, checklist)
+                 retries: int = 3, concurrency: int = 1,
+                 cache: Optional[ResponseCache] = None,
+                 compact: bool = False,
+                 batch_token_budget: Optional[int] = None,
+                 chunk_token_budget: Optional[int] = None,
+                 context_policy: Optional[ContextPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        super().__init__(llm, prompt_format, repository, checklist,
+                         cache=cache, rate_limiter=rate_limiter)
+        self.compact = compact
+        if batch_token_budget is not None and batch_token_budget < 1:
+            raise ValueError("Batch token budget must be a positive integer.")
+        self.batch_token_budget = batch_token_budget
+        if chunk_token_budget is not None and chunk_token_budget < 1:
+            raise ValueError("Chunk token budget must be a positive integer.")
+        self.chunk_token_budget = chunk_token_budget
+        self.context_policy = context_policy
+        self.batch_prompt_format = BatchEvaluationPromptFormat()
+        self.batch_chain = self.batch_prompt_format.prompt | self.llm | \
+            self.batch_prompt_format.parser
         self.retries = retries
+        if concurrency < 1:
+            raise ValueError("Concurrency must be a positive integer.")
+        self.concurrency = concurrency
 
         self._files = self.repository.list_test_files(test_dirs=test_dirs)['Python']
+        self._splits = {}
         if not self._files:
             print("File loader returned no files!")
 
@@ -38,14 +84,32 @@ class PerFileTestEvaluator(PromptInjectionRunner):
             print("Loaded checklist successfully, but it contains no test items!")
 
     @staticmethod
-    def _load_test_file_into_splits(file_path: str) -> List[Document]:
+    def _load_test_file_into_splits(
+            file_path: str,
+            context_policy: Optional[ContextPolicy] = None) -> List[Document]:
         loader = PythonLoader(file_path)
         py = loader.load()
+        if context_policy is not None:
+            for doc in py:
+                doc.page_content = extract_test_context(doc.page_content,
+                                                        context_policy)
         py_splits = RecursiveCharacterTextSplitter.from_language(
             language=Language.PYTHON, chunk_size=1000,
             chunk_overlap=0).split_documents(py)
         return py_splits
 
+    def _get_file_splits(self, fp: str) -> List[Document]:
+        """Load the splits of a test file, reusing them across runs of the
+        evaluator as long as the file is unchanged."""
+        stat = os.stat(fp)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._splits.get(fp)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        splits = self._load_test_file_into_splits(fp, self.context_policy)
+        self._splits[fp] = (signature, splits)
+        return splits
+
     def _validate_response(self, raw_response: dict) -> None:
         """Validation logics that are not covered by pydantic or langchain."""
         # ensures the number of items in the response is the same as provided
@@ -55,7 +119,585 @@ class PerFileTestEvaluator(PromptInjectionRunner):
         if not all(['Functions' in item for item in raw_response['results']]):
             raise AssertionError("Not all items returned contain the attribute `Functions`.")
 
-    def run(self, verbose: bool = False) -> EvaluationResponse:
+    def _invoke(self, chain, prompt_format: PromptFormat, context: dict,
+                files: List[str], validate: Callable[[dict], None],
+                verbose: bool = False) -> List[CallResult]:
+        """Invoke a chain with the given context, retrying on failures.
+
+        Parameters
+        ----------
+        chain : Runnable
+            The chain to be invoked.
+        prompt_format : PromptFormat
+            The prompt format used by the chain.
+        context : dict
+            Variables to be injected into the prompt.
+        files : List[str]
+            Paths of the files included in the context.
+        validate : Callable[[dict], None]
+            Function raising an exception if the response is invalid.
+        verbose : bool, optional
+            If True, print out the errors encountered.
+
+        Returns
+        -------
+        List[CallResult]
+            All call results produced, including the failed attempts. The
+            final attempt is always the last item.
+        """
+        call_results = []
+        response = None
+        retry_count = 0
+        start_time = datetime.now()
+
+        prompt = prompt_format.prompt.format(**context)
+
+        response = self._get_cached_response(prompt)
+        if response is not None:
+            call_result = CallResult(
+                start_time=start_time,
+                end_time=datetime.now(),
+                tokens_used={'input_count': 0, 'output_count': 0},
+                files_evaluated=files,
+                context=context,
+                prompt=prompt,
+                success=True,
+                parsed_response=response,
+                cached=True
+            )
+            return [call_result]
+
+        estimated_tokens = estimate_tokens(prompt, self.llm.model_name)
+        while not response and retry_count < self.retries:
+            try:
+                with get_openai_callback() as cb:
+                    try:
+                        response = self._invoke_chain(chain, context,
+                                                      estimated_tokens)
+                    finally:
+                        if cb.total_tokens:
+                            self.rate_limiter.record(estimated_tokens,
+                                                     cb.total_tokens)
+
+                # inconsistent behaviour across langchains' parsers!
+                # some will return dictionary while some will return
+                # pydantic model. For now, we coerce all responses to
+                # dictionary, but later on it might be preferable to coerce
+                # all into pydantic model for easier validation instead.
+                if not isinstance(response, dict):
+                    response = response.dict()
+
+                validate(response)
+                self._cache_response(prompt, response)
+
+            except Exception as e:
+                if verbose:
+                    print(f"error occurred: {e.__class__.__name__} - {str(e)}")
+                response = None
+                call_result = CallResult(
+                    start_time=start_time,
+                    end_time=datetime.now(),
+                    tokens_used={
+                        # default is set to 0 if something fails, we don't
+                        # have to do error handling on this
+                        'input_count': cb.prompt_tokens,
+                        'output_count': cb.completion_tokens
+                    },
+                    files_evaluated=files,
+                    context=context,
+                    prompt=prompt,
+                    success=bool(response),
+                    parsed_response=response,
+                    error={
+                        'name': e.__class__.__name__,
+                        'description': str(e)
+                    }
+                )
+
+                call_results.append(call_result)
+                retry_count += 1
+                continue
+
+        if not response:
+            print(f"Unable to obtain valid response from LLM within {self.retries} attempts")
+            print("continuing...")
+
+        end_time = datetime.now()
+
+        call_result = CallResult(
+            start_time=start_time,
+            end_time=end_time,
+            tokens_used={
+                'input_count': cb.prompt_tokens,
+                'output_count': cb.completion_tokens
+            },
+            files_evaluated=files,
+            context={k: str(v) for k, v in context.items()},
+            prompt=prompt,
+            success=bool(response),
+            parsed_response=response,
+        )
+
+        call_results.append(call_result)
+        return call_results
+
+    def _evaluate_file(self, fp: str,
+                       verbose: bool = False) -> List[CallResult]:
+        """Evaluate a single test file, retrying on failures.
+
+        Parameters
+        ----------
+        fp : str
+            Path of the test file to be evaluated.
+        verbose : bool, optional
+            If True, print out the progress and the errors encountered.
+
+        Returns
+        -------
+        List[CallResult]
+            All call results produced for this file, including the failed
+            attempts. The final attempt is always the last item. If the file
+            is split into chunks, the final item merges the evaluations of
+            all chunks and records the context of the whole file.
+        """
+        if verbose:
+            print(fp)
+        context, chunk_contexts = self._get_file_contexts(fp, verbose)
+        if len(chunk_contexts) == 1:
+            return self._invoke(self.chain, self.prompt_format, context, [fp],
+                                self._validate_response, verbose)
+
+        call_results = []
+        finals = []
+        for chunk_context in chunk_contexts:
+            *failed, final = self._invoke(self.chain, self.prompt_format,
+                                          chunk_context, [fp],
+                                          self._validate_response, verbose)
+            call_results.extend(failed)
+            finals.append(final)
+
+        success = all(final.success for final in finals)
+        call_results.append(CallResult(
+            start_time=min(final.start_time for final in finals),
+            end_time=max(final.end_time for final in finals),
+            tokens_used={
+                'input_count': sum(x.tokens_used.input_count for x in finals),
+                'output_count': sum(x.tokens_used.output_count for x in finals)
+            },
+            files_evaluated=[fp],
+            context=context,
+            prompt=self.prompt_format.prompt.format(**context),
+            success=success,
+            parsed_response=self._merge_responses(
+                [final.parsed_response for final in finals]
+            ) if success else None,
+            cached=all(final.cached for final in finals),
+        ))
+        return call_results
+
+    def _get_file_contexts(self, fp: str,
+                           verbose: bool = False) -> tuple[dict, List[dict]]:
+        """Build the context of a test file for the evaluation prompt.
+
+        Returns
+        -------
+        tuple[dict, List[dict]]
+            The context of the whole file, and the contexts of each call to
+            be made for the file, i.e. of each chunk if the file is split.
+        """
+        splits = self._get_file_splits(fp)
+        if verbose:
+            print(f"# splits: {len(splits)}")
+
+        context = {"codebase": str(splits),
+                   "checklist": json.dumps(self._test_items)}
+        chunks = self._group_splits(splits)
+        if len(chunks) == 1:
+            return context, [context]
+        if verbose:
+            print(f"# chunk groups: {len(chunks)}")
+        return context, [{**context, "codebase": str(chunk)}
+                         for chunk in chunks]
+
+    def _group_splits(self, splits: List[Document]) -> List[List[Document]]:
+        """Group the splits of a file into chunks within the chunk token
+        budget. Splits are never divided further, so a split exceeding the
+        budget on its own forms a chunk by itself."""
+        if self.chunk_token_budget is None:
+            return [splits]
+
+        chunks = []
+        chunk, chunk_tokens = [], 0
+        for split in splits:
+            tokens = estimate_tokens(str([split]), self.llm.model_name)
+            if chunk and chunk_tokens + tokens > self.chunk_token_budget:
+                chunks.append(chunk)
+                chunk, chunk_tokens = [], 0
+            chunk.append(split)
+            chunk_tokens += tokens
+        if chunk or not chunks:
+            chunks.append(chunk)
+        return chunks
+
+    @staticmethod
+    def _merge_responses(responses: List[dict]) -> dict:
+        """Merge the evaluations of the chunks of a file per checklist item.
+
+        The evaluation with the highest score is kept, the functions found in
+        all chunks are combined, and the observations are concatenated.
+        """
+        merged = {}
+        for response in responses:
+            for item in response['results']:
+                if item['ID'] not in merged:
+                    merged[item['ID']] = {**item,
+                                          'Observation': [item['Observation']],
+                                          'Functions': list(item['Functions'])}
+                    continue
+                current = merged[item['ID']]
+                current['Observation'].append(item['Observation'])
+                current['Functions'].extend(
+                    func for func in item['Functions']
+                    if func not in current['Functions'])
+                if item['Score'] > current['Score']:
+                    current['Score'] = item['Score']
+                    current['Evaluation'] = item['Evaluation']
+        for item in merged.values():
+            item['Observation'] = '\n'.join(item['Observation'])
+        return {'results': list(merged.values())}
+
+    def _get_file_label(self, fp: str) -> str:
+        """Label identifying a file in a batched prompt."""
+        return str(Path(fp).relative_to(self.repository.root))
+
+    def _get_file_codebase(self, fp: str) -> str:
+        splits = self._get_file_splits(fp)
+        return f"### File: {self._get_file_label(fp)}\n```{splits}```\n"
+
+    def _get_batch_context(self, files: List[str]
+                           ) -> tuple[dict, List[str], List[str]]:
+        """Build the context of multiple test files for the batch prompt.
+
+        Returns
+        -------
+        tuple[dict, List[str], List[str]]
+            The context, and the label and code of each file in it.
+        """
+        codebases = [self._get_file_codebase(fp) for fp in files]
+        labels = [self._get_file_label(fp) for fp in files]
+        context = {"codebase": "\n".join(codebases),
+                   "checklist": json.dumps(self._test_items)}
+        return context, labels, codebases
+
+    def _plan_calls(self, files: List[str]) -> List[List[str]]:
+        """Group files into calls according to the batch token budget.
+
+        Consecutive files are packed greedily into the same call as long as
+        the estimated number of tokens of their code stays within the
+        budget. Files exceeding the budget on their own are evaluated alone.
+        """
+        if self.batch_token_budget is None:
+            return [[fp] for fp in files]
+
+        groups = []
+        group, group_tokens = [], 0
+        for fp in files:
+            tokens = estimate_tokens(self._get_file_codebase(fp),
+                                     self.llm.model_name)
+            if group and group_tokens + tokens > self.batch_token_budget:
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(fp)
+            group_tokens += tokens
+        if group:
+            groups.append(group)
+        return groups
+
+    def _validate_batch_response(self, labels: List[str],
+                                 raw_response: dict) -> None:
+        """Validate a batched response, and each of the evaluations in it."""
+        returned = [file['File'] for file in raw_response['files']]
+        if sorted(returned) != sorted(labels):
+            raise AssertionError("Files returned from LLM do not match the files provided.")
+        for file in raw_response['files']:
+            self._validate_response(file)
+
+    @staticmethod
+    def _apportion(total: int, weights: List[int]) -> List[int]:
+        """Split an integer total proportionally to the weights, such that
+        the shares sum up to the total."""
+        weight_sum = sum(weights)
+        if not weight_sum:
+            weights, weight_sum = [1] * len(weights), len(weights)
+        shares = [total * w // weight_sum for w in weights]
+        remainders = sorted(range(len(weights)),
+                            key=lambda i: total * weights[i] % weight_sum,
+                            reverse=True)
+        for i in remainders[:total - sum(shares)]:
+            shares[i] += 1
+        return shares
+
+    def _split_tokens(self, call_result: CallResult,
+                      weights: List[int]) -> List[TokenInfo]:
+        """Split the tokens used by a batched call among its files."""
+        input_counts = self._apportion(call_result.tokens_used.input_count,
+                                       weights)
+        output_counts = self._apportion(call_result.tokens_used.output_count,
+                                        weights)
+        return [TokenInfo(input_count=input_count, output_count=output_count)
+                for input_count, output_count in zip(input_counts,
+                                                     output_counts)]
+
+    def _evaluate_batch(self, files: List[str],
+                        verbose: bool = False) -> dict[str, List[CallResult]]:
+        """Evaluate multiple test files in a single call.
+
+        Every attempt of the batched call is attributed back to a call result
+        of each file, with the tokens used split in proportion to the size of
+        the files. These call results share the ID of the batch, so that the
+        prompt and the context of the call are stored only once (see
+        `EvaluationResponse.share_batch_context`). If no valid response can
+        be obtained, the files are evaluated one by one instead, after their
+        share of the failed attempts.
+
+        Parameters
+        ----------
+        files : List[str]
+            Paths of the test files to be evaluated.
+        verbose : bool, optional
+            If True, print out the progress and the errors encountered.
+
+        Returns
+        -------
+        dict[str, List[CallResult]]
+            Mapping of test file paths to their call results.
+        """
+        if len(files) == 1:
+            return {files[0]: self._evaluate_file(files[0], verbose)}
+        if verbose:
+            print(f"batch of {len(files)} files: {files}")
+
+        context, labels, codebases = self._get_batch_context(files)
+        call_results = self._invoke(
+            self.batch_chain, self.batch_prompt_format, context, files,
+            lambda response: self._validate_batch_response(labels, response),
+            verbose
+        )
+        failed, final = call_results[:-1], call_results[-1]
+        # the attempts of the call share its prompt, which identifies it
+        batch_id = hashlib.sha256(final.prompt.encode("utf-8")).hexdigest()
+        weights = [estimate_tokens(codebase, self.llm.model_name)
+                   for codebase in codebases]
+
+        evaluated = {fp: [] for fp in files}
+        for call_result in failed:
+            tokens = self._split_tokens(call_result, weights)
+            for i, fp in enumerate(files):
+                evaluated[fp].append(call_result.model_copy(update={
+                    "files_evaluated": [fp], "tokens_used": tokens[i],
+                    "batch_id": batch_id,
+                }))
+
+        if not final.success:
+            # the final result of a failed call repeats its last attempt
+            print("Falling back to evaluating the files of the batch one by one.")
+            for fp in files:
+                evaluated[fp].extend(self._evaluate_file(fp, verbose))
+            return evaluated
+
+        results = {file['File']: file['results']
+                   for file in final.parsed_response['files']}
+        tokens = self._split_tokens(final, weights)
+        for i, (fp, label) in enumerate(zip(files, labels)):
+            evaluated[fp].append(final.model_copy(update={
+                "files_evaluated": [fp],
+                "tokens_used": tokens[i],
+                "parsed_response": {"results": results[label]},
+                "batch_id": batch_id,
+            }))
+        return evaluated
+
+    def estimate(self, observation_tokens: int = 50) -> List[TokenEstimate]:
+        """Estimate the tokens of the evaluation without calling the LLM.
+
+        The prompts are built exactly as in `run`, including batching,
+        chunking and context extraction, and their tokens are counted
+        locally. The number of response tokens is estimated from the size of
+        an evaluation of every checklist item. Responses which could be
+        served from the cache are not taken into account.
+
+        Parameters
+        ----------
+        observation_tokens : int, optional
+            Expected number of tokens of the observation of each checklist
+            item in the response. Default is 50.
+
+        Returns
+        -------
+        List[TokenEstimate]
+            The estimate of each test file, in the same order as the files
+            are listed.
+        """
+        model_name = self.llm.model_name
+        context_window = get_context_window(model_name)
+        item_tokens = sum(
+            estimate_tokens(json.dumps({
+                **item, 'Observation': '', 'Functions': [],
+                'Evaluation': 'Partially Satisfied', 'Score': 0.5
+            }), model_name) + observation_tokens
+            for item in self._test_items
+        )
+
+        estimates = []
+        for group in self._plan_calls(self._files):
+            if len(group) == 1:
+                _, contexts = self._get_file_contexts(group[0])
+                prompts = [self.prompt_format.prompt.format(**context)
+                           for context in contexts]
+                input_counts = [[estimate_tokens(prompt, model_name)]
+                                for prompt in prompts]
+            else:
+                context, _, codebases = self._get_batch_context(group)
+                prompt = self.batch_prompt_format.prompt.format(**context)
+                weights = [estimate_tokens(codebase, model_name)
+                           for codebase in codebases]
+                input_counts = [self._apportion(
+                    estimate_tokens(prompt, model_name), weights)]
+
+            call_tokens = [sum(counts) + item_tokens * len(group)
+                           for counts in input_counts]
+            for i, fp in enumerate(group):
+                estimates.append(TokenEstimate(
+                    file=fp,
+                    calls=len(input_counts),
+                    batch_size=len(group),
+                    input_count=sum(counts[i] for counts in input_counts),
+                    output_count=item_tokens * len(input_counts),
+                    max_call_tokens=max(call_tokens),
+                    exceeds_context_window=context_window is not None and
+                    max(call_tokens) > context_window
+                ))
+        return estimates
+
+    def _get_reusable_results(self, previous: EvaluationResponse,
+                              changed: set[str]) -> dict[str, CallResult]:
+        """Find results in a previous response which are still valid.
+
+        A result is reusable when it is successful, it was produced by the
+        same model with the same checklist items, and the evaluated file is
+        not one of the changed files.
+
+        Parameters
+        ----------
+        previous : EvaluationResponse
+            The previous response of the same repository.
+        changed : set[str]
+            Paths of files changed since the previous response, relative to
+            the repository root.
+
+        Returns
+        -------
+        dict[str, CallResult]
+            Mapping of test file paths to their reusable call results.
+        """
+        if previous.model.name != self.llm.model_name or \
+                previous.model.temperature != self.llm.temperature:
+            print("Previous response was evaluated with a different model. "
+                  "Its results will not be reused.")
+            return {}
+
+        previous_root = Path(previous.repository.path)
+        checklist = json.dumps(self._test_items)
+        files = set(self._files)
+
+        reusable = {}
+        for result in previous.call_results:
+            if not result.success or len(result.files_evaluated) != 1:
+                continue
+            context = previous.get_context(result)
+            if context.get("checklist") != checklist:
+                continue
+            previous_fp = Path(result.files_evaluated[0])
+            if not previous_fp.is_relative_to(previous_root):
+                continue
+            rel_path = previous_fp.relative_to(previous_root)
+            fp = str(self.repository.root / rel_path)
+            if fp in files and str(rel_path) not in changed:
+                # the context is restored in full as the previous response
+                # may store it at the response level
+                reusable[fp] = result.model_copy(update={
+                    "files_evaluated": [fp],
+                    "context": context,
+                    "prompt": previous.get_prompt(result),
+                    "codebase_hash": None,
+                })
+        return reusable
+
+    def _store(self, eval_response: EvaluationResponse,
+               call_result: CallResult,
+               writer: Optional[JsonlResponseWriter] = None) -> CallResult:
+        """Prepare a call result for storage and write it to the writer.
+
+        In compact mode, the context of the call result is moved to the
+        response level before it is stored. The context of a batched call is
+        only stored with the first call result of the batch. Once written, only the slim call
+        result is kept in memory, as its context and prompt are in the file.
+        """
+        if self.compact:
+            call_result = eval_response.compact(call_result)
+        call_result = eval_response.share_batch_context(call_result)
+        if writer is not None:
+            if call_result.codebase_hash is not None:
+                writer.write_codebase(
+                    call_result.codebase_hash,
+                    eval_response.codebases.pop(call_result.codebase_hash))
+            writer.write(call_result)
+            call_result = call_result.slim()
+        return call_result
+
+    def run(self, verbose: bool = False,
+            baseline: Optional[EvaluationResponse] = None,
+            resume: Optional[EvaluationResponse] = None,
+            writer: Optional[JsonlResponseWriter] = None,
+            executor: Optional[Executor] = None) -> EvaluationResponse:
+        """Evaluate all test files found in the repository.
+
+        Files are evaluated concurrently by a pool of at most `concurrency`
+        workers, either one by one or in batches under the batch token
+        budget. Regardless of the completion order, the call results are
+        stored in the same order as the files are listed.
+
+        Parameters
+        ----------
+        verbose : bool, optional
+            If True, print out the progress and the errors encountered.
+        baseline : EvaluationResponse, optional
+            A previous response of the same repository. If provided, only
+            files changed since the commit of the baseline are evaluated, and
+            the results of the other files are copied from the baseline.
+        resume : EvaluationResponse, optional
+            A partial response of an interrupted run. If provided, files
+            which already have a successful result for the same commit,
+            checklist and model are skipped, and their results are kept.
+        writer : JsonlResponseWriter, optional
+            If provided, the call results are written to the writer as soon
+            as the evaluation of each file finishes, in completion order.
+            When the writer appends to the file of the resumed response, the
+            resumed results are not written again. If none of them can be
+            reused, the file is rewritten from scratch instead. The returned response
+            then keeps only the slim call results (see `CallResult.slim`), as
+            their contexts and prompts are in the file.
+        executor : Executor, optional
+            If provided, the calls are submitted to this executor instead of
+            a pool of the evaluator's own, so that multiple evaluations can
+            share the same concurrency budget. The executor is not shut down,
+            and no progress bar is shown.
+
+        Returns
+        -------
+        EvaluationResponse
+            The response containing the call results of all files.
+        """
         eval_response = EvaluationResponse(
             model={'name': self.llm.model_name, 'temperature': self.llm.temperature},
             repository={
@@ -65,84 +707,86 @@ class PerFileTestEvaluator(PromptInjectionRunner):
             },
             checklist={'path': self.checklist.path, 'object': self.checklist}
         )
+        if self.compact:
+            eval_response.prompt_template = PromptTemplateInfo(
+                template=self.prompt_format.prompt.template,
+                partial_variables=self.prompt_format.prompt.partial_variables
+            )
+            eval_response.shared_context = {
+                "checklist": json.dumps(self._test_items)
+            }
 
-        for fp in tqdm(self._files):
-            if verbose:
-                print(fp)
-            splits = self._load_test_file_into_splits(fp)
-            if verbose:
-                print(f"# splits: {len(self._files)}")
-
-            response = None
-            retry_count = 0
-            start_time = datetime.now()
-
-            context = {"codebase": str(splits),
-                       "checklist": json.dumps(self._test_items)}
-
-            while not response and retry_count < self.retries:
-                try:
-                    with get_openai_callback() as cb:
-                        response = self.chain.invoke(context)
-
-                    # inconsistent behaviour across langchains' parsers!
-                    # some will return dictionary while some will return
-                    # pydantic model. For now, we coerce all responses to
-                    # dictionary, but later on it might be preferable to coerce
-                    # all into pydantic model for easier validation instead.
-                    if not isinstance(response, dict):
-                        response = response.dict()
-
-                    self._validate_response(response)
-
-                except Exception as e:
-                    if verbose:
-                        print(f"error occurred: {e.__class__.__name__} - {str(e)}")
-                    response = None
-                    call_result = CallResult(
-                        start_time=start_time,
-                        end_time=datetime.now(),
-                        tokens_used={
-                            # default is set to 0 if something fails, we don't
-                            # have to do error handling on this
-                            'input_count': cb.prompt_tokens,
-                            'output_count': cb.completion_tokens
-                        },
-                        files_evaluated=[fp],
-                        context=context,
-                        prompt=self.prompt_format.prompt.format(**context),
-                        success=bool(response),
-                        parsed_response=response,
-                        error={
-                            'name': e.__class__.__name__,
-                            'description': str(e)
-                        }
-                    )
-
-                    eval_response.call_results.append(call_result)
-                    retry_count += 1
-                    continue
+        reused = {}
+        if baseline:
+            changed = self.repository.git_context.list_changed_files(
+                baseline.repository.git_commit)
+            reused = self._get_reusable_results(baseline, changed)
+            print(f"Reusing results of {len(reused)} unchanged file(s) from "
+                  f"the baseline.")
 
-            if not response:
-                print(f"Unable to obtain valid response from LLM within {self.retries} attempts")
-                print("continuing...")
+        resumed = {}
+        if resume:
+            if resume.repository.git_commit != eval_response.repository.git_commit:
+                print("Resumed response was evaluated on a different commit. "
+                      "Its results will not be reused.")
+            else:
+                resumed = self._get_reusable_results(resume, changed=set())
+                print(f"Resuming with {len(resumed)} file(s) already "
+                      f"evaluated.")
 
-            end_time = datetime.now()
+        if writer is not None:
+            compacted_differently = resume is not None and (
+                resume.prompt_template != eval_response.prompt_template or
+                resume.shared_context != eval_response.shared_context)
+            if writer.appending and (not resumed or compacted_differently):
+                # nothing in the file is reused, e.g. it was evaluated on
+                # another commit, or its header cannot reconstruct the
+                # results written now, so the file is written again
+                writer.restart()
+            writer.write_header(eval_response)
+        for fp, call_result in reused.items():
+            if fp not in resumed:
+                reused[fp] = self._store(eval_response, call_result, writer)
+        for fp, call_result in resumed.items():
+            if writer is not None and writer.appending:
+                # already present in the file being appended to
+                resumed[fp] = call_result.slim()
+            else:
+                resumed[fp] = self._store(eval_response, call_result,
+                                         writer)
 
-            call_result = CallResult(
-                start_time=start_time,
-                end_time=end_time,
-                tokens_used={
-                    'input_count': cb.prompt_tokens,
-                    'output_count': cb.completion_tokens
-                },
-                files_evaluated=[fp],
-                context={k: str(v) for k, v in context.items()},
-                prompt=self.prompt_format.prompt.format(**context),
-                success=bool(response),
-                parsed_response=response,
-            )
+        reused.update(resumed)
+        files = [fp for fp in self._files if fp not in reused]
+
+        evaluated = {}
+        shared = executor is not None
+        if not shared:
+            executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        futures = []
+        try:
+            futures = [executor.submit(self._evaluate_batch, group, verbose)
+                       for group in self._plan_calls(files)]
+            for future in tqdm(as_completed(futures), total=len(futures),
+                               disable=shared):
+                for fp, call_results in future.result().items():
+                    evaluated[fp] = [
+                        self._store(eval_response, call_result, writer)
+                        for call_result in call_results
+                    ]
+        finally:
+            # do not wait for pending files when interrupted
+            if shared:
+                for future in futures:
+                    future.cancel()
+            else:
+                executor.shutdown(cancel_futures=True)
 
-            eval_response.call_results.append(call_result)
+        # the call results are ordered by files regardless of completion order
+        # to keep the response deterministic across runs.
+        for fp in self._files:
+            if fp in reused:
+                eval_response.call_results.append(reused[fp])
+            else:
+                eval_response.call_results.extend(evaluated[fp])
 
         return eval_response
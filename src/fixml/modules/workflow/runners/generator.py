@@ -1,10 +1,12 @@
 import json
 
-from typing import List
+from typing import List, Optional
 from langchain_core.language_models import LanguageModelLike
 
 from .base import PromptInjectionRunner
 from ..prompt_format import PromptFormat
+from ..rate_limit import RateLimiter
+from ..tokens import estimate_tokens
 from ...checklist.checklist import Checklist
 from ...code_analyzer.repo import Repository
 
@@ -18,8 +20,10 @@ class NaiveTestGenerator(PromptInjectionRunner):
     """
     def __init__(self, llm: LanguageModelLike, prompt_format: PromptFormat,
                  repository: Repository = None, checklist: Checklist = None,
-                 retries: int = 3):
-        super().__init__(llm, prompt_format, repository, checklist)
+                 retries: int = 3,
+                 rate_limiter: Optional[RateLimiter] = None):
+        super().__init__(llm, prompt_format, repository, checklist,
+                         rate_limiter=rate_limiter)
         self.retries = retries
 
         self.result = []
@@ -42,9 +46,12 @@ class NaiveTestGenerator(PromptInjectionRunner):
         response = None
         retry_count = 0
         context= {"checklist": json.dumps(self._test_items)}
+        estimated_tokens = estimate_tokens(
+            self.prompt_format.prompt.format(**context), self.llm.model_name)
         while not response and retry_count < self.retries:
             try:
-                response = self.chain.invoke(context)
+                response = self._invoke_chain(self.chain, context,
+                                              estimated_tokens)
 
                 # inconsistent behaviour across langchains' parsers!
                 # some will return dictionary while some will return pydantic model.
@@ -0,0 +1,101 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Optional, Union
+
+if TYPE_CHECKING:
+    import pyarrow
+
+
+def _import_pyarrow():
+    """Import pyarrow on first use, as it is optional and slow to import."""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required to write and read result "
+                          "tables. Install it with `pip install fixml[parquet]`.")
+    return pyarrow
+
+
+def get_result_schema() -> "pyarrow.Schema":
+    """Schema of the result table, with one row per run, test file and
+    checklist item (see `EvaluationResponse.to_records`)."""
+    pa = _import_pyarrow()
+    return pa.schema([
+        ('run', pa.string()),
+        ('repo', pa.string()),
+        ('git_commit', pa.string()),
+        ('model', pa.string()),
+        ('temperature', pa.float64()),
+        ('file', pa.string()),
+        ('id', pa.string()),
+        ('title', pa.string()),
+        ('score', pa.float64()),
+        ('evaluation', pa.string()),
+        ('functions', pa.list_(pa.string())),
+        ('input_tokens', pa.int64()),
+        ('output_tokens', pa.int64()),
+        ('start_time', pa.timestamp('us')),
+        ('end_time', pa.timestamp('us')),
+        ('duration', pa.float64()),
+        ('attempts', pa.int64()),
+        ('success', pa.bool_()),
+        ('cached', pa.bool_()),
+    ])
+
+
+def write_result_table(records: List[dict],
+                       output_path: Union[str, Path]) -> None:
+    """Write result records to a Parquet file."""
+    pa = _import_pyarrow()
+    table = pa.Table.from_pylist(records, schema=get_result_schema())
+    pa.parquet.write_table(table, str(output_path))
+
+
+def _as_list(values: Union[str, Iterable[str]]) -> List[str]:
+    return [values] if isinstance(values, str) else list(values)
+
+
+def read_result_tables(paths: Union[str, Path, Iterable[Union[str, Path]]],
+                       repos: Optional[Union[str, Iterable[str]]] = None,
+                       models: Optional[Union[str, Iterable[str]]] = None,
+                       ids: Optional[Union[str, Iterable[str]]] = None,
+                       columns: Optional[List[str]] = None):
+    """Read the result tables of many runs at once.
+
+    The filters are pushed down to the Parquet reader, so that row groups
+    without matching rows are skipped, and only the requested columns are
+    read.
+
+    Parameters
+    ----------
+    paths : str, Path or Iterable
+        A Parquet file, a directory of Parquet files, or a list of files.
+    repos : str or Iterable[str], optional
+        If provided, only the rows of these repositories are read.
+    models : str or Iterable[str], optional
+        If provided, only the rows of these models are read.
+    ids : str or Iterable[str], optional
+        If provided, only the rows of these checklist items are read.
+    columns : List[str], optional
+        If provided, only these columns are read.
+
+    Returns
+    -------
+    pd.DataFrame
+        The rows of all runs.
+    """
+    ds = _import_pyarrow().dataset
+    if not isinstance(paths, (str, Path)):
+        paths = [str(path) for path in paths]
+    dataset = ds.dataset(paths if isinstance(paths, list) else str(paths),
+                         format='parquet', schema=get_result_schema())
+
+    expression = None
+    for column, values in [('repo', repos), ('model', models), ('id', ids)]:
+        if values is None:
+            continue
+        condition = ds.field(column).isin(_as_list(values))
+        expression = condition if expression is None else \
+            expression & condition
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
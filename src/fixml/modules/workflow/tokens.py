@@ -0,0 +1,106 @@
+import math
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional
+
+try:
+    import tiktoken
+    import tiktoken.load
+except ImportError:  # pragma: no cover
+    tiktoken = None
+
+# rough number of characters per token for English text and code, used when
+# no tokenizer is available for the model
+CHARS_PER_TOKEN = 4
+
+# maximum number of tokens (prompt and completion) of the models, matched
+# by the longest prefix of the model name
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-3.5-turbo-instruct": 4096,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4o": 128000,
+}
+
+
+_offline_lock = threading.Lock()
+
+
+@contextmanager
+def _offline_tiktoken():
+    """Make tiktoken fail instead of downloading an encoding file.
+
+    tiktoken reads the encoding files from its cache directory (set by
+    `TIKTOKEN_CACHE_DIR`) and only calls `tiktoken.load.read_file` for the
+    files which are not cached, so that replacing it keeps the cached
+    encodings available without any network access.
+    """
+    def read_file(blobpath: str) -> bytes:
+        raise FileNotFoundError(f"{blobpath} is not in the tiktoken cache.")
+
+    with _offline_lock:
+        original = tiktoken.load.read_file
+        tiktoken.load.read_file = read_file
+        try:
+            yield
+        finally:
+            tiktoken.load.read_file = original
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model_name: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        with _offline_tiktoken():
+            try:
+                return tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # e.g. the encoding file is not cached
+        return None
+
+
+def estimate_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """Estimate the number of tokens of a text without calling the LLM.
+
+    The tokenizer of the model is used if `tiktoken` is installed and it
+    knows the model, otherwise `cl100k_base` is used. The encoding files of
+    tiktoken are never downloaded, so that estimates (e.g. of a dry run) do
+    not access the network: a tokenizer is only available if its file is
+    already in the tiktoken cache, which can be filled beforehand, e.g. by
+    calling `tiktoken.get_encoding("cl100k_base")` while online. If no
+    tokenizer is available, the count is approximated from the number of
+    characters.
+
+    Parameters
+    ----------
+    text : str
+        The text to be tokenized.
+    model_name : str, optional
+        Name of the model which will receive the text.
+
+    Returns
+    -------
+    int
+        Estimated number of tokens.
+    """
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def get_context_window(model_name: Optional[str]) -> Optional[int]:
+    """Return the context window of a model, or None if it is unknown."""
+    prefixes = [prefix for prefix in CONTEXT_WINDOWS
+                if model_name and model_name.startswith(prefix)]
+    if not prefixes:
+        return None
+    return CONTEXT_WINDOWS[max(prefixes, key=len)]
@@ -1,11 +1,89 @@
+import json
+import re
+import time
+import random
 from pathlib import Path
+from typing import Any, List, Optional
 
 from dotenv import find_dotenv, load_dotenv
 from git import Repo
 import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
 from fixml.modules.checklist import checklist as c
 
 
+class FakeRateLimitError(Exception):
+    """An error raised by a provider when a rate limit is exceeded."""
+    status_code = 429
+
+
+class FakeEvaluationChatModel(BaseChatModel):
+    """A local chat model which returns a valid evaluation for every
+    checklist item after an artificial latency. Prompts containing multiple
+    files are answered with an evaluation per file.
+
+    The calls numbered (from 1) in `rate_limited_calls` raise a rate limit
+    error, and those in `invalid_calls` return an evaluation of no items."""
+    model_name: str = "fake-evaluation-model"
+    temperature: float = 0
+    test_items: List[dict] = []
+    latency: float = 0
+    jitter: float = 0
+    calls: int = 0
+    rate_limited_calls: List[int] = []
+    invalid_calls: List[int] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-evaluation"
+
+    def _generate(self, messages: List[BaseMessage],
+                  stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        if self.calls in self.rate_limited_calls:
+            raise FakeRateLimitError("Rate limit reached for requests")
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        results = [
+            {**item, 'Observation': 'Looks fine.', 'Functions': [],
+             'Evaluation': 'Not Satisfied', 'Score': 0}
+            for item in self.test_items
+        ]
+        if self.calls in self.invalid_calls:
+            results = []
+        prompt = messages[-1].content
+        labels = re.findall(r'^### File: (.+)$', prompt, flags=re.MULTILINE)
+        if labels:
+            content = json.dumps({'files': [
+                {'File': label, 'results': results} for label in labels
+            ]})
+        else:
+            content = json.dumps({'results': results})
+        input_tokens, output_tokens = len(prompt) // 4, len(content) // 4
+        message = AIMessage(content=content, usage_metadata={
+            'input_tokens': input_tokens, 'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeClock:
+    """A clock which only advances when sleeping, recording the sleeps."""
+
+    def __init__(self):
+        self.now = 0.
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
 @pytest.fixture(scope='session', autouse=True)
 def load_env():
     env_file = find_dotenv('.env.tests')
@@ -38,6 +116,29 @@ def test_git_repo(git_repo):
     return git_repo
 
 
+@pytest.fixture()
+def test_git_repo_with_tests(test_git_repo):
+    path = test_git_repo.workspace
+    for i in range(8):
+        test_file = Path(path / f'tests/test_module_{i}.py')
+        test_file.parent.mkdir(parents=True, exist_ok=True)
+        test_file.write_text(f'def test_case_{i}():\n    assert {i} == {i}\n')
+    test_git_repo.run('git add .')
+    test_git_repo.api.index.commit("Add tests")
+    return test_git_repo
+
+
+@pytest.fixture()
+def fake_clock():
+    return FakeClock()
+
+
+@pytest.fixture()
+def fake_llm(loaded_checklist):
+    items = loaded_checklist.get_all_tests(['ID', 'Title', 'Requirement'])
+    return FakeEvaluationChatModel(test_items=items)
+
+
 @pytest.fixture(scope="module")
 def loaded_checklist():
     return c.Checklist()
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+import pytest
+from fixml.modules.code_analyzer import repo as repo_module
+from fixml.modules.workflow.batch import BatchConfig, BatchRunner
+
+
+@pytest.fixture()
+def batch_config(test_git_repo_with_tests, tmp_path):
+    workspace = test_git_repo_with_tests.workspace
+    config_yml = tmp_path / 'batch_run.yml'
+    config_yml.write_text(
+        "runs: 2\n"
+        "checklist_path: null\n"
+        "model: 'fake-evaluation-model'\n"
+        f"repo_base_path: '{workspace.parent}'\n"
+        f"response_path: '{tmp_path / 'responses'}'\n"
+        "repo:\n"
+        "  - name: first\n"
+        f"    path: './{workspace.name}'\n"
+        "  - name: second\n"
+        f"    path: './{workspace.name}'\n"
+    )
+    return BatchConfig.from_yaml(config_yml)
+
+
+@pytest.fixture()
+def scans(monkeypatch):
+    """Count the repositories created."""
+    paths = []
+    original = repo_module.Repository.__init__
+
+    def init(self, path, *args, **kwargs):
+        paths.append(path)
+        original(self, path, *args, **kwargs)
+    monkeypatch.setattr(repo_module.Repository, '__init__', init)
+    return paths
+
+
+def test_batch_config_is_read_from_yaml(batch_config):
+    assert batch_config.runs == 2
+    assert [repo.name for repo in batch_config.repo] == ['first', 'second']
+    assert batch_config.get_response_path(batch_config.repo[0], 2) \
+        .endswith('/first_02.json')
+
+
+def test_batch_run_evaluates_every_repo_every_run(batch_config, fake_llm,
+                                                  loaded_checklist):
+    runner = BatchRunner(batch_config, fake_llm, checklist=loaded_checklist)
+    entries = runner.run()
+    assert sorted((x['repo'], x['run']) for x in entries) == [
+        ('first', 1), ('first', 2), ('second', 1), ('second', 2)]
+    assert runner.read_record() == entries
+    assert fake_llm.calls == 4 * 8
+
+
+def test_batch_run_scans_each_repo_once(batch_config, fake_llm,
+                                        loaded_checklist, scans):
+    BatchRunner(batch_config, fake_llm, checklist=loaded_checklist,
+                concurrency=4).run()
+    assert len(scans) == 2
+
+
+def test_batch_run_scans_repos_before_the_runs(batch_config, fake_llm,
+                                               loaded_checklist, monkeypatch):
+    # a scan with multiple workers forks processes, which is only safe
+    # before the threads of the runs are started
+    threads = []
+    original = repo_module.Repository._scan_python_files
+
+    def scan_python_files(self, files):
+        threads.append(threading.current_thread())
+        return original(self, files)
+    monkeypatch.setattr(repo_module.Repository, '_scan_python_files',
+                        scan_python_files)
+    entries = BatchRunner(batch_config, fake_llm, checklist=loaded_checklist,
+                          concurrency=4,
+                          repository_kwargs={'workers': 2}).run()
+    assert len(entries) == 4
+    assert threads == [threading.main_thread()] * 2
+
+
+def test_batch_run_leaves_runs_of_unscanned_repos_pending(
+        batch_config, fake_llm, loaded_checklist, capsys):
+    batch_config.repo[1].path = './missing'
+    runner = BatchRunner(batch_config, fake_llm, checklist=loaded_checklist)
+    entries = runner.run()
+    assert [(x['repo'], x['run']) for x in entries] == [('first', 1),
+                                                        ('first', 2)]
+    assert "Scan of second failed" in capsys.readouterr().out
+    assert [run for _, run in runner.get_pending_runs()] == [1, 2]
+
+
+def test_batch_run_skips_completed_runs(batch_config, fake_llm,
+                                        loaded_checklist, capsys):
+    BatchRunner(batch_config, fake_llm, checklist=loaded_checklist).run()
+    calls = fake_llm.calls
+
+    runner = BatchRunner(batch_config, fake_llm, checklist=loaded_checklist)
+    assert runner.run() == []
+    assert fake_llm.calls == calls
+    assert "Skipping 4 run(s)" in capsys.readouterr().out
+
+
+def test_batch_run_redoes_runs_without_response(batch_config, fake_llm,
+                                                loaded_checklist):
+    BatchRunner(batch_config, fake_llm, checklist=loaded_checklist).run()
+    missing = batch_config.get_response_path(batch_config.repo[1], 1)
+    os.remove(missing)
+
+    runner = BatchRunner(batch_config, fake_llm, checklist=loaded_checklist)
+    entries = runner.run()
+    assert [(x['repo'], x['run']) for x in entries] == [('second', 1)]
+    # the record is appended to rather than rewritten
+    assert len(runner.read_record()) == 5
+
+
+def test_batch_runs_share_concurrency_budget(batch_config, fake_llm,
+                                             loaded_checklist):
+    fake_llm.latency = 0.05
+    runner = BatchRunner(batch_config, fake_llm, checklist=loaded_checklist,
+                         concurrency=16)
+    start = time.perf_counter()
+    runner.run()
+    # 32 calls of 0.05s each would take at least 1.6s if run one by one
+    assert time.perf_counter() - start < 1.2
@@ -0,0 +1,96 @@
+import json
+
+import pandas as pd
+import pytest
+from fixml.modules.code_analyzer.repo import Repository
+from fixml.modules.llm_eval.batch_result import read_scores, \
+    read_batch_scores, get_scores_by_run, get_score_stats, get_score_counts
+from fixml.modules.workflow.batch import BatchConfig, BatchRunner
+from fixml.modules.workflow.prompt_format import EvaluationPromptFormat
+from fixml.modules.workflow.runners.evaluator import PerFileTestEvaluator
+
+
+def call_result(file, success, results):
+    return {
+        'files_evaluated': [file],
+        'context': {'codebase': 'assert x == {"success": false}'},
+        'prompt': 'Reply with {"parsed_response": null}',
+        'success': success,
+        'parsed_response': {'results': results} if results else None,
+    }
+
+
+@pytest.fixture()
+def response_json(tmp_path):
+    path = tmp_path / 'response.json'
+    path.write_text(json.dumps({'call_results': [
+        call_result('test_a.py', False, None),
+        call_result('test_a.py', True, [{'ID': '2.1', 'Score': 1},
+                                        {'ID': '3.2', 'Score': 0.5}]),
+        call_result('test_b.py', True, [{'ID': '2.1', 'Score': 0}]),
+    ]}, indent=2))
+    return path
+
+
+@pytest.fixture()
+def scores():
+    return pd.DataFrame({
+        'repo': ['a'] * 6,
+        'run': [1, 1, 2, 2, 3, 3],
+        'file': ['x', 'y'] * 3,
+        'id': ['2.1'] * 6,
+        'score': [0, 1, 0.5, 0, 0.5, 0.5],
+    })
+
+
+def test_scores_are_read_from_parsed_responses_only(response_json):
+    assert read_scores(response_json) == [
+        ('test_a.py', True, '2.1', 1),
+        ('test_a.py', True, '3.2', 0.5),
+        ('test_b.py', True, '2.1', 0),
+    ]
+
+
+def test_scores_are_read_from_jsonl_responses(test_git_repo_with_tests,
+                                              loaded_checklist, fake_llm,
+                                              tmp_path):
+    evaluator = PerFileTestEvaluator(
+        fake_llm, prompt_format=EvaluationPromptFormat(),
+        repository=Repository(test_git_repo_with_tests.workspace),
+        checklist=loaded_checklist)
+    response = evaluator.run()
+    response.to_json(tmp_path / 'response.jsonl')
+    rows = read_scores(tmp_path / 'response.jsonl')
+    assert len(rows) == 8 * len(fake_llm.test_items)
+    assert {row[0] for row in rows} == set(evaluator._files)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_scores_are_read_into_long_table(test_git_repo_with_tests,
+                                               loaded_checklist, fake_llm,
+                                               tmp_path, workers):
+    workspace = test_git_repo_with_tests.workspace
+    config = BatchConfig(runs=2, repo_base_path=str(workspace.parent),
+                         response_path=str(tmp_path / 'responses'),
+                         repo=[{'name': 'repo', 'path': workspace.name}])
+    BatchRunner(config, fake_llm, checklist=loaded_checklist).run()
+
+    scores = read_batch_scores(tmp_path / 'responses', workers=workers)
+    assert list(scores.columns) == ['repo', 'run', 'response_path', 'file',
+                                    'success', 'id', 'score']
+    assert len(scores) == 2 * 8 * len(fake_llm.test_items)
+    assert sorted(scores['run'].unique()) == [1, 2]
+
+
+def test_scores_by_run_are_max_across_files(scores):
+    by_run = get_scores_by_run(scores)
+    assert by_run['score'].tolist() == [1, 0.5, 0.5]
+    assert get_scores_by_run(scores, ids=['3.2']).empty
+
+
+def test_score_stats_and_counts_by_repo(scores):
+    by_run = get_scores_by_run(scores)
+    stats = get_score_stats(by_run)
+    assert stats[['count', 'mean']].values.tolist() == [[3, pytest.approx(2 / 3)]]
+    counts = get_score_counts(by_run)
+    assert counts[['score', 'count']].values.tolist() == [[0.5, 2], [1, 1]]
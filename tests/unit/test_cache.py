@@ -0,0 +1,60 @@
+import pytest
+from fixml.modules.workflow.cache import ResponseCache
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    return ResponseCache(tmp_path)
+
+
+def test_cache_key_depends_on_prompt_model_and_temperature():
+    key = ResponseCache.make_key("prompt", "gpt-4o", 0)
+    assert key == ResponseCache.make_key("prompt", "gpt-4o", 0)
+    assert key != ResponseCache.make_key("prompt!", "gpt-4o", 0)
+    assert key != ResponseCache.make_key("prompt", "gpt-3.5-turbo", 0)
+    assert key != ResponseCache.make_key("prompt", "gpt-4o", 0.5)
+
+
+def test_cache_returns_stored_response(cache):
+    cache.put("key", {"results": [1, 2, 3]})
+    assert cache.get("key") == {"results": [1, 2, 3]}
+    assert cache.get("missing") is None
+
+
+def test_cache_persists_on_disk(tmp_path):
+    ResponseCache(tmp_path).put("key", {"results": []})
+    assert ResponseCache(tmp_path).get("key") == {"results": []}
+
+
+@pytest.mark.parametrize(
+    "mode, readable, writable",
+    [
+        ("off", False, False),
+        ("read", True, False),
+        ("write", False, True),
+        ("readwrite", True, True),
+    ]
+)
+def test_cache_respects_mode(tmp_path, mode, readable, writable):
+    ResponseCache(tmp_path).put("existing", {"results": []})
+    cache = ResponseCache(tmp_path, mode=mode)
+    cache.put("new", {"results": []})
+    assert (cache.get("existing") is not None) == readable
+    assert (ResponseCache(tmp_path).get("new") is not None) == writable
+
+
+def test_invalid_cache_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(tmp_path, mode="sometimes")
+
+
+def test_cache_evicts_least_recently_used_responses(tmp_path):
+    cache = ResponseCache(tmp_path, max_size=100)
+    response = {"results": "x" * 30}  # ~45 bytes when serialized
+    cache.put("a", response)
+    cache.put("b", response)
+    cache.get("a")
+    cache.put("c", response)
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
@@ -1,6 +1,14 @@
+import json
+import subprocess
+import sys
+
 import pytest
 
+from fixml.cli.export import ExportActions
 from fixml.cli.repository import RepositoryActions
+from fixml.modules.code_analyzer.repo import Repository
+from fixml.modules.workflow.prompt_format import EvaluationPromptFormat
+from fixml.modules.workflow.runners.evaluator import PerFileTestEvaluator
 
 
 def test_cli_should_stop_if_file_exists_but_no_overwrite_flag_is_given(tmp_path, test_git_repo):
@@ -10,4 +18,66 @@ def test_cli_should_stop_if_file_exists_but_no_overwrite_flag_is_given(tmp_path,
         RepositoryActions().evaluate(
             test_git_repo.workspace,
             export_report_to=str(report_path)
-        )
\ No newline at end of file
+        )
+
+def test_cli_dry_run_estimates_tokens_without_api_key(test_git_repo_with_tests,
+                                                      monkeypatch, capsys):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.chdir(test_git_repo_with_tests.workspace)
+    RepositoryActions().evaluate(test_git_repo_with_tests.workspace,
+                                 dry_run=True)
+    output = capsys.readouterr().out
+    assert "tests/test_module_7.py" in output
+    assert "total" in output
+    assert not list(test_git_repo_with_tests.workspace.glob("evaluation_*"))
+
+
+def test_cli_exports_evaluation_table(test_git_repo_with_tests,
+                                      loaded_checklist, fake_llm, tmp_path):
+    pytest.importorskip("pyarrow")
+    from fixml.modules.workflow.table import read_result_tables
+    repo = Repository(test_git_repo_with_tests.workspace)
+    evaluator = PerFileTestEvaluator(fake_llm,
+                                     prompt_format=EvaluationPromptFormat(),
+                                     repository=repo,
+                                     checklist=loaded_checklist)
+    paths = []
+    for run in range(2):
+        paths.append(str(tmp_path / f'lightfm_{run:02d}.json'))
+        evaluator.run().to_json(paths[-1])
+    # the repository and the checklist are not needed to export the results
+    for path in paths:
+        with open(path) as f:
+            response = json.load(f)
+        response['repository']['path'] = str(tmp_path / 'lightfm')
+        response['checklist']['path'] = str(tmp_path / 'checklist.csv')
+        with open(path, 'w') as f:
+            json.dump(response, f)
+
+    export_path = tmp_path / 'results.parquet'
+    ExportActions().evaluation_table(paths, str(export_path))
+    table = read_result_tables(export_path)
+    assert set(table['run']) == {'lightfm_00', 'lightfm_01'}
+    assert len(table) == 2 * 8 * len(fake_llm.test_items)
+
+
+################################################################################
+# Startup                                                                      #
+################################################################################
+HEAVY_MODULES = ['langchain', 'langchain_core', 'langchain_community',
+                 'langchain_openai', 'openai', 'pandas', 'pypandoc',
+                 'tiktoken', 'pyarrow']
+
+
+def test_cli_startup_does_not_import_heavy_modules():
+    # a fresh interpreter is needed, as the tests import everything
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'from fixml.cli.main import TestCreation; TestCreation()'],
+        capture_output=True, text=True, check=True)
+    # `-X importtime` logs every module imported, with its cumulative time
+    imported = {line.split('|')[-1].strip()
+                for line in result.stderr.splitlines()
+                if line.startswith('import time:')}
+    loaded = [module for module in HEAVY_MODULES if module in imported]
+    assert loaded == []
@@ -0,0 +1,67 @@
+import time
+
+import pandas as pd
+import pytest
+from fixml.modules.code_analyzer.repo import Repository
+from fixml.modules.llm_eval.consistency_eval import ConsistencyEvaluator
+from fixml.modules.workflow.prompt_format import EvaluationPromptFormat
+from fixml.modules.workflow.rate_limit import RateLimiter
+from fixml.modules.workflow.runners.evaluator import PerFileTestEvaluator
+
+
+@pytest.fixture()
+def models(test_git_repo_with_tests, loaded_checklist, fake_llm):
+    repo = Repository(test_git_repo_with_tests.workspace)
+    prompt_format = EvaluationPromptFormat()
+    return [
+        {'name': name, 'model': PerFileTestEvaluator(
+            type(fake_llm)(model_name=name, test_items=fake_llm.test_items),
+            prompt_format=prompt_format, repository=repo,
+            checklist=loaded_checklist)}
+        for name in ['model-a', 'model-b']
+    ]
+
+
+def test_consistency_evaluator_runs_every_model_every_run(models,
+                                                         loaded_checklist):
+    consist_eval = ConsistencyEvaluator(concurrency=4)
+    consist_eval.evaluate(models, num_test_runs=3)
+    reports = consist_eval.evaluation_reports
+    assert list(zip(reports['model_name'], reports['test_no'])) == [
+        (name, test_no) for name in ['model-a', 'model-b']
+        for test_no in [1, 2, 3]]
+    assert reports['score'].notna().all()
+    n_items = len(loaded_checklist.get_all_tests(['ID']))
+    assert len(consist_eval.item_results) == 2 * 3 * n_items
+    for item in models:
+        # 8 test files per run
+        assert item['model'].llm.calls == 3 * 8
+
+
+def test_consistency_evaluator_runs_concurrently(models):
+    for item in models:
+        item['model'].llm.latency = 0.05
+    consist_eval = ConsistencyEvaluator(concurrency=16)
+    start = time.perf_counter()
+    consist_eval.evaluate(models, num_test_runs=2)
+    # 32 calls of 0.05s each would take at least 1.6s if run one by one
+    assert time.perf_counter() - start < 1.2
+
+
+def test_consistency_evaluator_shares_rate_limiter(models):
+    limiter = RateLimiter()
+    ConsistencyEvaluator(rate_limiter=limiter).evaluate(models, 1)
+    assert all(item['model'].rate_limiter is limiter for item in models)
+
+
+def test_consistency_dist_compares_runs_per_item():
+    consist_eval = ConsistencyEvaluator()
+    consist_eval.item_results = pd.DataFrame({
+        'model_name': ['a'] * 4 + ['b'] * 2,
+        'test_no': [1, 2, 1, 2, 1, 2],
+        'ID': ['1.1', '1.1', '1.2', '1.2', '1.1', '1.1'],
+        'is_Satisfied': [1, 1, 0, 0.5, 0.5, 0.5],
+    })
+    consistency = consist_eval.get_consistency_dist()['consistency']
+    assert consistency.to_dict() == {('a', '1.1'): True, ('a', '1.2'): False,
+                                     ('b', '1.1'): True}
@@ -0,0 +1,436 @@
+import time
+
+import pytest
+from fixml.modules.code_analyzer.context import ContextPolicy
+from fixml.modules.code_analyzer.repo import Repository
+from fixml.modules.workflow.cache import CacheMode, ResponseCache
+from fixml.modules.workflow.prompt_format import EvaluationPromptFormat
+from fixml.modules.workflow.rate_limit import RateLimiter
+from fixml.modules.workflow import tokens
+from fixml.modules.workflow.runners.evaluator import PerFileTestEvaluator
+from fixml.modules.workflow.tokens import estimate_tokens
+
+
+@pytest.fixture()
+def evaluator_factory(test_git_repo_with_tests, loaded_checklist, fake_llm):
+    def factory(**kwargs):
+        repo = Repository(test_git_repo_with_tests.workspace)
+        return PerFileTestEvaluator(fake_llm,
+                                    prompt_format=EvaluationPromptFormat(),
+                                    repository=repo,
+                                    checklist=loaded_checklist, **kwargs)
+    return factory
+
+
+################################################################################
+# Concurrency                                                                  #
+################################################################################
+def test_evaluator_rejects_non_positive_concurrency(evaluator_factory):
+    with pytest.raises(ValueError):
+        evaluator_factory(concurrency=0)
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_evaluator_evaluates_every_file_once(evaluator_factory, concurrency):
+    evaluator = evaluator_factory(concurrency=concurrency)
+    response = evaluator.run()
+    assert len(response.call_results) == len(evaluator._files) == 8
+    assert all(result.success for result in response.call_results)
+
+
+def test_concurrent_results_are_in_file_order(evaluator_factory, fake_llm):
+    fake_llm.jitter = 0.05
+    evaluator = evaluator_factory(concurrency=4)
+    response = evaluator.run()
+    evaluated = [result.files_evaluated[0] for result in response.call_results]
+    assert evaluated == list(evaluator._files)
+
+
+def test_concurrent_evaluation_overlaps_calls(evaluator_factory, fake_llm):
+    fake_llm.latency = 0.2
+    evaluator = evaluator_factory(concurrency=8)
+    start = time.perf_counter()
+    evaluator.run()
+    # 8 calls of 0.2s each would take at least 1.6s if run one by one
+    assert time.perf_counter() - start < 1.2
+
+
+################################################################################
+# Response cache                                                               #
+################################################################################
+def test_cached_responses_are_served_without_calling_llm(evaluator_factory,
+                                                         fake_llm, tmp_path):
+    cache = ResponseCache(tmp_path, mode=CacheMode.READWRITE)
+    first = evaluator_factory(cache=cache).run()
+    assert fake_llm.calls == 8
+    assert not any(result.cached for result in first.call_results)
+
+    second = evaluator_factory(cache=cache).run()
+    assert fake_llm.calls == 8
+    assert all(result.cached and result.success
+               for result in second.call_results)
+    assert all(result.tokens_used.input_count == 0
+               for result in second.call_results)
+    assert [x.parsed_response for x in second.call_results] == \
+           [x.parsed_response for x in first.call_results]
+
+
+def test_write_only_cache_does_not_serve_responses(evaluator_factory,
+                                                   fake_llm, tmp_path):
+    cache = ResponseCache(tmp_path, mode=CacheMode.WRITE)
+    evaluator_factory(cache=cache).run()
+    evaluator_factory(cache=cache).run()
+    assert fake_llm.calls == 16
+
+
+################################################################################
+# Incremental evaluation                                                       #
+################################################################################
+def test_baseline_reuses_results_of_unchanged_files(evaluator_factory,
+                                                    test_git_repo_with_tests,
+                                                    fake_llm):
+    baseline = evaluator_factory().run()
+    path = test_git_repo_with_tests.workspace
+    (path / 'tests/test_module_2.py').write_text(
+        'def test_case_2():\n    assert 2 + 0 == 2\n')
+    test_git_repo_with_tests.run('git add .')
+    test_git_repo_with_tests.api.index.commit("Change a test")
+
+    evaluator = evaluator_factory()
+    response = evaluator.run(baseline=baseline)
+    assert fake_llm.calls == 9
+    assert [x.files_evaluated[0] for x in response.call_results] == \
+           list(evaluator._files)
+    changed = [x for x in response.call_results
+               if x.files_evaluated[0].endswith('test_module_2.py')][0]
+    assert changed.start_time > baseline.call_results[-1].end_time
+    assert response.repository.git_commit != baseline.repository.git_commit
+
+
+def test_baseline_from_other_model_is_not_reused(evaluator_factory, fake_llm):
+    baseline = evaluator_factory().run()
+    baseline.model.name = "another-model"
+    evaluator_factory().run(baseline=baseline)
+    assert fake_llm.calls == 16
+
+
+def test_uncommitted_changes_are_evaluated_again(evaluator_factory,
+                                                 test_git_repo_with_tests,
+                                                 fake_llm):
+    baseline = evaluator_factory().run()
+    path = test_git_repo_with_tests.workspace
+    (path / 'tests/test_module_9.py').write_text(
+        'def test_case_9():\n    assert True\n')
+    evaluator_factory().run(baseline=baseline)
+    assert fake_llm.calls == 9
+
+
+################################################################################
+# Resuming                                                                     #
+################################################################################
+def test_resume_skips_files_already_evaluated(evaluator_factory, fake_llm):
+    partial = evaluator_factory().run()
+    partial.call_results = partial.call_results[:3]
+
+    evaluator = evaluator_factory()
+    response = evaluator.run(resume=partial)
+    assert fake_llm.calls == 8 + 5
+    assert [x.files_evaluated[0] for x in response.call_results] == \
+           list(evaluator._files)
+    assert response.call_results[:3] == partial.call_results
+
+
+def test_resume_reevaluates_failed_files(evaluator_factory, fake_llm):
+    partial = evaluator_factory().run()
+    partial.call_results[0].success = False
+    evaluator_factory().run(resume=partial)
+    assert fake_llm.calls == 8 + 1
+
+
+def test_resume_from_other_commit_is_not_reused(evaluator_factory,
+                                                test_git_repo_with_tests,
+                                                fake_llm):
+    partial = evaluator_factory().run()
+    test_git_repo_with_tests.api.index.commit("Empty commit")
+    evaluator_factory().run(resume=partial)
+    assert fake_llm.calls == 16
+
+
+################################################################################
+# Batching                                                                     #
+################################################################################
+def test_batching_packs_files_into_fewer_calls(evaluator_factory, fake_llm):
+    evaluator = evaluator_factory(batch_token_budget=10000)
+    response = evaluator.run()
+    assert fake_llm.calls == 1
+    assert [x.files_evaluated for x in response.call_results] == \
+           [[fp] for fp in evaluator._files]
+    assert all(len(x.parsed_response['results']) == len(evaluator._test_items)
+               for x in response.call_results)
+
+
+def test_batching_respects_token_budget(evaluator_factory, fake_llm):
+    evaluator = evaluator_factory(batch_token_budget=1)
+    groups = evaluator._plan_calls(evaluator._files)
+    assert groups == [[fp] for fp in evaluator._files]
+    evaluator.run()
+    assert fake_llm.calls == 8
+
+
+def test_batching_attributes_all_tokens_to_files(evaluator_factory, fake_llm):
+    evaluator = evaluator_factory(batch_token_budget=10000)
+    response = evaluator.run()
+    prompt = response.call_results[0].prompt
+    assert sum(x.tokens_used.input_count for x in response.call_results) == \
+           len(prompt) // 4
+    assert all(x.tokens_used.input_count > 0 for x in response.call_results)
+
+
+def test_batching_reduces_input_tokens(evaluator_factory):
+    def input_tokens(response):
+        return sum(x.tokens_used.input_count for x in response.call_results)
+
+    per_file = evaluator_factory().run()
+    batched = evaluator_factory(batch_token_budget=10000).run()
+    assert input_tokens(batched) < input_tokens(per_file)
+
+
+def test_batch_prompt_is_stored_once(evaluator_factory, tmp_path):
+    per_file = evaluator_factory().run()
+    batched = evaluator_factory(batch_token_budget=10000).run()
+    assert sum(x.prompt is not None for x in batched.call_results) == 1
+    assert len({batched.get_prompt(x) for x in batched.call_results}) == 1
+    assert all(batched.get_context(x)['codebase'].count('### File:') == 8
+               for x in batched.call_results)
+
+    per_file.to_json(tmp_path / 'per_file.json')
+    batched.to_json(tmp_path / 'batched.json')
+    assert (tmp_path / 'batched.json').stat().st_size < \
+           (tmp_path / 'per_file.json').stat().st_size
+
+
+def test_batched_baseline_is_reused(evaluator_factory, fake_llm):
+    baseline = evaluator_factory(batch_token_budget=10000).run()
+    response = evaluator_factory().run(baseline=baseline)
+    assert fake_llm.calls == 1
+    assert sum(x.prompt is not None for x in response.call_results) == 1
+    assert [response.get_prompt(x) for x in response.call_results] == \
+           [baseline.get_prompt(x) for x in baseline.call_results]
+
+
+def test_compact_batched_results_keep_batch_prompts(evaluator_factory):
+    batched = evaluator_factory(batch_token_budget=10000).run()
+    compact = evaluator_factory(batch_token_budget=10000, compact=True).run()
+    assert [compact.get_prompt(x) for x in compact.call_results] == \
+           [batched.get_prompt(x) for x in batched.call_results]
+
+
+def test_invalid_batch_falls_back_to_single_files(evaluator_factory,
+                                                  fake_llm, monkeypatch):
+    evaluator = evaluator_factory(batch_token_budget=10000, retries=2)
+
+    def invalid(labels, raw_response):
+        raise AssertionError("invalid batch")
+    monkeypatch.setattr(evaluator, "_validate_batch_response", invalid)
+
+    response = evaluator.run()
+    assert fake_llm.calls == 2 + 8
+    assert [x.success for x in response.call_results] == \
+           [False, False, True] * 8
+    assert [x.files_evaluated for x in response.call_results] == \
+           [[fp] for fp in evaluator._files for _ in range(3)]
+
+
+def test_failed_batch_attempts_are_split_among_files(evaluator_factory,
+                                                     fake_llm):
+    fake_llm.invalid_calls = [1]
+    evaluator = evaluator_factory(batch_token_budget=10000)
+    response = evaluator.run()
+    failed = [x for x in response.call_results if not x.success]
+    assert [x.files_evaluated for x in failed] == \
+           [[fp] for fp in evaluator._files]
+    prompt = failed[0].prompt
+    assert sum(x.tokens_used.input_count for x in failed) == len(prompt) // 4
+    assert all(x.tokens_used.input_count > 0 for x in failed)
+
+
+################################################################################
+# Chunking                                                                     #
+################################################################################
+@pytest.fixture()
+def large_test_file(test_git_repo_with_tests):
+    path = test_git_repo_with_tests.workspace / 'tests/test_large.py'
+    path.write_text(''.join(
+        f'def test_large_{i}():\n    assert {i} + 1 == {i + 1}\n\n\n'
+        for i in range(200)
+    ))
+    return str(path)
+
+
+def test_large_file_is_evaluated_in_chunks(evaluator_factory, fake_llm,
+                                           large_test_file):
+    evaluator = evaluator_factory(chunk_token_budget=500)
+    response = evaluator.run()
+    assert fake_llm.calls > len(evaluator._files)
+    assert [x.files_evaluated[0] for x in response.call_results] == \
+           list(evaluator._files)
+    large = response.call_results[evaluator._files.index(large_test_file)]
+    assert large.success
+    assert len(large.parsed_response['results']) == len(evaluator._test_items)
+    assert large.tokens_used.input_count > 500
+
+
+def test_files_are_not_chunked_without_budget(evaluator_factory, fake_llm,
+                                              large_test_file):
+    evaluator = evaluator_factory()
+    evaluator.run()
+    assert fake_llm.calls == len(evaluator._files)
+
+
+def test_chunk_evaluations_are_merged_per_item():
+    def item(score, functions, observation):
+        return {'ID': '1.1', 'Title': 'T', 'Requirement': 'R',
+                'Observation': observation, 'Functions': functions,
+                'Evaluation': str(score), 'Score': score}
+
+    merged = PerFileTestEvaluator._merge_responses([
+        {'results': [item(0.5, ['test_a'], 'first')]},
+        {'results': [item(1, ['test_b', 'test_a'], 'second')]},
+        {'results': [item(0, [], 'third')]},
+    ])
+    assert merged == {
+        'results': [item(1, ['test_a', 'test_b'], 'first\nsecond\nthird')]
+    }
+
+
+################################################################################
+# Context extraction                                                           #
+################################################################################
+def test_context_policy_reduces_prompt(evaluator_factory,
+                                       test_git_repo_with_tests):
+    path = test_git_repo_with_tests.workspace / 'tests/test_module_0.py'
+    path.write_text('def unused_helper():\n    return 1\n\n\n'
+                    'def test_case_0():\n    assert 0 == 0\n')
+
+    full = evaluator_factory().run()
+    extracted = evaluator_factory(context_policy=ContextPolicy()).run()
+    assert 'unused_helper' in full.call_results[0].prompt
+    assert 'unused_helper' not in extracted.call_results[0].prompt
+    assert 'test_case_0' in extracted.call_results[0].prompt
+    assert extracted.call_results[1].prompt == full.call_results[1].prompt
+
+
+################################################################################
+# Estimation                                                                   #
+################################################################################
+def test_estimate_counts_prompt_tokens_without_calling_llm(evaluator_factory,
+                                                           fake_llm):
+    evaluator = evaluator_factory()
+    estimates = evaluator.estimate()
+    assert fake_llm.calls == 0
+    assert [x.file for x in estimates] == list(evaluator._files)
+
+    response = evaluator.run()
+    for estimate, result in zip(estimates, response.call_results):
+        assert estimate.input_count == estimate_tokens(result.prompt,
+                                                       fake_llm.model_name)
+        assert estimate.output_count > 0
+        assert estimate.calls == 1
+
+
+def test_estimate_follows_batching_and_chunking(evaluator_factory,
+                                                large_test_file):
+    def count_calls(estimates):
+        return round(sum(x.calls / x.batch_size for x in estimates))
+
+    assert count_calls(evaluator_factory().estimate()) == 9
+    assert count_calls(
+        evaluator_factory(batch_token_budget=1000).estimate()) < 9
+    chunked = evaluator_factory(chunk_token_budget=500).estimate()
+    assert count_calls(chunked) > 9
+    assert max(x.calls for x in chunked) == count_calls(chunked) - 8
+
+
+def test_estimate_flags_files_exceeding_context_window(evaluator_factory,
+                                                       fake_llm, monkeypatch):
+    monkeypatch.setitem(tokens.CONTEXT_WINDOWS, fake_llm.model_name, 1000)
+    assert all(x.exceeds_context_window
+               for x in evaluator_factory().estimate())
+    monkeypatch.setitem(tokens.CONTEXT_WINDOWS, fake_llm.model_name, 100000)
+    assert not any(x.exceeds_context_window
+                   for x in evaluator_factory().estimate())
+
+
+def test_token_estimate_does_not_download_encodings(monkeypatch, tmp_path):
+    tiktoken = pytest.importorskip("tiktoken")
+    downloads = []
+    monkeypatch.setattr(tiktoken.load, "read_file", downloads.append)
+    monkeypatch.setattr(tiktoken.registry, "ENCODINGS", {})
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    tokens._get_encoding.cache_clear()
+    try:
+        assert estimate_tokens("a" * 40, "gpt-4o") == 10
+    finally:
+        tokens._get_encoding.cache_clear()
+    assert downloads == []
+    assert tiktoken.load.read_file == downloads.append
+
+
+################################################################################
+# Rate limiting                                                                #
+################################################################################
+def test_rate_limited_calls_are_retried_with_backoff(evaluator_factory,
+                                                     fake_llm, fake_clock):
+    fake_llm.rate_limited_calls = [1, 2]
+    limiter = RateLimiter(clock=fake_clock, sleep=fake_clock.sleep,
+                          rng=lambda: 1.)
+    response = evaluator_factory(rate_limiter=limiter).run()
+    # rate limits do not count as failed attempts
+    assert len(response.call_results) == 8
+    assert all(result.success for result in response.call_results)
+    assert fake_clock.sleeps == [1, 2]
+    assert fake_llm.calls == 10
+
+
+def test_invalid_responses_are_retried_immediately(evaluator_factory,
+                                                   fake_llm, fake_clock):
+    fake_llm.invalid_calls = [1]
+    limiter = RateLimiter(clock=fake_clock, sleep=fake_clock.sleep)
+    response = evaluator_factory(rate_limiter=limiter).run()
+    assert len(response.call_results) == 9
+    assert not response.call_results[0].success
+    assert fake_clock.sleeps == []
+    assert fake_llm.calls == 9
+
+
+def test_evaluator_stays_within_requests_per_minute(evaluator_factory,
+                                                    fake_clock):
+    limiter = RateLimiter(requests_per_minute=4, clock=fake_clock,
+                          sleep=fake_clock.sleep)
+    evaluator_factory(rate_limiter=limiter).run()
+    # a burst of 4 requests, then one request every 15 seconds
+    assert sum(fake_clock.sleeps) == pytest.approx(60)
+
+
+################################################################################
+# Prompt reuse                                                                 #
+################################################################################
+def test_file_splits_are_reused_across_runs(evaluator_factory, monkeypatch):
+    evaluator = evaluator_factory()
+    loaded = []
+    load = evaluator._load_test_file_into_splits
+
+    def counting_load(fp, context_policy=None):
+        loaded.append(fp)
+        return load(fp, context_policy)
+    monkeypatch.setattr(evaluator, '_load_test_file_into_splits',
+                        counting_load)
+    evaluator.run()
+    evaluator.run()
+    assert len(loaded) == 8
+
+    changed = evaluator._files[0]
+    with open(changed, 'a') as f:
+        f.write('\n\ndef test_added():\n    pass\n')
+    evaluator.run()
+    assert loaded[8:] == [changed]
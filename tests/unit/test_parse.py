@@ -0,0 +1,93 @@
+import copy
+
+import pytest
+from fixml.modules.code_analyzer.repo import Repository
+from fixml.modules.workflow.parse import ResponseParser
+from fixml.modules.workflow.prompt_format import EvaluationPromptFormat
+from fixml.modules.workflow.runners.evaluator import PerFileTestEvaluator
+
+
+@pytest.fixture()
+def response(test_git_repo_with_tests, loaded_checklist, fake_llm):
+    repo = Repository(test_git_repo_with_tests.workspace)
+    evaluator = PerFileTestEvaluator(fake_llm,
+                                     prompt_format=EvaluationPromptFormat(),
+                                     repository=repo,
+                                     checklist=loaded_checklist)
+    return evaluator.run()
+
+
+def test_parsing_does_not_mutate_response(response):
+    parsed_responses = copy.deepcopy(
+        [x.parsed_response for x in response.call_results])
+    parser = ResponseParser(response)
+    parser.get_completeness_score()
+    parser._parse_items()
+    assert [x.parsed_response for x in response.call_results] == \
+           parsed_responses
+
+
+def test_completeness_score_is_computed(response, loaded_checklist):
+    parser = ResponseParser(response)
+    num_items = len(loaded_checklist.get_all_tests())
+    assert parser.get_completeness_score() == f"0.0/{num_items}"
+    assert parser.get_completeness_score(score_format='number') == 0
+    assert (parser.evaluation_report['n_files_tested'] == 8).all()
+
+
+def test_evaluation_report_is_memoized(response):
+    parser = ResponseParser(response)
+    parser.get_completeness_score()
+    report = parser.evaluation_report
+    parser.as_markdown()
+    assert parser.evaluation_report is report
+
+
+def test_evaluation_report_is_rebuilt_when_response_changes(response):
+    parser = ResponseParser(response)
+    parser.get_completeness_score()
+    report = parser.evaluation_report
+    response.call_results.append(response.call_results[0].model_copy())
+    parser.get_completeness_score()
+    assert parser.evaluation_report is not report
+    assert 9 in parser.evaluation_report['n_files_tested'].values
+
+
+def test_observations_are_prefixed_with_file_names(response):
+    parser = ResponseParser(response)
+    parser.get_completeness_score()
+    observations = parser.evaluation_report['Observations'][0]
+    assert '(test_module_0.py) Looks fine.' in observations
+
+
+def test_function_names_are_resolved_with_function_index(response):
+    result = response.call_results[0]
+    result.parsed_response['results'][0]['Functions'] = [
+        'test_case_0', 'test_case_0()', 'missing']
+    parser = ResponseParser(response)
+    item = parser._parse_items()[0]
+    assert item['File Path'].endswith('test_module_0.py')
+    assert item['lineno'] == [1, 1, 0]
+    assert item['Unresolved Functions'] == ['missing']
+    assert len(item['Referenced Functions']) == 3
+
+
+def test_evaluation_report_is_rebuilt_when_call_results_are_replaced(response):
+    parser = ResponseParser(response)
+    parser.get_completeness_score()
+    report = parser.evaluation_report
+    response.call_results = response.call_results[:3]
+    parser.get_completeness_score()
+    assert parser.evaluation_report is not report
+    assert (parser.evaluation_report['n_files_tested'] == 3).all()
+
+
+def test_reset_rebuilds_evaluation_report_after_in_place_changes(response):
+    parser = ResponseParser(response)
+    parser.get_completeness_score()
+    response.call_results[0] = response.call_results[1].model_copy()
+    parser.reset()
+    assert parser.evaluation_report is None
+    parser.get_completeness_score()
+    observations = parser.evaluation_report['Observations'][0]
+    assert '(test_module_0.py) Looks fine.' not in observations
@@ -0,0 +1,94 @@
+import pytest
+from fixml.modules.workflow.rate_limit import RateLimiter, is_rate_limit_error
+
+
+class TooManyRequestsError(Exception):
+    status_code = 429
+
+
+def failing(errors, result="done"):
+    """Return a function raising the given errors one per call, then
+    returning a result."""
+    errors = list(errors)
+
+    def func():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return func
+
+
+def test_rate_limiter_rejects_non_positive_budgets():
+    with pytest.raises(ValueError):
+        RateLimiter(requests_per_minute=0)
+    with pytest.raises(ValueError):
+        RateLimiter(tokens_per_minute=-1)
+
+
+def test_unlimited_rate_limiter_never_waits(fake_clock):
+    limiter = RateLimiter(clock=fake_clock, sleep=fake_clock.sleep)
+    for _ in range(100):
+        limiter.acquire(10000)
+    assert fake_clock.sleeps == []
+
+
+def test_requests_per_minute_are_enforced(fake_clock):
+    limiter = RateLimiter(requests_per_minute=2, clock=fake_clock,
+                          sleep=fake_clock.sleep)
+    for _ in range(4):
+        limiter.acquire()
+    # a burst of 2 requests, then one request every 30 seconds
+    assert sum(fake_clock.sleeps) == pytest.approx(60)
+
+
+def test_tokens_per_minute_are_enforced(fake_clock):
+    limiter = RateLimiter(tokens_per_minute=1000, clock=fake_clock,
+                          sleep=fake_clock.sleep)
+    limiter.acquire(600)
+    assert fake_clock.sleeps == []
+    limiter.acquire(600)
+    assert sum(fake_clock.sleeps) == pytest.approx(12)
+    # requests larger than the budget wait for a full bucket
+    limiter.acquire(5000)
+    assert sum(fake_clock.sleeps) == pytest.approx(12 + 60)
+
+
+def test_recorded_usage_corrects_token_budget(fake_clock):
+    limiter = RateLimiter(tokens_per_minute=1000, clock=fake_clock,
+                          sleep=fake_clock.sleep)
+    limiter.acquire(100)
+    limiter.record(estimated_tokens=100, actual_tokens=1000)
+    limiter.acquire(500)
+    assert sum(fake_clock.sleeps) == pytest.approx(30)
+
+
+def test_rate_limit_errors_are_retried_with_exponential_backoff(fake_clock):
+    limiter = RateLimiter(base_delay=1, max_delay=5, clock=fake_clock,
+                          sleep=fake_clock.sleep, rng=lambda: 1.)
+    func = failing([TooManyRequestsError()] * 4)
+    assert limiter.call(func) == "done"
+    assert fake_clock.sleeps == [1, 2, 4, 5]
+
+
+def test_backoff_delays_are_jittered(fake_clock):
+    limiter = RateLimiter(base_delay=2, clock=fake_clock,
+                          sleep=fake_clock.sleep, rng=lambda: .25)
+    limiter.call(failing([TooManyRequestsError()] * 2))
+    assert fake_clock.sleeps == [.5, 1]
+
+
+def test_rate_limit_errors_are_raised_after_max_retries(fake_clock):
+    limiter = RateLimiter(max_retries=2, clock=fake_clock,
+                          sleep=fake_clock.sleep)
+    with pytest.raises(TooManyRequestsError):
+        limiter.call(failing([TooManyRequestsError()] * 3))
+    assert len(fake_clock.sleeps) == 2
+
+
+def test_other_errors_are_raised_without_waiting(fake_clock):
+    limiter = RateLimiter(clock=fake_clock, sleep=fake_clock.sleep)
+    with pytest.raises(ValueError):
+        limiter.call(failing([ValueError("invalid response")]))
+    assert fake_clock.sleeps == []
+    assert not is_rate_limit_error(ValueError())
+    assert is_rate_limit_error(TooManyRequestsError())
@@ -1,8 +1,21 @@
+import ast
+import shutil
 from contextlib import nullcontext as does_not_raise
 
 import pytest
 from fixml.modules.code_analyzer import repo as r
+from fixml.modules.code_analyzer import index
 from fixml.modules.code_analyzer.git import GitContext
+from fixml.modules.code_analyzer import encoding
+from fixml.modules.code_analyzer.encoding import decode_source
+from fixml.modules.code_analyzer.walk import walk_files, filter_ignored, \
+    IgnoreRules
+from fixml.modules.code_analyzer import scan
+from fixml.modules.code_analyzer.analyzers.python import PythonASTCodeAnalyzer
+from fixml.modules.code_analyzer.functions import FunctionIndex
+from fixml.modules.code_analyzer.context import ContextPolicy, \
+    extract_test_context
+from fixml.modules.code_analyzer.scan import FunctionInfo
 
 
 ################################################################################
@@ -83,3 +96,653 @@ def test_git_context_gives_out_local_link_when_no_remote(test_git_repo):
     context = GitContext(test_git_repo.workspace)
     link = context.construct_remote_link_to_file("src/python/main.py")
     assert link == f"file://{test_git_repo.workspace}/src/python/main.py"
+
+
+def test_git_context_lists_changed_files(test_git_repo):
+    path = test_git_repo.workspace
+    context = GitContext(path)
+    commit = context.head_commit_hash
+    (path / 'src/python/main.py').write_text('print("changed")')
+    test_git_repo.run('git add .')
+    test_git_repo.api.index.commit("Change main")
+    (path / 'hello.txt').write_text('hello again!')
+    (path / 'new.txt').write_text('new file')
+    assert GitContext(path).list_changed_files(commit) == \
+           {'src/python/main.py', 'hello.txt', 'new.txt'}
+
+
+def test_git_context_lists_changed_files_with_non_ascii_names(test_git_repo):
+    path = test_git_repo.workspace
+    (path / 'tests').mkdir()
+    (path / 'tests/test_é.py').write_text('def test_é():\n    pass\n')
+    test_git_repo.run('git add .')
+    test_git_repo.api.index.commit("Add a test")
+    commit = GitContext(path).head_commit_hash
+    (path / 'tests/test_é.py').write_text('def test_é():\n    assert 1\n')
+    (path / 'tests/test_ü.py').write_text('')
+    assert GitContext(path).list_changed_files(commit) == \
+           {'tests/test_é.py', 'tests/test_ü.py'}
+
+
+def test_git_context_rejects_unknown_commit(test_git_repo):
+    with pytest.raises(ValueError):
+        GitContext(test_git_repo.workspace).list_changed_files('0' * 40)
+
+
+def test_git_context_lists_files_from_index(test_git_repo):
+    path = test_git_repo.workspace
+    (path / '.gitignore').write_text('*.log\n')
+    (path / 'new.py').write_text('')
+    (path / 'debug.log').write_text('')
+    (path / 'hello.txt').unlink()
+    context = GitContext(path)
+    assert sorted(context.list_files()) == \
+           ['.gitignore', 'new.py', 'src/python/main.py']
+    assert context.list_files(include_untracked=False) == \
+           ['src/python/main.py']
+
+
+################################################################################
+# Repository scan                                                              #
+################################################################################
+def test_repository_lists_test_files(test_git_repo_with_tests):
+    repo = r.Repository(test_git_repo_with_tests.workspace)
+    test_files = repo.list_test_files()["Python"]
+    assert len(test_files) == 8
+    assert not any(['src/python/main.py' in file for file in test_files])
+
+
+def test_repository_lists_packages(test_git_repo):
+    path = test_git_repo.workspace
+    (path / 'src/python/utils.py').write_text('import os.path\nimport numpy as np\n')
+    repo = r.Repository(path)
+    assert sorted(repo.list_packages()) == ['numpy', 'os']
+
+
+def test_repository_does_not_list_relative_imports(test_git_repo):
+    path = test_git_repo.workspace
+    (path / 'src/python/utils.py').write_text(
+        'from .foo import x\nfrom . import bar\nfrom ..baz import y\n'
+        'from numpy import array\n')
+    repo = r.Repository(path)
+    assert sorted(repo.list_packages()) == ['numpy']
+
+
+def test_repository_reads_each_file_once(test_git_repo_with_tests,
+                                         monkeypatch):
+    read_files = []
+    original_read = scan._read_file
+
+    def read_file(file_path):
+        read_files.append(file_path)
+        return original_read(file_path)
+
+    monkeypatch.setattr(scan, "_read_file", read_file)
+    (test_git_repo_with_tests.workspace / 'legacy.py').write_text('print "x"\n')
+    repo = r.Repository(test_git_repo_with_tests.workspace)
+    repo.list_test_files()
+    repo.list_packages()
+    assert sorted(read_files) == sorted(repo.lf_map["Python"])
+
+
+def test_repository_maps_function_linenos(test_git_repo_with_tests):
+    repo = r.Repository(test_git_repo_with_tests.workspace)
+    file = [x for x in repo.lf_map["Python"] if x.endswith('test_module_3.py')][0]
+    assert repo.ffl_map["Python"][file]["test_case_3"] == 1
+    assert repo.ffl_map["Python"][file]["non_existent"] == 0
+
+
+def test_parallel_scan_is_identical_to_serial_scan(test_git_repo_with_tests):
+    path = test_git_repo_with_tests.workspace
+    (path / 'src/python/utils.py').write_text('import numpy as np\n')
+    (path / 'src/python/legacy.py').write_text('print "python 2"\n')
+    (path / 'tests/test_broken.py').write_text('def test_(:\n')
+
+    serial = r.Repository(path)
+    parallel = r.Repository(path, workers=3)
+    assert list(parallel.file_records) == list(serial.file_records)
+    assert parallel.file_records == serial.file_records
+    assert parallel.ffl_map == serial.ffl_map
+    assert parallel.list_test_files() == serial.list_test_files()
+    assert sorted(parallel.list_packages()) == sorted(serial.list_packages())
+
+
+def test_parallel_scan_updates_scan_index(test_git_repo_with_tests,
+                                          monkeypatch):
+    path = test_git_repo_with_tests.workspace
+    parallel = r.Repository(path, use_scan_index=True, workers=2)
+
+    def scan(file_path):
+        raise AssertionError(f"{file_path} should not be scanned again")
+    monkeypatch.setattr(r, "scan_python_file", scan)
+    assert r.Repository(path, use_scan_index=True).file_records == \
+           parallel.file_records
+
+
+################################################################################
+# Scan index                                                                   #
+################################################################################
+@pytest.fixture()
+def count_scans(monkeypatch):
+    scanned = []
+    original_scan = r.scan_python_file
+
+    def scan(file_path):
+        scanned.append(file_path)
+        return original_scan(file_path)
+
+    monkeypatch.setattr(r, "scan_python_file", scan)
+    return scanned
+
+
+def test_scan_index_reuses_records_of_unchanged_files(test_git_repo_with_tests,
+                                                      count_scans):
+    path = test_git_repo_with_tests.workspace
+    first = r.Repository(path, use_scan_index=True)
+    assert len(count_scans) == 9
+    count_scans.clear()
+
+    second = r.Repository(path, use_scan_index=True)
+    assert count_scans == []
+    assert second.file_records == first.file_records
+    assert second.list_test_files() == first.list_test_files()
+
+
+def test_scan_index_rescans_changed_files(test_git_repo_with_tests,
+                                          count_scans):
+    path = test_git_repo_with_tests.workspace
+    r.Repository(path, use_scan_index=True)
+    count_scans.clear()
+
+    changed = path / 'src/python/main.py'
+    changed.write_text('def test_new():\n    assert True\n')
+    repo = r.Repository(path, use_scan_index=True)
+    assert count_scans == [str(changed)]
+    assert str(changed) in repo.list_test_files()["Python"]
+
+
+def test_scan_index_is_invalidated_when_analyzer_changes(
+        test_git_repo_with_tests, count_scans, monkeypatch):
+    path = test_git_repo_with_tests.workspace
+    r.Repository(path, use_scan_index=True)
+    count_scans.clear()
+
+    monkeypatch.setattr(index, "ANALYZER_VERSION", "changed")
+    r.Repository(path, use_scan_index=True)
+    assert len(count_scans) == 9
+
+
+def test_scan_index_detects_changes_made_during_scan(test_git_repo_with_tests,
+                                                     monkeypatch):
+    path = test_git_repo_with_tests.workspace
+    changed = path / 'src/python/main.py'
+    original_scan = r.scan_python_file
+
+    def scan_and_change(file_path):
+        record = original_scan(file_path)
+        if file_path == str(changed):
+            changed.write_text('def test_new():\n    assert True\n')
+        return record
+
+    def hash_file(file_path):
+        raise AssertionError("scanned files should not be read again")
+
+    monkeypatch.setattr(r, "scan_python_file", scan_and_change)
+    monkeypatch.setattr(index, "hash_file", hash_file)
+    r.Repository(path, use_scan_index=True)
+    monkeypatch.undo()
+
+    repo = r.Repository(path, use_scan_index=True)
+    assert repo.file_records[str(changed)].contains_test
+
+
+
+################################################################################
+# File walk                                                                    #
+################################################################################
+@pytest.fixture()
+def walk_tree(tmp_path):
+    files = [
+        '.github/workflows/test.py', '.git/hooks/hook.py',
+        'node_modules/pkg/index.js', '.venv/lib/site.py', 'build/lib/x.py',
+        'src/main.py', 'src/main.pyc', 'src/data/big.csv', 'src/keep.log',
+        'src/other.log', 'docs/data/notes.py', 'tests/test_a.py',
+        'tests/snapshots/snap.py', 'tests/local/scratch.py',
+        'tests/build/test_builder.py',
+    ]
+    for file in files:
+        (tmp_path / file).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / file).write_text('')
+    (tmp_path / '.gitignore').write_text(
+        '# comment\n*.pyc\n*.log\n!keep.log\n/src/data/\n')
+    (tmp_path / 'tests/.gitignore').write_text('snapshots/\n')
+    (tmp_path / '.fixmlignore').write_text('tests/local\n')
+    return tmp_path
+
+
+def _relative(paths, root):
+    return sorted(str(path)[len(str(root)) + 1:] for path in paths)
+
+
+def test_walk_prunes_excluded_and_ignored_paths(walk_tree):
+    assert _relative(walk_files(walk_tree), walk_tree) == [
+        '.fixmlignore', '.github/workflows/test.py', '.gitignore',
+        'docs/data/notes.py', 'src/keep.log', 'src/main.py',
+        'tests/.gitignore', 'tests/build/test_builder.py', 'tests/test_a.py',
+    ]
+
+
+def test_parallel_walk_yields_same_files(walk_tree):
+    assert sorted(walk_files(walk_tree, workers=4)) == \
+           sorted(walk_files(walk_tree))
+
+
+@pytest.mark.parametrize("pattern, path, is_dir, expected", [
+    ("*.py", "a/b/c.py", False, True),
+    ("/c.py", "a/c.py", False, False),
+    ("a/*.py", "a/c.py", False, True),
+    ("a/*.py", "a/b/c.py", False, False),
+    ("a/**/c.py", "a/b/d/c.py", False, True),
+    ("**/b", "a/b", True, True),
+    ("a/**", "a/b/c", False, True),
+    ("b/", "a/b", False, False),
+    ("test_[!a].py", "test_b.py", False, True),
+    ("test_[!a].py", "test_a.py", False, False),
+])
+def test_ignore_rules_follow_gitignore_semantics(pattern, path, is_dir,
+                                                 expected):
+    rules = IgnoreRules().extend('', [pattern])
+    assert rules.match(path, is_dir) == expected
+
+
+def test_repository_walk_includes_github_dir(walk_tree):
+    shutil.rmtree(walk_tree / '.git')
+    repo = r.Repository(walk_tree)
+    assert _relative(repo.lf_map["Python"], walk_tree) == [
+        '.github/workflows/test.py', 'docs/data/notes.py', 'src/main.py',
+        'tests/build/test_builder.py', 'tests/test_a.py',
+    ]
+
+
+def test_filter_ignored_applies_walk_rules(walk_tree):
+    listed = _relative(walk_files(walk_tree, excluded_dirs=[]), walk_tree)
+    unfiltered = _relative(walk_files(walk_tree, ignore_files=[],
+                                      excluded_dirs=[]), walk_tree)
+    assert listed != unfiltered
+    assert _relative(filter_ignored(walk_tree, unfiltered,
+                                    excluded_dirs=[]), walk_tree) == listed
+    assert _relative(filter_ignored(walk_tree, unfiltered), walk_tree) == \
+           _relative(walk_files(walk_tree), walk_tree)
+
+
+################################################################################
+# File listing                                                                 #
+################################################################################
+def test_repository_lists_files_from_git_by_default(test_git_repo_with_tests):
+    path = test_git_repo_with_tests.workspace
+    (path / 'dist').mkdir()
+    (path / 'dist/test_artifact.py').write_text('def test_x():\n    pass\n')
+    (path / '.gitignore').write_text('dist/\n')
+
+    repo = r.Repository(path)
+    assert repo.file_listing == "git"
+    walked = r.Repository(path, file_listing="walk")
+    assert repo.lf_map == walked.lf_map
+    assert not any('dist' in file for file in repo.lf_map["Python"])
+
+
+def test_git_listing_keeps_tracked_files_in_excluded_dirs(test_git_repo):
+    path = test_git_repo.workspace
+    for file in ['build/tool.py', 'tests/build/test_builder.py',
+                 'lib/node_modules/vendored.py']:
+        (path / file).parent.mkdir(parents=True, exist_ok=True)
+        (path / file).write_text('')
+    test_git_repo.run('git add -f .')
+    test_git_repo.api.index.commit("Add files in excluded directories")
+
+    listed = r.Repository(path, include_untracked=False).lf_map["Python"]
+    assert str(path / 'build/tool.py') in listed
+    assert str(path / 'tests/build/test_builder.py') in listed
+    assert str(path / 'lib/node_modules/vendored.py') in listed
+    walked = r.Repository(path, file_listing="walk").lf_map["Python"]
+    assert str(path / 'build/tool.py') not in walked
+    assert str(path / 'tests/build/test_builder.py') in walked
+
+
+def test_repository_excludes_untracked_files_on_request(test_git_repo):
+    path = test_git_repo.workspace
+    (path / 'untracked.py').write_text('')
+    assert str(path / 'untracked.py') in r.Repository(path).lf_map["Python"]
+    assert r.Repository(path, include_untracked=False).lf_map["Python"] == \
+           [str(path / 'src/python/main.py')]
+
+
+def test_repository_walks_non_git_directories(walk_tree):
+    shutil.rmtree(walk_tree / '.git')
+    assert r.Repository(walk_tree).file_listing == "walk"
+    with pytest.raises(ValueError):
+        r.Repository(walk_tree, file_listing="git")
+
+
+################################################################################
+# Encoding                                                                     #
+################################################################################
+@pytest.mark.parametrize("data, expected", [
+    ('def test_é():\n    pass\n'.encode('utf-8'), 'def test_é():\n    pass\n'),
+    (b'\xef\xbb\xbfimport os\r\n', 'import os\n'),
+    ('# -*- coding: latin-1 -*-\nname = "é"\n'.encode('latin-1'),
+     '# -*- coding: latin-1 -*-\nname = "é"\n'),
+    ('x = "é"\n'.encode('utf-16'), 'x = "é"\n'),
+    ('s = "Привет, мир! Это тест."\n'.encode('cp1251') * 20,
+     's = "Привет, мир! Это тест."\n' * 20),
+])
+def test_source_is_decoded_with_the_right_encoding(data, expected):
+    assert decode_source(data) == expected
+
+
+def test_encoding_detection_only_reads_a_sample(monkeypatch):
+    sizes = []
+    original_detect = encoding.detect
+
+    def detect(data):
+        sizes.append(len(data))
+        return original_detect(data)
+
+    monkeypatch.setattr(encoding, "detect", detect)
+    data = 'x = "Привет, мир!"\n'.encode('cp1251') * 100000
+    decode_source(data)
+    assert sizes == [encoding.DETECTION_SAMPLE_SIZE]
+
+
+def test_encoding_beyond_the_sample_is_detected_from_the_whole_content():
+    data = b'x = 1\n' * 20000 + '# café\n'.encode('cp1252')
+    assert len(data) > encoding.DETECTION_SAMPLE_SIZE
+    assert decode_source(data).endswith('# café\n')
+
+
+def test_undetectable_content_falls_back_to_latin1(monkeypatch):
+    monkeypatch.setattr(encoding, "detect", lambda data: {'encoding': None})
+    assert decode_source(b'# \x81\xe9\n') == '# \x81é\n'
+
+
+def test_non_utf8_file_is_scanned(tmp_path):
+    path = tmp_path / 'test_legacy.py'
+    path.write_bytes('import pytest\n\ndef test_café():\n    assert "é"\n'
+                     .encode('latin-1'))
+    record = scan.scan_python_file(path)
+    assert record.parser == "ast"
+    assert record.contains_test
+    assert record.functions == {'test_café': 3}
+
+
+################################################################################
+# Python analyzer                                                              #
+################################################################################
+ANALYZED_SOURCE = """\
+import os.path
+from collections import abc
+
+
+def helper():
+    assert True
+
+
+class TestModel:
+    def setup_method(self):
+        pass
+
+    def test_fit(self):
+        def check():
+            pass
+        assert check() is None
+
+
+async def test_async():
+    pass
+"""
+
+
+@pytest.fixture()
+def analyzer():
+    analyzer = PythonASTCodeAnalyzer()
+    analyzer.load(ANALYZED_SOURCE)
+    return analyzer
+
+
+def test_analyzer_collects_facts_in_one_traversal(analyzer, monkeypatch):
+    def walk(node):
+        raise AssertionError("the tree should only be visited once")
+    monkeypatch.setattr(ast, "walk", walk)
+
+    assert analyzer.list_imported_packages() == {'os.path', 'collections'}
+    assert analyzer._get_function_lineno_map() == {
+        'helper': 5, 'setup_method': 10, 'test_fit': 13, 'check': 14
+    }
+    assert analyzer.contains_test()
+    assert analyzer.facts.test_functions == ['TestModel.test_fit',
+                                             'test_async']
+    assert analyzer.facts is analyzer.facts
+
+
+DUPLICATED_SOURCE = """\
+def digest():
+    pass
+
+
+class HMAC:
+    def digest(self):
+        def set_trace():
+            pass
+
+
+def set_trace():
+    if True:
+        def digest():
+            pass
+
+
+def digest():
+    pass
+
+
+async def set_trace():
+    pass
+"""
+
+
+def test_duplicate_functions_are_mapped_in_breadth_first_order():
+    analyzer = PythonASTCodeAnalyzer()
+    analyzer.load(DUPLICATED_SOURCE)
+    # the last definition found by `ast.walk` wins, async ones excluded
+    expected = {}
+    for node in ast.walk(ast.parse(DUPLICATED_SOURCE)):
+        if isinstance(node, ast.FunctionDef):
+            expected[node.name] = node.lineno
+    assert analyzer._get_function_lineno_map() == expected == {
+        'digest': 13, 'set_trace': 7
+    }
+
+
+def test_analyzer_requires_assertion_in_test_function():
+    analyzer = PythonASTCodeAnalyzer()
+    analyzer.load("def helper():\n    assert True\n\n"
+                  "async def test_x():\n    pass\n")
+    assert not analyzer.contains_test()
+    analyzer.load("async def test_x():\n    assert True\n")
+    assert analyzer.contains_test()
+
+
+################################################################################
+# Function index                                                               #
+################################################################################
+INDEXED_SOURCE = """\
+import pytest
+
+
+def check(x):
+    return x
+
+
+class TestModel:
+    @pytest.mark.slow
+    def test_fit(self):
+        assert check(1)
+
+
+class TestOtherModel:
+    def test_fit(self):
+        assert check(2)
+
+
+async def test_fit():
+    def check():
+        pass
+    assert True
+"""
+
+
+@pytest.fixture()
+def function_index():
+    analyzer = PythonASTCodeAnalyzer()
+    analyzer.load(INDEXED_SOURCE)
+    return FunctionIndex(FunctionInfo(**x) for x in analyzer.facts.definitions)
+
+
+def test_function_index_keeps_methods_with_the_same_name(function_index):
+    assert len(function_index) == 5
+    method = function_index.get('TestModel.test_fit')
+    assert (method.lineno, method.end_lineno) == (10, 11)
+    assert method.class_name == 'TestModel'
+    assert method.decorators == ['pytest.mark.slow']
+    assert function_index.get('TestOtherModel.test_fit').lineno == 15
+    assert function_index.get('test_fit').is_async
+
+
+def test_function_index_ranks_functions_by_bare_name(function_index):
+    assert [x.qualname for x in function_index.find('test_fit')] == \
+           ['test_fit', 'TestModel.test_fit', 'TestOtherModel.test_fit']
+    assert [x.qualname for x in function_index.find('check')] == \
+           ['check', 'test_fit.check']
+    assert function_index.find('missing') == []
+
+
+def test_function_index_finds_function_at_line(function_index):
+    assert function_index.at_line(11).qualname == 'TestModel.test_fit'
+    assert function_index.at_line(21).qualname == 'test_fit.check'
+    assert function_index.at_line(22).qualname == 'test_fit'
+    assert function_index.at_line(7) is None
+    assert function_index.at_line(23) is None
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("test_fit", "test_fit"),
+    ("TestOtherModel.test_fit", "TestOtherModel.test_fit"),
+    ("TestOtherModel.test_fit()", "TestOtherModel.test_fit"),
+    ("tests/test_model.py::TestModel::test_fit", "TestModel.test_fit"),
+    ("test_fit.check", "test_fit.check"),
+    ("TestMissing.test_fit", None),
+    ("missing", None),
+])
+def test_function_index_resolves_names_from_llm(function_index, name,
+                                                expected):
+    func = function_index.resolve(name)
+    assert (func.qualname if func else None) == expected
+
+
+def test_repository_provides_function_index(test_git_repo_with_tests):
+    repo = r.Repository(test_git_repo_with_tests.workspace)
+    file = repo.list_test_files()["Python"][3]
+    assert 'test_case_3' in repo.get_function_index(file)
+    assert len(repo.get_function_index('missing.py')) == 0
+
+
+################################################################################
+# Context extraction                                                           #
+################################################################################
+CONTEXT_SOURCE = """\
+\"\"\"Tests of the model.\"\"\"
+import pytest
+from model import Model
+
+EXPECTED = [%s]
+UNUSED = 1
+
+
+def make_model(n):
+    \"\"\"Build a model.\"\"\"
+    return Model(n)  # helper
+
+
+def unused_helper():
+    pass
+
+
+@pytest.fixture
+def model():
+    return make_model(3)
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    yield
+
+
+class TestModel:
+    def test_predict(self, model):
+        # compare with the expected values
+        assert model.predict() == EXPECTED
+
+
+if __name__ == "__main__":
+    pytest.main()
+""" % ", ".join(str(i) for i in range(100))
+
+
+def test_context_keeps_tests_and_their_dependencies():
+    assert extract_test_context(CONTEXT_SOURCE) == """\
+import pytest
+from model import Model
+
+EXPECTED = ...
+
+def make_model(n):
+    ...
+    return Model(n)  # helper
+
+@pytest.fixture
+def model():
+    return make_model(3)
+
+@pytest.fixture(autouse=True)
+def seed():
+    yield
+
+class TestModel:
+    def test_predict(self, model):
+        # compare with the expected values
+        assert model.predict() == EXPECTED
+"""
+
+
+def test_context_policy_can_keep_only_tests():
+    policy = ContextPolicy(include_helpers=False, strip_docstrings=False,
+                           max_literal_length=None)
+    extracted = extract_test_context(CONTEXT_SOURCE, policy)
+    assert 'def make_model' not in extracted
+    assert 'def seed' in extracted
+    assert 'class TestModel' in extracted
+
+
+def test_context_policy_can_keep_literals_and_docstrings():
+    policy = ContextPolicy(strip_docstrings=False, max_literal_length=None)
+    extracted = extract_test_context(CONTEXT_SOURCE, policy)
+    assert '\"\"\"Build a model.\"\"\"' in extracted
+    assert 'EXPECTED = [0, 1' in extracted
+
+
+@pytest.mark.parametrize("content", [
+    "def helper():\n    pass\n",
+    "print 'python 2'\n",
+])
+def test_context_of_files_without_tests_is_unchanged(content):
+    assert extract_test_context(content) == content
@@ -0,0 +1,295 @@
+import json
+
+import pytest
+from fixml.modules.code_analyzer.repo import Repository
+from fixml.modules.workflow.prompt_format import EvaluationPromptFormat
+from fixml.modules.workflow.response import EvaluationResponse, \
+    JsonlResponseWriter
+from fixml.modules.workflow.runners.evaluator import PerFileTestEvaluator
+
+
+@pytest.fixture()
+def evaluator(test_git_repo_with_tests, loaded_checklist, fake_llm):
+    repo = Repository(test_git_repo_with_tests.workspace)
+    return PerFileTestEvaluator(fake_llm,
+                                prompt_format=EvaluationPromptFormat(),
+                                repository=repo, checklist=loaded_checklist)
+
+
+@pytest.fixture()
+def response(evaluator):
+    return evaluator.run()
+
+
+@pytest.mark.parametrize("filename", ["response.json", "response.jsonl"])
+def test_response_can_be_written_and_read_back(response, tmp_path, filename):
+    path = tmp_path / filename
+    response.to_json(path)
+    loaded = EvaluationResponse.from_json(
+        path, repository=response.repository.object,
+        checklist=response.checklist.object)
+    assert loaded.model_dump(mode='json') == response.model_dump(mode='json')
+
+
+def test_jsonl_response_has_header_and_one_line_per_result(response, tmp_path):
+    path = tmp_path / "response.jsonl"
+    response.to_json(path)
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1 + len(response.call_results)
+    assert "call_results" not in json.loads(lines[0])
+    assert json.loads(lines[0])["repository"]["git_commit"] == \
+           response.repository.git_commit
+
+
+def test_jsonl_reader_skips_truncated_last_line(response, tmp_path):
+    path = tmp_path / "response.jsonl"
+    response.to_json(path)
+    content = path.read_text()
+    path.write_text(content[:-100])
+    results = list(EvaluationResponse.iter_jsonl_call_results(path))
+    assert len(results) == len(response.call_results) - 1
+
+
+def test_evaluator_streams_results_to_writer(evaluator, tmp_path):
+    path = tmp_path / "response.jsonl"
+    with JsonlResponseWriter(path) as writer:
+        response = evaluator.run(writer=writer)
+    streamed = list(EvaluationResponse.iter_jsonl_call_results(path))
+    assert sorted(x.files_evaluated[0] for x in streamed) == \
+           sorted(x.files_evaluated[0] for x in response.call_results)
+
+
+def test_streamed_results_are_kept_slim_in_memory(compact_evaluator,
+                                                   tmp_path):
+    path = tmp_path / "response.jsonl"
+    with JsonlResponseWriter(path) as writer:
+        response = compact_evaluator.run(writer=writer)
+    assert all(x.context is None and x.prompt is None
+               for x in response.call_results)
+    assert not response.codebases
+    loaded = EvaluationResponse.from_json(
+        path, repository=response.repository.object,
+        checklist=response.checklist.object)
+    assert len(loaded.codebases) == 8
+    assert loaded.get_prompt(loaded.call_results[0])
+
+
+@pytest.mark.parametrize("filename", ["response.json", "response.jsonl"])
+def test_slim_response_is_read_without_contexts(compact_evaluator, tmp_path,
+                                                filename):
+    response = compact_evaluator.run()
+    path = tmp_path / filename
+    response.to_json(path)
+    loaded = EvaluationResponse.from_json(
+        path, repository=response.repository.object,
+        checklist=response.checklist.object, slim=True)
+    assert not loaded.codebases
+    assert [x.parsed_response for x in loaded.call_results] == \
+           [x.parsed_response for x in response.call_results]
+
+
+def test_jsonl_writer_will_not_overwrite_by_default(tmp_path):
+    path = tmp_path / "response.jsonl"
+    path.touch()
+    with pytest.raises(FileExistsError):
+        JsonlResponseWriter(path)
+
+
+def test_jsonl_writer_appends_after_removing_truncated_line(evaluator,
+                                                           tmp_path):
+    path = tmp_path / "response.jsonl"
+    response = evaluator.run()
+    response.call_results = response.call_results[:3]
+    response.to_json(path)
+    with open(path, "a") as f:
+        f.write('{"start_time": "2024-')
+
+    resumed = EvaluationResponse.from_json(
+        path, repository=response.repository.object,
+        checklist=response.checklist.object)
+    with JsonlResponseWriter(path, append=True) as writer:
+        evaluator.run(resume=resumed, writer=writer)
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1 + 8
+    results = list(EvaluationResponse.iter_jsonl_call_results(path))
+    assert len({x.files_evaluated[0] for x in results}) == 8
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_resume_in_place_with_other_compact_setting_rewrites_file(
+        evaluator, tmp_path, compact):
+    path = tmp_path / "response.jsonl"
+    evaluator.compact = compact
+    partial = evaluator.run()
+    partial.call_results = partial.call_results[:3]
+    partial.to_json(path)
+
+    evaluator.compact = not compact
+    resumed = EvaluationResponse.from_json(
+        path, repository=partial.repository.object,
+        checklist=partial.checklist.object)
+    with JsonlResponseWriter(path, append=True) as writer:
+        response = evaluator.run(resume=resumed, writer=writer)
+
+    header = EvaluationResponse.read_jsonl_header(path)
+    assert (header.get("prompt_template") is not None) == (not compact)
+    loaded = EvaluationResponse.from_json(
+        path, repository=response.repository.object,
+        checklist=response.checklist.object)
+    assert len(loaded.call_results) == 8
+    assert all(loaded.get_prompt(x) for x in loaded.call_results)
+
+
+def test_resume_in_place_with_same_compact_setting_appends(evaluator,
+                                                          tmp_path):
+    path = tmp_path / "response.jsonl"
+    evaluator.compact = True
+    partial = evaluator.run()
+    partial.call_results = partial.call_results[:3]
+    partial.to_json(path)
+    written = path.read_text()
+
+    resumed = EvaluationResponse.from_json(
+        path, repository=partial.repository.object,
+        checklist=partial.checklist.object)
+    with JsonlResponseWriter(path, append=True) as writer:
+        evaluator.run(resume=resumed, writer=writer)
+
+    assert path.read_text().startswith(written)
+
+
+def test_resume_in_place_from_other_commit_rewrites_file(
+        evaluator, test_git_repo_with_tests, loaded_checklist, fake_llm,
+        tmp_path):
+    path = tmp_path / "response.jsonl"
+    partial = evaluator.run()
+    partial.call_results = partial.call_results[:3]
+    partial.to_json(path)
+    test_git_repo_with_tests.api.index.commit("Empty commit")
+
+    repo = Repository(test_git_repo_with_tests.workspace)
+    evaluator = PerFileTestEvaluator(fake_llm,
+                                     prompt_format=EvaluationPromptFormat(),
+                                     repository=repo,
+                                     checklist=loaded_checklist)
+    resumed = EvaluationResponse.from_json(path, repository=repo,
+                                           checklist=loaded_checklist)
+    with JsonlResponseWriter(path, append=True) as writer:
+        response = evaluator.run(resume=resumed, writer=writer)
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1 + 8
+    header = EvaluationResponse.read_jsonl_header(path)
+    assert header["repository"]["git_commit"] == \
+           response.repository.git_commit != partial.repository.git_commit
+
+
+################################################################################
+# Compact responses                                                            #
+################################################################################
+@pytest.fixture()
+def compact_evaluator(evaluator):
+    evaluator.compact = True
+    return evaluator
+
+
+def test_compact_response_reconstructs_context_and_prompt(evaluator):
+    full = evaluator.run()
+    evaluator.compact = True
+    compact = evaluator.run()
+    for full_result, compact_result in zip(full.call_results,
+                                           compact.call_results):
+        assert compact_result.prompt is None
+        assert compact_result.context is None
+        assert compact.get_context(compact_result) == full_result.context
+        assert compact.get_prompt(compact_result) == full_result.prompt
+
+
+@pytest.mark.parametrize("filename", ["response.json", "response.jsonl"])
+def test_compact_response_can_be_written_and_read_back(compact_evaluator,
+                                                       tmp_path, filename):
+    response = compact_evaluator.run()
+    path = tmp_path / filename
+    response.to_json(path)
+    loaded = EvaluationResponse.from_json(
+        path, repository=response.repository.object,
+        checklist=response.checklist.object)
+    assert loaded.model_dump(mode='json') == response.model_dump(mode='json')
+    assert loaded.get_prompt(loaded.call_results[0]) == \
+           response.get_prompt(response.call_results[0])
+
+
+def test_compact_response_is_smaller(evaluator, tmp_path):
+    evaluator.run().to_json(tmp_path / "full.json")
+    evaluator.compact = True
+    evaluator.run().to_json(tmp_path / "compact.json")
+    assert (tmp_path / "compact.json").stat().st_size * 2 < \
+           (tmp_path / "full.json").stat().st_size
+
+
+def test_compact_response_stores_codebase_once_per_content(compact_evaluator):
+    response = compact_evaluator.run()
+    first = response.call_results[0]
+    response.call_results.append(response.compact(
+        first.model_copy(update={
+            "context": response.get_context(first), "codebase_hash": None
+        })))
+    assert len(response.codebases) == 8
+    assert response.call_results[-1].codebase_hash == first.codebase_hash
+
+
+################################################################################
+# Result tables                                                                #
+################################################################################
+def test_records_have_one_row_per_file_and_item(response, fake_llm):
+    records = response.to_records(run='run-1')
+    assert len(records) == 8 * len(fake_llm.test_items)
+    record = records[0]
+    assert record['run'] == 'run-1'
+    assert record['model'] == 'fake-evaluation-model'
+    assert record['file'].startswith('tests/test_module_')
+    assert record['id'] == fake_llm.test_items[0]['ID']
+    assert record['score'] == 0
+    assert record['functions'] == []
+    assert record['success'] and record['attempts'] == 1
+    assert record['input_tokens'] > 0
+
+
+def test_records_cover_failed_attempts(evaluator, fake_llm):
+    fake_llm.invalid_calls = [1, 2, 3]
+    records = evaluator.run().to_records()
+    failed = [record for record in records if not record['success']]
+    # the file failing all of its attempts has a single row without items
+    assert len(failed) == 1
+    assert failed[0]['attempts'] == 3
+    assert failed[0]['id'] is None
+
+
+def test_result_tables_can_be_read_with_filters(evaluator, fake_llm,
+                                                tmp_path):
+    pytest.importorskip("pyarrow")
+    from fixml.modules.workflow.table import read_result_tables
+    for run in range(2):
+        evaluator.run().to_parquet(tmp_path / f'run_{run}.parquet',
+                                   run=f'run_{run}')
+    item_id = fake_llm.test_items[0]['ID']
+
+    table = read_result_tables(tmp_path)
+    assert len(table) == 2 * 8 * len(fake_llm.test_items)
+    assert set(table['run']) == {'run_0', 'run_1'}
+
+    table = read_result_tables([tmp_path / 'run_0.parquet'], ids=item_id,
+                               models=['fake-evaluation-model'],
+                               columns=['file', 'id', 'score'])
+    assert list(table.columns) == ['file', 'id', 'score']
+    assert len(table) == 8
+    assert (table['id'] == item_id).all()
+    assert read_result_tables(tmp_path, repos='other').empty
+
+
+def test_result_table_will_not_overwrite_by_default(response, tmp_path):
+    pytest.importorskip("pyarrow")
+    response.to_parquet(tmp_path / 'results.parquet')
+    with pytest.raises(FileExistsError):
+        response.to_parquet(tmp_path / 'results.parquet')